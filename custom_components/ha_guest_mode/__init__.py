@@ -1,34 +1,59 @@
 import sqlite3
 import os
-import aiofiles
-import json
 from pathlib import Path
+from datetime import timedelta
 
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.typing import ConfigType
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.components import frontend, websocket_api
 from homeassistant.components.panel_custom import async_register_panel
 from homeassistant.helpers import config_validation as cv
-
-from .websocketCommands import list_users, list_groups, create_token, delete_token, get_path_to_login, get_urls, get_panels, get_copy_link_mode, get_token_defaults
-from .validateTokenView import ValidateTokenView
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.loader import async_get_integration
+from homeassistant.util import dt as dt_util
+
+from .websocketCommands import list_users, list_tokens, list_groups, create_token, delete_token, list_archived_tokens, get_usage_history, list_usage_events, export_tokens, import_tokens, get_path_to_login, get_urls, get_panels, get_copy_link_mode, get_token_defaults
+from .validateTokenView import TokenExchangeView, ValidateTokenView
+from .staticAssetsView import StaticAssetsView, build_compressed_assets
+from .tokenTransferView import ExportTokensView, ImportTokensView
+from .tokenApiView import TokensApiView
+from .qrSheetView import QrSheetView
+from .qr_sheet import QrRenderPool
 from .keyManager import KeyManager
-from .const import DOMAIN, DATABASE, DEST_PATH_SCRIPT_JS, LEGACY_DATABASE, SOURCE_PATH_SCRIPT_JS, SCRIPT_JS
+from .const import ASSET_CACHE_DIRECTORY, DOMAIN, DATABASE, DEFAULT_ARCHIVE_RETENTION_DAYS, DEFAULT_LOOP_BLOCK_THRESHOLD, DEFAULT_QR_ERROR_CORRECTION, LEGACY_DATABASE, QR_SHEET_MAX_WORKERS, SCRIPT_JS, SIGNAL_TOKENS_UPDATED, SNAPSHOT_DATABASE, STATIC_URL_PATH
 from .services import async_register_services
-from .migrations import migration
+from .migrations import migrate_epoch_columns, migration
+from .auth_reconciler import AuthReconciler
+from .archive import ARCHIVE_INTERVAL, TokenArchiver, create_archive_table
+from .usage_log import UsageEventWriter, create_usage_tables
+from .timing import PhaseTimer
+from .snapshot import restore_snapshot_if_needed
+from .maintenance import MAINTENANCE_INTERVAL_DAYS, DatabaseMaintenance
+from .coordinator import GuestTokenCoordinator
+from .prewarm import CredentialPrewarmer
+from .schedule import ScheduleEnforcer
+from .network_filter import parse_networks
+from .repository import TokenRepository
+from .calendar_sync import CalendarSync
+from .profiling import GuestModeProfiler
+from .instrumentation import instrumented
+from .loop_monitor import async_configure_loop_monitor
 
 CONFIG_SCHEMA = cv.empty_config_schema(DOMAIN)
 
-def get_version():
-    manifest_path = Path(__file__).parent / "manifest.json"
+PLATFORMS = ["image", "sensor"]
+
+@instrumented
+async def async_get_version(hass: HomeAssistant) -> str:
+    """Return the integration version from the already loaded manifest."""
     try:
-        with open(manifest_path, encoding="utf-8") as f:
-            return json.load(f).get("version", "dev")
+        integration = await async_get_integration(hass, DOMAIN)
     except Exception:
         return "dev"
-
-VERSION = get_version()
+    return str(integration.version or "dev")
 
 def _ensure_database_location(hass: HomeAssistant) -> str:
     """Make sure the DB lives in .storage and migrate existing files."""
@@ -41,27 +66,10 @@ def _ensure_database_location(hass: HomeAssistant) -> str:
 
     return new_path
 
-async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
-    hass.data.setdefault(DOMAIN, {})
-
-    await async_register_services(hass)
-
-    websocket_api.async_register_command(hass, list_users)
-    websocket_api.async_register_command(hass, list_groups)
-    websocket_api.async_register_command(hass, create_token)
-    websocket_api.async_register_command(hass, delete_token)
-    websocket_api.async_register_command(hass, get_path_to_login)
-    websocket_api.async_register_command(hass, get_urls)
-    websocket_api.async_register_command(hass, get_panels)
-    websocket_api.async_register_command(hass, get_copy_link_mode)
-    websocket_api.async_register_command(hass, get_token_defaults)
-
-    key_manager = KeyManager()
-    await key_manager.load_or_generate_key()
-    hass.data["private_key"] = key_manager.get_private_key()
-    hass.data["public_key"] = key_manager.get_public_key()
-
+def _setup_database(hass: HomeAssistant) -> None:
+    """Create the tokens table and run migrations. Runs in the executor."""
     database_path = _ensure_database_location(hass)
+    restore_snapshot_if_needed(database_path, hass.config.path(SNAPSHOT_DATABASE))
     connection = sqlite3.connect(database_path)
     cursor = connection.cursor()
 
@@ -92,80 +100,266 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     )
 
     migration(cursor)
+    migrate_epoch_columns(cursor, dt_util.get_default_time_zone())
+    create_archive_table(cursor)
+    create_usage_tables(cursor)
 
     connection.commit()
     connection.close()
-    source_path = hass.config.path(SOURCE_PATH_SCRIPT_JS)
-    dest_dir = hass.config.path(DEST_PATH_SCRIPT_JS)
-    dest_path = os.path.join(dest_dir, SCRIPT_JS)
 
-    try:
-        if not os.path.exists(dest_dir):
-            os.makedirs(dest_dir)
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    timer = PhaseTimer()
+    hass.data.setdefault(DOMAIN, {})
 
-        if os.path.exists(source_path):
-            await async_copy_file(source_path, dest_path)
+    # Before anything else, so the rest of the setup is watched too.
+    entries = hass.config_entries.async_entries(DOMAIN)
+    if entries:
+        async_configure_loop_monitor(hass, _loop_block_threshold(entries[0]))
+
+    @callback
+    def _async_stop_loop_monitor(_event) -> None:
+        async_configure_loop_monitor(hass, 0)
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop_loop_monitor)
+
+    with timer.phase("version"):
+        hass.data[DOMAIN]["version"] = await async_get_version(hass)
+
+    with timer.phase("services"):
+        await async_register_services(hass)
+
+    with timer.phase("websocket_commands"):
+        websocket_api.async_register_command(hass, list_users)
+        websocket_api.async_register_command(hass, list_tokens)
+        websocket_api.async_register_command(hass, list_groups)
+        websocket_api.async_register_command(hass, create_token)
+        websocket_api.async_register_command(hass, delete_token)
+        websocket_api.async_register_command(hass, list_archived_tokens)
+        websocket_api.async_register_command(hass, get_usage_history)
+        websocket_api.async_register_command(hass, list_usage_events)
+        websocket_api.async_register_command(hass, export_tokens)
+        websocket_api.async_register_command(hass, import_tokens)
+        websocket_api.async_register_command(hass, get_path_to_login)
+        websocket_api.async_register_command(hass, get_urls)
+        websocket_api.async_register_command(hass, get_panels)
+        websocket_api.async_register_command(hass, get_copy_link_mode)
+        websocket_api.async_register_command(hass, get_token_defaults)
+
+    # The key pair is loaded on the first signing or login, not here.
+    hass.data[DOMAIN]["key_manager"] = KeyManager(hass)
+
+    with timer.phase("database"):
+        await hass.async_add_executor_job(_setup_database, hass)
+
+    with timer.phase("auth_reconciler"):
+        reconciler = AuthReconciler(hass)
+        hass.data[DOMAIN]["auth_reconciler"] = reconciler
+        hass.async_create_task(reconciler.async_start())
+        hass.data[DOMAIN]["archiver"] = TokenArchiver(hass)
+        hass.data[DOMAIN]["repository"] = TokenRepository(hass)
+
+    with timer.phase("maintenance"):
+        hass.data[DOMAIN]["maintenance"] = DatabaseMaintenance(hass)
+        hass.data[DOMAIN]["profiler"] = GuestModeProfiler(hass)
+
+    # Matches whatever login path is configured, so it is registered once for the whole run.
+    hass.http.app.router.register_resource(ValidateTokenView(hass))
+    hass.http.register_view(TokenExchangeView(hass))
+
+    with timer.phase("transfer_views"):
+        hass.http.register_view(ExportTokensView(hass))
+        hass.http.register_view(ImportTokensView(hass))
+        hass.http.register_view(TokensApiView(hass))
+        # Spawned on the first sheet and kept, a sheet only pays for rendering.
+        qr_render_pool = QrRenderPool(min(os.cpu_count() or 1, QR_SHEET_MAX_WORKERS))
+        hass.http.register_view(QrSheetView(hass, qr_render_pool))
+
+        @callback
+        def _async_stop_qr_render_pool(_event) -> None:
+            qr_render_pool.shutdown()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_stop_qr_render_pool)
+
+    with timer.phase("usage_log"):
+        usage_log = UsageEventWriter(hass)
+        hass.data[DOMAIN]["usage_log"] = usage_log
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, usage_log.async_flush)
 
-    except Exception as e:
+    try:
+        with timer.phase("static_assets"):
+            directory, filenames, asset_version = await hass.async_add_executor_job(
+                build_compressed_assets, Path(hass.config.path(ASSET_CACHE_DIRECTORY))
+            )
+            hass.data[DOMAIN]["asset_directory"] = directory
+            hass.data[DOMAIN]["asset_version"] = asset_version
+            hass.http.register_view(StaticAssetsView(asset_version, filenames, directory))
+    except Exception:
         return False
+    finally:
+        hass.data[DOMAIN].setdefault("startup_timings", {})["async_setup"] = timer.as_dict()
 
     return True
 
-async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
-    """Set up ha_guest_mode from a config entry."""
-    hass.data.setdefault(DOMAIN, {})
-
+def _load_options(hass: HomeAssistant, config_entry: ConfigEntry) -> None:
+    """Copy the options into hass.data, where they are read on every use."""
     hass.data["copy_link_mode"] = config_entry.options.get("copy_link_mode", config_entry.data.get("copy_link_mode", False))
     hass.data["default_user"] = config_entry.options.get("default_user", config_entry.data.get("default_user", ""))
     hass.data["default_dashboard"] = config_entry.options.get("default_dashboard", config_entry.data.get("default_dashboard", ""))
+    hass.data["compact_links"] = config_entry.options.get("compact_links", config_entry.data.get("compact_links", False))
+    hass.data["qr_error_correction"] = config_entry.options.get("qr_error_correction", config_entry.data.get("qr_error_correction", DEFAULT_QR_ERROR_CORRECTION))
+    hass.data["archive_retention_days"] = config_entry.options.get("archive_retention_days", config_entry.data.get("archive_retention_days", DEFAULT_ARCHIVE_RETENTION_DAYS))
+    try:
+        hass.data["default_allowed_networks"] = parse_networks(config_entry.options.get("allowed_networks", config_entry.data.get("allowed_networks", "")))
+    except ValueError:
+        hass.data["default_allowed_networks"] = ()
 
     get_path_to_login = config_entry.options.get("login_path", config_entry.data.get("login_path", "/guest-mode/login"))
     if not get_path_to_login.startswith('/'):
         get_path_to_login = f"/{get_path_to_login}"
     hass.data["get_path_to_login"] = get_path_to_login
 
-    tab_icon = config_entry.options.get("tab_icon", config_entry.data.get("tab_icon", "mdi:shield-key"))
-    tab_name = config_entry.options.get("tab_name", config_entry.data.get("tab_name", "Guest"))
+
+def _loop_block_threshold(config_entry: ConfigEntry) -> int:
+    return config_entry.options.get("loop_block_threshold", config_entry.data.get("loop_block_threshold", DEFAULT_LOOP_BLOCK_THRESHOLD))
+
+
+def _panel_path(config_entry: ConfigEntry) -> str:
     path = config_entry.options.get("path_to_admin_ui", config_entry.data.get("path_to_admin_ui", "/guest-mode"))
     if path.startswith("/"):
         path = path[1:]
+    return path
+
+
+@callback
+def _async_register_panel(hass: HomeAssistant, config_entry: ConfigEntry) -> None:
+    """Register the sidebar panel, again only when its own options changed."""
+    tab_icon = config_entry.options.get("tab_icon", config_entry.data.get("tab_icon", "mdi:shield-key"))
+    tab_name = config_entry.options.get("tab_name", config_entry.data.get("tab_name", "Guest"))
+    path = _panel_path(config_entry)
+
+    previous = hass.data[DOMAIN].get("panel")
+    if previous == (path, tab_name, tab_icon):
+        return
 
     panels = hass.data.get("frontend_panels", {})
-    if path in panels:
-        frontend.async_remove_panel(hass, path)
+    for stale_path in {path, previous[0] if previous else path}:
+        if stale_path in panels:
+            frontend.async_remove_panel(hass, stale_path)
 
+    # Versioned by content, so a changed file never hits an immutable cache entry.
+    version = hass.data[DOMAIN]["asset_version"]
     hass.async_create_task(
         async_register_panel(
             hass,
             frontend_url_path=path,
             webcomponent_name="guest-mode-panel",
-            module_url=f"/local/community/ha-guest-mode/ha-guest-mode.js?v={VERSION}",
+            module_url=f"{STATIC_URL_PATH}/{version}/{SCRIPT_JS}",
             sidebar_title=tab_name,
             sidebar_icon=tab_icon,
             require_admin=True,
         )
     )
+    hass.data[DOMAIN]["panel"] = (path, tab_name, tab_icon)
+
+
+@callback
+def _async_update_option_jobs(hass: HomeAssistant, config_entry: ConfigEntry) -> None:
+    """Start, restart or stop the background jobs that depend on the options."""
+    jobs = hass.data[DOMAIN].setdefault("option_jobs", {})
+    wanted = {}
+    if config_entry.options.get("weekly_maintenance", config_entry.data.get("weekly_maintenance", False)):
+        wanted["weekly_maintenance"] = ()
+    calendar_entity = config_entry.options.get("calendar_entity", config_entry.data.get("calendar_entity", "")).strip()
+    if calendar_entity:
+        wanted["calendar_sync"] = (calendar_entity, hass.data["default_user"], hass.data["default_dashboard"])
+
+    for name in list(jobs):
+        if wanted.get(name) != jobs[name][0]:
+            jobs.pop(name)[1]()
+
+    for name, settings in wanted.items():
+        if name in jobs:
+            continue
+        if name == "weekly_maintenance":
+            stop = async_track_time_interval(
+                hass, hass.data[DOMAIN]["maintenance"].async_run, timedelta(days=MAINTENANCE_INTERVAL_DAYS)
+            )
+        else:
+            stop = CalendarSync(hass, *settings).async_start()
+        jobs[name] = (settings, stop)
+
+
+@callback
+def _async_stop_option_jobs(hass: HomeAssistant) -> None:
+    for _settings, stop in hass.data[DOMAIN].pop("option_jobs", {}).values():
+        stop()
+
+
+async def _async_options_updated(hass: HomeAssistant, config_entry: ConfigEntry) -> None:
+    """Apply saved options in place, without reloading the entry.
+
+    The login view dispatches on the current login path, so the old path
+    stops answering right away.
+    """
+    _load_options(hass, config_entry)
+    _async_register_panel(hass, config_entry)
+    _async_update_option_jobs(hass, config_entry)
+    async_configure_loop_monitor(hass, _loop_block_threshold(config_entry))
+
+
+@instrumented
+async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
+    """Set up ha_guest_mode from a config entry."""
+    timer = PhaseTimer()
+    hass.data.setdefault(DOMAIN, {})
 
-    hass.http.register_view(ValidateTokenView(hass))
+    _load_options(hass, config_entry)
+    async_configure_loop_monitor(hass, _loop_block_threshold(config_entry))
+    config_entry.async_on_unload(config_entry.add_update_listener(_async_options_updated))
 
-    hass.async_create_task(hass.config_entries.async_forward_entry_setups(config_entry, ["image"]))
+    with timer.phase("panel"):
+        _async_register_panel(hass, config_entry)
+
+    with timer.phase("archiver"):
+        archiver = hass.data[DOMAIN]["archiver"]
+        config_entry.async_on_unload(
+            async_track_time_interval(hass, archiver.async_run, ARCHIVE_INTERVAL)
+        )
+        hass.async_create_task(archiver.async_run())
+
+    with timer.phase("coordinator"):
+        coordinator = GuestTokenCoordinator(hass)
+        await coordinator.async_refresh()
+        hass.data[DOMAIN]["coordinator"] = coordinator
+        config_entry.async_on_unload(
+            async_dispatcher_connect(hass, SIGNAL_TOKENS_UPDATED, coordinator.async_request_refresh)
+        )
+        config_entry.async_on_unload(coordinator.async_cancel_boundary)
+
+    with timer.phase("prewarmer"):
+        config_entry.async_on_unload(CredentialPrewarmer(hass, coordinator).async_start())
+        config_entry.async_on_unload(ScheduleEnforcer(hass, coordinator).async_start())
+
+    with timer.phase("option_jobs"):
+        _async_update_option_jobs(hass, config_entry)
+        config_entry.async_on_unload(lambda: _async_stop_option_jobs(hass))
+
+    with timer.phase("platforms"):
+        hass.async_create_task(hass.config_entries.async_forward_entry_setups(config_entry, PLATFORMS))
+
+    hass.data[DOMAIN].setdefault("startup_timings", {})["async_setup_entry"] = timer.as_dict()
 
     return True
 
 async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry):
     """Unload a config entry."""
-    path = config_entry.options.get("path_to_admin_ui", config_entry.data.get("path_to_admin_ui", "/guest-mode"))
-    if path.startswith("/"):
-        path = path[1:]
+    path = _panel_path(config_entry)
+    hass.data[DOMAIN].pop("panel", None)
+    async_configure_loop_monitor(hass, 0)
 
     panels = hass.data.get("frontend_panels", {})
     if path in panels:
         frontend.async_remove_panel(hass, path)
 
-    await hass.config_entries.async_unload_platforms(config_entry, ["image"])
+    await hass.config_entries.async_unload_platforms(config_entry, PLATFORMS)
     return True
-
-async def async_copy_file(source_path, dest_path):
-    async with aiofiles.open(source_path, 'rb') as src, aiofiles.open(dest_path, 'wb') as dst:
-        while chunk := await src.read(1024):  # Adjust chunk size as needed
-            await dst.write(chunk)
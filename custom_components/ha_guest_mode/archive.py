@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .const import ARCHIVE_BATCH_SIZE, DATABASE, DEFAULT_ARCHIVE_RETENTION_DAYS
+from .coordinator import async_signal_tokens_changed
+from .events import EVENT_TOKEN_DELETED, EVENT_TOKEN_EXPIRED, token_event_data
+from .instrumentation import instrumented
+from .managed_users import async_remove_unused_managed_users
+from .token_record import TokenRecord, token_record_factory
+
+_LOGGER = logging.getLogger(__name__)
+
+ARCHIVE_INTERVAL = timedelta(hours=1)
+
+REASON_CANCELLED = "cancelled"
+REASON_EXPIRED = "expired"
+REASON_REVOKED = "revoked"
+REASON_USAGE_EXHAUSTED = "usage_exhausted"
+
+# Live credentials are never copied into the archive.
+_SECRET_COLUMNS = ("token_ha", "token_ha_guest_mode")
+
+_ARCHIVE_COLUMNS = (
+    "token_id",
+    "userId",
+    "token_name",
+    "uid",
+    "dashboard",
+    "start_date",
+    "end_date",
+    "is_never_expire",
+    "first_used",
+    "last_used",
+    "times_used",
+    "usage_limit",
+    "managed_user",
+    "event_id",
+    "reason",
+    "archived_at",
+    "data",
+)
+
+
+def create_archive_table(cursor) -> None:
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tokens_archive (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token_id INTEGER NOT NULL,
+            userId TEXT,
+            token_name TEXT,
+            uid TEXT,
+            dashboard TEXT,
+            start_date TEXT,
+            end_date TEXT,
+            is_never_expire BOOLEAN,
+            first_used TEXT,
+            last_used TEXT,
+            times_used INTEGER,
+            usage_limit INTEGER,
+            managed_user BOOLEAN,
+            event_id TEXT,
+            reason TEXT NOT NULL,
+            archived_at TEXT NOT NULL,
+            data TEXT
+        )
+        """
+    )
+    cursor.execute("PRAGMA table_info(tokens_archive)")
+    if "event_id" not in {column[1] for column in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE tokens_archive ADD COLUMN event_id TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tokens_archive_event_id ON tokens_archive (event_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tokens_archive_archived_at ON tokens_archive (archived_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tokens_archive_user_id ON tokens_archive (userId)")
+
+
+# A token whose guest still holds a live HA session stays in place when its
+# usage runs out so that deleting it from the panel can still revoke that session.
+_DUE_QUERY = """
+    SELECT id, CASE
+        WHEN NOT COALESCE(is_never_expire, 0) AND end_ts < :now THEN :expired
+        ELSE :exhausted
+    END AS reason
+    FROM tokens
+    WHERE (NOT COALESCE(is_never_expire, 0) AND end_ts < :now)
+       OR (usage_limit > 0 AND COALESCE(times_used, 0) >= usage_limit AND COALESCE(token_ha_id, '') = '')
+"""
+
+
+def archive_token_rows(
+    conn: sqlite3.Connection, batch: dict[int, str], archived_at: str
+) -> list[tuple[str, str, bool, dict[str, Any]]]:
+    """Move tokens ``{id: reason}`` to the archive inside the caller's transaction.
+
+    Returns what TokenArchiver.async_release needs.
+    """
+    placeholders = ",".join("?" * len(batch))
+    cursor = conn.execute(f"SELECT * FROM tokens WHERE id IN ({placeholders})", tuple(batch))
+    cursor.row_factory = token_record_factory
+    rows = cursor.fetchall()
+    conn.executemany(
+        f"""
+        INSERT INTO tokens_archive ({", ".join(_ARCHIVE_COLUMNS)})
+        VALUES ({", ".join("?" * len(_ARCHIVE_COLUMNS))})
+        """,
+        [_archive_values(row, batch[row["id"]], archived_at) for row in rows],
+    )
+    conn.execute(f"DELETE FROM tokens WHERE id IN ({placeholders})", tuple(batch))
+    return [
+        (
+            row["userId"],
+            row["token_ha_id"],
+            bool(row["managed_user"]),
+            token_event_data(row, reason=batch[row["id"]]),
+        )
+        for row in rows
+    ]
+
+
+@callback
+def async_revoke_refresh_token(hass: HomeAssistant, refresh_token_id: str) -> None:
+    """End the HA session of a token, its access tokens stop working at once."""
+    with suppress(Exception):
+        refresh_token = hass.auth.async_get_refresh_token(refresh_token_id)
+        if refresh_token:
+            hass.auth.async_remove_refresh_token(refresh_token)
+
+
+def _archive_values(row: TokenRecord, reason: str, archived_at: str) -> tuple:
+    data = {key: value for key, value in row.items() if key not in _SECRET_COLUMNS}
+    return (
+        row["id"],
+        row["userId"],
+        row["token_name"],
+        row["uid"],
+        row["dashboard"],
+        row["start_date"],
+        row["end_date"],
+        row["is_never_expire"],
+        row["first_used"],
+        row["last_used"],
+        row["times_used"],
+        row["usage_limit"],
+        row["managed_user"],
+        row["event_id"],
+        reason,
+        archived_at,
+        json.dumps(data),
+    )
+
+
+class TokenArchiver:
+    """Move dead tokens out of the hot ``tokens`` table into ``tokens_archive``."""
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._database_path = hass.config.path(DATABASE)
+
+    async def async_archive_due(self) -> int:
+        """Archive every expired or exhausted token and release its HA credentials."""
+        archived = await self.hass.async_add_executor_job(self._archive_due, dt_util.utcnow())
+        await self.async_release(archived)
+        return len(archived)
+
+    async def async_revoke(self, token_id: int) -> bool:
+        """Archive a single token on behalf of an admin, return whether it existed."""
+        return bool(await self.async_revoke_many([token_id]))
+
+    async def async_revoke_many(self, token_ids: list[int]) -> int:
+        """Archive tokens on behalf of an admin, return how many existed."""
+        archived = await self.hass.async_add_executor_job(
+            self._archive_ids, [(token_id, REASON_REVOKED) for token_id in token_ids], dt_util.utcnow()
+        )
+        await self.async_release(archived)
+        return len(archived)
+
+    async def async_prune(self) -> int:
+        retention_days = self.hass.data.get("archive_retention_days", DEFAULT_ARCHIVE_RETENTION_DAYS)
+        if not retention_days:
+            return 0
+        cutoff = dt_util.utcnow() - timedelta(days=retention_days)
+        return await self.hass.async_add_executor_job(self._prune, cutoff)
+
+    @instrumented
+    async def async_run(self, _now=None) -> None:
+        """Periodic job: archive what is due, then prune the archive."""
+        archived = await self.async_archive_due()
+        pruned = await self.async_prune()
+        if archived or pruned:
+            _LOGGER.debug("Archived %s token(s), pruned %s archived token(s)", archived, pruned)
+
+    async def async_query(
+        self,
+        user_id: str | None = None,
+        reason: str | None = None,
+        before_id: int | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        return await self.hass.async_add_executor_job(self._query, user_id, reason, before_id, limit)
+
+    async def async_release(self, archived: list[tuple[str, str, bool, dict[str, Any]]]) -> None:
+        """Fire the events and drop the HA credentials of archived tokens."""
+        if archived:
+            async_signal_tokens_changed(self.hass)
+        managed_user_ids = set()
+        for user_id, refresh_token_id, managed, event_data in archived:
+            self.hass.bus.async_fire(
+                EVENT_TOKEN_EXPIRED
+                if event_data["reason"] in (REASON_EXPIRED, REASON_USAGE_EXHAUSTED)
+                else EVENT_TOKEN_DELETED,
+                event_data,
+            )
+            if refresh_token_id:
+                async_revoke_refresh_token(self.hass, refresh_token_id)
+            if managed:
+                managed_user_ids.add(user_id)
+
+        if managed_user_ids:
+            await async_remove_unused_managed_users(self.hass, managed_user_ids)
+
+    def _connect(self):
+        conn = sqlite3.connect(self._database_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _archive_due(self, now: datetime) -> list[tuple[str, str, bool, dict[str, Any]]]:
+        conn = self._connect()
+        try:
+            due = [
+                tuple(row)
+                for row in conn.execute(
+                    _DUE_QUERY,
+                    {"now": int(now.timestamp()), "expired": REASON_EXPIRED, "exhausted": REASON_USAGE_EXHAUSTED},
+                )
+            ]
+        finally:
+            conn.close()
+
+        if not due:
+            return []
+        return self._archive_ids(due, now)
+
+    def _archive_ids(
+        self, due: list[tuple[int, str]], now: datetime
+    ) -> list[tuple[str, str, bool, dict[str, Any]]]:
+        """Copy rows to the archive and delete them, one transaction per batch."""
+        archived_at = now.isoformat()
+        released = []
+        conn = self._connect()
+        try:
+            for start in range(0, len(due), ARCHIVE_BATCH_SIZE):
+                with conn:
+                    released.extend(archive_token_rows(conn, dict(due[start:start + ARCHIVE_BATCH_SIZE]), archived_at))
+        finally:
+            conn.close()
+        return released
+
+    def _prune(self, cutoff: datetime) -> int:
+        """Drop archived tokens and raw login events older than the cutoff.
+
+        Usage rollups are kept, they are small and hold the long-term history.
+        """
+        conn = self._connect()
+        try:
+            self._delete_in_batches(
+                conn,
+                "DELETE FROM token_usage_events WHERE id IN (SELECT id FROM token_usage_events WHERE used_at < ? LIMIT ?)",
+                int(cutoff.timestamp()),
+            )
+            return self._delete_in_batches(
+                conn,
+                "DELETE FROM tokens_archive WHERE id IN (SELECT id FROM tokens_archive WHERE archived_at < ? LIMIT ?)",
+                cutoff.isoformat(),
+            )
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _delete_in_batches(conn, query: str, cutoff) -> int:
+        deleted = 0
+        while True:
+            with conn:
+                cursor = conn.execute(query, (cutoff, ARCHIVE_BATCH_SIZE))
+            deleted += cursor.rowcount
+            if cursor.rowcount < ARCHIVE_BATCH_SIZE:
+                return deleted
+
+    def _query(self, user_id, reason, before_id, limit) -> list[dict[str, Any]]:
+        query = """
+            SELECT id, token_id, userId, token_name, uid, dashboard, start_date, end_date,
+                   is_never_expire, first_used, last_used, times_used, usage_limit, reason, archived_at
+            FROM tokens_archive
+        """
+        clauses = []
+        params: list[Any] = []
+        if user_id:
+            clauses.append("userId = ?")
+            params.append(user_id)
+        if reason:
+            clauses.append("reason = ?")
+            params.append(reason)
+        if before_id:
+            clauses.append("id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(query, tuple(params))]
+        finally:
+            conn.close()
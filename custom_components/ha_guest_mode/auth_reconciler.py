@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+from functools import partial
+
+from homeassistant.auth import EVENT_USER_REMOVED
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+
+from .const import DATABASE
+from .coordinator import async_signal_tokens_changed
+from .instrumentation import instrumented
+from .managed_users import async_create_managed_user, update_managed_user_rows
+from .token_record import TokenRecord, token_record_factory
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AuthReconciler:
+    """Keep token rows in sync with users and refresh tokens removed from HA auth.
+
+    Instead of diffing every token against every user on each panel load, the
+    reconciler reacts to ``user_removed`` events and refresh token revocations
+    and only touches the rows reached through the userId / token_ha_id indexes.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._database_path = hass.config.path(DATABASE)
+        self._revoke_unsubs: dict[str, CALLBACK_TYPE] = {}
+        self._unsub_user_removed: CALLBACK_TYPE | None = None
+        self._restore_lock = asyncio.Lock()
+        self._replaced_users: dict[str, str] = {}
+
+    async def async_start(self) -> None:
+        self._unsub_user_removed = self.hass.bus.async_listen(
+            EVENT_USER_REMOVED, self._async_handle_user_removed
+        )
+        await self._async_reconcile_all()
+
+    @callback
+    def async_stop(self) -> None:
+        if self._unsub_user_removed is not None:
+            self._unsub_user_removed()
+            self._unsub_user_removed = None
+        for unsub in self._revoke_unsubs.values():
+            unsub()
+        self._revoke_unsubs.clear()
+
+    @callback
+    def async_track_refresh_token(self, refresh_token_id: str | None) -> None:
+        """Clear the stored credentials of a token once HA revokes its refresh token."""
+        if not refresh_token_id or refresh_token_id in self._revoke_unsubs:
+            return
+        self._revoke_unsubs[refresh_token_id] = self.hass.auth.async_register_revoke_token_callback(
+            refresh_token_id, partial(self._handle_refresh_token_revoked, refresh_token_id)
+        )
+
+    async def async_restore_managed_user(self, user_id: str):
+        """Recreate a removed dedicated user and repoint all of its tokens.
+
+        Shared by the event handler and the login view; concurrent callers for
+        the same vanished user get the same replacement.
+        """
+        async with self._restore_lock:
+            if replacement_id := self._replaced_users.get(user_id):
+                return await self.hass.auth.async_get_user(replacement_id)
+
+            row = await self.hass.async_add_executor_job(self._fetch_managed_row, user_id)
+            if row is None:
+                return None
+
+            user, values = await async_create_managed_user(self.hass, row)
+            if user is None:
+                return None
+
+            await self.hass.async_add_executor_job(self._replace_user, user_id, values)
+            self._replaced_users[user_id] = user.id
+            _LOGGER.debug("Recreated managed user %s as %s", user_id, user.id)
+            return user
+
+    @instrumented
+    async def _async_reconcile_all(self) -> None:
+        """Catch up on auth changes made while the integration was not running."""
+        rows = await self.hass.async_add_executor_job(self._fetch_links)
+        if not rows:
+            return
+
+        existing_user_ids = {user.id for user in await self.hass.auth.async_get_users()}
+        missing_managed_users = {
+            user_id for user_id, managed, _ in rows
+            if managed and user_id not in existing_user_ids
+        }
+        for user_id in missing_managed_users:
+            await self.async_restore_managed_user(user_id)
+
+        stale_refresh_token_ids = []
+        for user_id, _, refresh_token_id in rows:
+            if not refresh_token_id or user_id in missing_managed_users:
+                continue
+            if self.hass.auth.async_get_refresh_token(refresh_token_id) is None:
+                stale_refresh_token_ids.append(refresh_token_id)
+            else:
+                self.async_track_refresh_token(refresh_token_id)
+
+        if stale_refresh_token_ids:
+            await self.hass.async_add_executor_job(self._clear_refresh_tokens, stale_refresh_token_ids)
+
+    @instrumented
+    async def _async_handle_user_removed(self, event: Event) -> None:
+        user_id = event.data.get("user_id")
+        if not user_id:
+            return
+
+        has_managed = await self.hass.async_add_executor_job(self._clear_unmanaged_user, user_id)
+        if has_managed:
+            await self.async_restore_managed_user(user_id)
+
+    @callback
+    def _handle_refresh_token_revoked(self, refresh_token_id: str) -> None:
+        self._revoke_unsubs.pop(refresh_token_id, None)
+        self.hass.async_create_task(self._async_clear_refresh_token(refresh_token_id))
+
+    async def _async_clear_refresh_token(self, refresh_token_id: str) -> None:
+        await self.hass.async_add_executor_job(self._clear_refresh_tokens, [refresh_token_id])
+        # Lets the prewarmer issue credentials again, e.g. for the next scheduled window.
+        async_signal_tokens_changed(self.hass)
+
+    def _connect(self):
+        return sqlite3.connect(self._database_path)
+
+    def _fetch_links(self):
+        conn = self._connect()
+        try:
+            cursor = conn.execute('SELECT userId, managed_user, token_ha_id FROM tokens')
+            return [(user_id, bool(managed), refresh_token_id) for user_id, managed, refresh_token_id in cursor]
+        finally:
+            conn.close()
+
+    def _fetch_managed_row(self, user_id: str) -> TokenRecord | None:
+        conn = self._connect()
+        conn.row_factory = token_record_factory
+        try:
+            cursor = conn.execute(
+                'SELECT * FROM tokens WHERE userId = ? AND managed_user = 1 LIMIT 1',
+                (user_id,),
+            )
+            return cursor.fetchone()
+        finally:
+            conn.close()
+
+    def _replace_user(self, old_user_id: str, values) -> None:
+        conn = self._connect()
+        try:
+            update_managed_user_rows(conn.cursor(), old_user_id, values)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _clear_unmanaged_user(self, user_id: str) -> bool:
+        """Drop the stale credentials of a removed user's tokens, return whether some are managed."""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE tokens SET token_ha_id = '', token_ha = '' WHERE userId = ? AND COALESCE(managed_user, 0) = 0",
+                (user_id,),
+            )
+            conn.commit()
+            cursor = conn.execute(
+                'SELECT 1 FROM tokens WHERE userId = ? AND managed_user = 1 LIMIT 1',
+                (user_id,),
+            )
+            return cursor.fetchone() is not None
+        finally:
+            conn.close()
+
+    def _clear_refresh_tokens(self, refresh_token_ids: list[str]) -> None:
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "UPDATE tokens SET token_ha_id = '', token_ha = '' WHERE token_ha_id = ?",
+                [(refresh_token_id,) for refresh_token_id in refresh_token_ids],
+            )
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,21 @@
+"""Backup platform, keeps a consistent copy of the database in every HA backup."""
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .const import DATABASE, DOMAIN, SNAPSHOT_DATABASE
+from .snapshot import create_snapshot, remove_snapshot
+
+
+async def async_pre_backup(hass: HomeAssistant) -> None:
+    """Write an online snapshot next to the database before HA archives .storage."""
+    stats = await hass.async_add_executor_job(
+        create_snapshot, hass.config.path(DATABASE), hass.config.path(SNAPSHOT_DATABASE)
+    )
+    stats["created_at"] = dt_util.utcnow().isoformat()
+    hass.data.setdefault(DOMAIN, {})["last_backup_snapshot"] = stats
+
+
+async def async_post_backup(hass: HomeAssistant) -> None:
+    """The snapshot lives on in the backup archive, drop the local copy."""
+    await hass.async_add_executor_job(remove_snapshot, hass.config.path(SNAPSHOT_DATABASE))
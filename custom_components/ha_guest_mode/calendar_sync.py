@@ -0,0 +1,232 @@
+"""Provision guest tokens from the events of a calendar entity.
+
+Every event in the look-ahead window maps to one token through the indexed
+``event_id`` column. A sync diffs the events against the live calendar tokens
+and applies the creations, changes and cancellations in a single transaction,
+so an unchanged calendar costs one indexed read and no writes.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import sqlite3
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_state_change_event, async_track_time_interval
+from homeassistant.util import dt as dt_util
+
+from .archive import REASON_CANCELLED, REASON_REVOKED, archive_token_rows, async_revoke_refresh_token
+from .const import ARCHIVE_BATCH_SIZE, DATABASE, DOMAIN
+from .coordinator import async_signal_tokens_changed
+from .instrumentation import instrumented
+from .repository import insert_token_rows, new_token_row, sign_token_row
+from .timestamps import to_ts
+from .token_record import TokenRecord, token_record_factory
+
+_LOGGER = logging.getLogger(__name__)
+
+CALENDAR_SYNC_INTERVAL = timedelta(minutes=15)
+CALENDAR_LOOKAHEAD = timedelta(days=90)
+
+
+def calendar_event_id(event) -> str:
+    """Stable id of a calendar event, per occurrence for recurring events.
+
+    Events without a uid fall back to their summary and start, so moving one
+    replaces its token instead of updating it.
+    """
+    if event.uid:
+        return f"{event.uid}/{event.recurrence_id}" if event.recurrence_id else event.uid
+    digest = hashlib.sha1(f"{event.summary}|{event.start_datetime_local.isoformat()}".encode())
+    return f"sha1:{digest.hexdigest()}"
+
+
+def diff_events(
+    wanted: dict[str, tuple[str, int, int]],
+    existing: dict[str, TokenRecord],
+    window_start: int,
+    window_end: int,
+) -> tuple[list[str], list[tuple[int, str]], list[int]]:
+    """Return the event ids to create, the token ids to update and the token ids to cancel.
+
+    ``wanted`` maps event ids to ``(name, start_ts, end_ts)``. Tokens outside
+    the fetched window are left alone, their events were simply not fetched.
+    """
+    create = [event_id for event_id in wanted if event_id not in existing]
+    update = [
+        (token["id"], event_id)
+        for event_id, token in existing.items()
+        if event_id in wanted and wanted[event_id] != (token["token_name"], token["start_ts"], token["end_ts"])
+    ]
+    cancel = [
+        token["id"]
+        for event_id, token in existing.items()
+        if event_id not in wanted and token["end_ts"] > window_start and token["start_ts"] < window_end
+    ]
+    return create, update, cancel
+
+
+class CalendarSync:
+    """Keep one guest token per event of a calendar entity."""
+
+    def __init__(self, hass: HomeAssistant, entity_id: str, user: str, dashboard: str):
+        self.hass = hass
+        self.entity_id = entity_id
+        self._user = user
+        self._dashboard = dashboard or "lovelace"
+        self._database_path = hass.config.path(DATABASE)
+        self._lock = asyncio.Lock()
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        unsubs = [
+            # The state flips when an event starts or ends; edits further ahead
+            # are picked up by the interval.
+            async_track_state_change_event(self.hass, [self.entity_id], self._async_handle_update),
+            async_track_time_interval(self.hass, self._async_handle_update, CALENDAR_SYNC_INTERVAL),
+        ]
+        self.hass.async_create_task(self.async_sync())
+
+        @callback
+        def stop() -> None:
+            for unsub in unsubs:
+                unsub()
+
+        return stop
+
+    @instrumented
+    async def _async_handle_update(self, _event=None) -> None:
+        await self.async_sync()
+
+    async def async_sync(self) -> dict[str, int] | None:
+        """Bring the calendar tokens in line with the calendar, return the change counts."""
+        async with self._lock:
+            return await self._async_sync()
+
+    async def _async_sync(self) -> dict[str, int] | None:
+        private_key = await self.hass.data[DOMAIN]["key_manager"].async_get_private_key()
+        user_id = await self._async_resolve_user()
+        component = self.hass.data.get("calendar")
+        entity = component.get_entity(self.entity_id) if component else None
+        if private_key is None or user_id is None or entity is None:
+            _LOGGER.debug("Calendar sync for %s skipped, calendar or user not available", self.entity_id)
+            return None
+
+        start = dt_util.now()
+        end = start + CALENDAR_LOOKAHEAD
+        wanted: dict[str, tuple[str, int, int]] = {}
+        for event in await entity.async_get_events(self.hass, start, end):
+            wanted[calendar_event_id(event)] = (
+                event.summary or self.entity_id,
+                to_ts(event.start_datetime_local),
+                to_ts(event.end_datetime_local),
+            )
+
+        created, updated, released, moved_refresh_token_ids = await self.hass.async_add_executor_job(
+            self._apply, wanted, user_id, to_ts(start), to_ts(end), private_key
+        )
+        # A guest whose booking was moved or cut short logs in again for the new window.
+        for refresh_token_id in moved_refresh_token_ids:
+            async_revoke_refresh_token(self.hass, refresh_token_id)
+        if created:
+            await self.hass.data[DOMAIN]["repository"].async_notify_created(created)
+        elif updated:
+            async_signal_tokens_changed(self.hass)
+        if released:
+            await self.hass.data[DOMAIN]["archiver"].async_release(released)
+        return {"created": len(created), "updated": updated, "cancelled": len(released)}
+
+    async def _async_resolve_user(self) -> str | None:
+        """The default user option holds a user id or a user name."""
+        wanted = self._user.strip().lower()
+        if not wanted:
+            return None
+        for user in await self.hass.auth.async_get_users():
+            if user.id == self._user or (user.name or "").lower() == wanted:
+                return user.id
+        return None
+
+    def _apply(self, wanted, user_id, window_start, window_end, private_key):
+        conn = sqlite3.connect(self._database_path)
+        conn.row_factory = token_record_factory
+        try:
+            existing = {
+                row["event_id"]: row
+                for row in conn.execute(
+                    "SELECT id, uid, event_id, token_name, start_ts, end_ts, token_ha_id FROM tokens WHERE event_id IS NOT NULL"
+                )
+            }
+            create, update, cancel = diff_events(wanted, existing, window_start, window_end)
+            if create:
+                # Tokens an admin deleted stay deleted while their event remains.
+                create = [event_id for event_id in create if not self._revoked(conn, event_id)]
+            if not (create or update or cancel):
+                return [], 0, [], []
+
+            rows = [self._new_row(event_id, wanted[event_id], user_id) for event_id in create]
+            tokens_by_id = {token["id"]: token for token in existing.values()}
+            moved_refresh_token_ids = [
+                token["token_ha_id"]
+                for token_id, event_id in update
+                if (token := tokens_by_id[token_id])["token_ha_id"] and self._moved(token, wanted[event_id])
+            ]
+            with conn:
+                insert_token_rows(conn, rows, private_key)
+                conn.executemany(
+                    """
+                    UPDATE tokens
+                    SET token_name = ?, start_date = ?, end_date = ?, start_ts = ?, end_ts = ?, token_ha_guest_mode = ?,
+                        token_ha_id = CASE WHEN ? THEN '' ELSE token_ha_id END,
+                        token_ha = CASE WHEN ? THEN '' ELSE token_ha END
+                    WHERE id = ?
+                    """,
+                    [self._update_values(tokens_by_id[token_id], wanted[event_id], private_key) for token_id, event_id in update],
+                )
+                released = []
+                archived_at = dt_util.utcnow().isoformat()
+                for start in range(0, len(cancel), ARCHIVE_BATCH_SIZE):
+                    batch = {token_id: REASON_CANCELLED for token_id in cancel[start:start + ARCHIVE_BATCH_SIZE]}
+                    released.extend(archive_token_rows(conn, batch, archived_at))
+            return rows, len(update), released, moved_refresh_token_ids
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _revoked(conn: sqlite3.Connection, event_id: str) -> bool:
+        return (
+            conn.execute(
+                "SELECT 1 FROM tokens_archive WHERE event_id = ? AND reason = ? LIMIT 1", (event_id, REASON_REVOKED)
+            ).fetchone()
+            is not None
+        )
+
+    def _new_row(self, event_id: str, event: tuple[str, int, int], user_id: str) -> dict[str, Any]:
+        name, start_ts, end_ts = event
+        return new_token_row(
+            user_id=user_id,
+            token_name=name,
+            start=dt_util.utc_from_timestamp(start_ts),
+            end=dt_util.utc_from_timestamp(end_ts),
+            dashboard=self._dashboard,
+            event_id=event_id,
+        )
+
+    @staticmethod
+    def _moved(token: TokenRecord, event: tuple[str, int, int]) -> bool:
+        return (token["start_ts"], token["end_ts"]) != event[1:]
+
+    @classmethod
+    def _update_values(cls, token: TokenRecord, event: tuple[str, int, int], private_key) -> tuple:
+        name, start_ts, end_ts = event
+        start_date = dt_util.utc_from_timestamp(start_ts).isoformat()
+        end_date = dt_util.utc_from_timestamp(end_ts).isoformat()
+        signed = sign_token_row(
+            {"uid": token["uid"], "is_never_expire": False, "start_date": start_date, "end_date": end_date},
+            private_key,
+        )
+        # Credentials minted for the old window are dropped, see async_revoke_refresh_token.
+        moved = cls._moved(token, event)
+        return (name, start_date, end_date, start_ts, end_ts, signed, moved, moved, token["id"])
@@ -4,7 +4,8 @@ from homeassistant import config_entries
 from homeassistant.core import callback
 
 from .options_flow import OptionsFlowHandler
-from .const import DOMAIN, ICONS
+from .const import DEFAULT_ARCHIVE_RETENTION_DAYS, DEFAULT_LOOP_BLOCK_THRESHOLD, DEFAULT_QR_ERROR_CORRECTION, DOMAIN, ICONS, QR_ERROR_CORRECTION_LEVELS
+from .network_filter import parse_networks
 
 class GuestModeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for ha-guest-mode."""
@@ -17,9 +18,15 @@ class GuestModeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     async def async_step_user(self, user_input=None):
         """Handle the initial step."""
+        errors = {}
         if user_input is not None:
-            self.data.update(user_input)
-            return self.async_create_entry(title="Guest Mode", data=self.data)
+            try:
+                parse_networks(user_input.get("allowed_networks"))
+            except ValueError:
+                errors["allowed_networks"] = "invalid_network"
+            else:
+                self.data.update(user_input)
+                return self.async_create_entry(title="Guest Mode", data=self.data)
 
         return self.async_show_form(
             step_id="user",
@@ -31,7 +38,15 @@ class GuestModeConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 vol.Optional("copy_link_mode", default=False): bool,
                 vol.Optional("default_user", default=""): str,
                 vol.Optional("default_dashboard", default=""): str,
+                vol.Optional("archive_retention_days", default=DEFAULT_ARCHIVE_RETENTION_DAYS): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                vol.Optional("weekly_maintenance", default=False): bool,
+                vol.Optional("allowed_networks", default=""): str,
+                vol.Optional("calendar_entity", default=""): str,
+                vol.Optional("compact_links", default=False): bool,
+                vol.Optional("qr_error_correction", default=DEFAULT_QR_ERROR_CORRECTION): vol.In(QR_ERROR_CORRECTION_LEVELS),
+                vol.Optional("loop_block_threshold", default=DEFAULT_LOOP_BLOCK_THRESHOLD): vol.All(vol.Coerce(int), vol.Range(min=0)),
             }),
+            errors=errors,
         )
 
     @staticmethod
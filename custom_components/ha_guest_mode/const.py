@@ -3,10 +3,65 @@ DOMAIN = "ha_guest_mode"
 BASE_PATH = "custom_components/ha_guest_mode"
 SCRIPT_JS = "ha-guest-mode.js"
 DATABASE = ".storage/ha_guest_mode.db"
+SNAPSHOT_DATABASE = ".storage/ha_guest_mode.snapshot.db"
 LEGACY_DATABASE = f"{BASE_PATH}/ha_guest_mode.db"
 KEY_FILE_PATH =  f"{BASE_PATH}/private_key.pem"
-SOURCE_PATH_SCRIPT_JS = f"{BASE_PATH}/www/{SCRIPT_JS}"
-DEST_PATH_SCRIPT_JS = "www/community/ha-guest-mode"
+STATIC_URL_PATH = "/ha_guest_mode/www"
+# Precompressed copies of the www assets, the integration folder may be read-only.
+ASSET_CACHE_DIRECTORY = ".storage/ha_guest_mode_www"
+STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# The login shell is the same for every link, but not versioned like the assets.
+LOGIN_SHELL_CACHE_CONTROL = "public, max-age=3600"
+TOKEN_EXCHANGE_URL = "/api/ha_guest_mode/exchange"
+
+ARCHIVE_BATCH_SIZE = 500
+DEFAULT_ARCHIVE_RETENTION_DAYS = 90
+
+EXPORT_CHUNK_SIZE = 500
+IMPORT_CHUNK_SIZE = 500
+
+SNAPSHOT_PAGES_PER_STEP = 64
+SNAPSHOT_STEP_SLEEP = 0.005
+
+MAINTENANCE_VACUUM_PAGES = 256
+MAINTENANCE_MAX_VACUUM_STEPS = 1000
+
+API_BULK_MAX = 500
+API_PAGE_SIZE = 100
+API_PAGE_SIZE_MAX = 1000
+
+SEND_LINKS_CONCURRENCY = 4
+SEND_LINKS_RETRIES = 3
+# Seconds before the first retry, doubled on each further attempt.
+SEND_LINKS_BACKOFF = 2
+
+QR_SHEET_MAX_TOKENS = 1000
+QR_SHEET_MAX_WORKERS = 4
+
+SHORT_CODE_LENGTH = 12
+QR_ERROR_CORRECTION_LEVELS = ["L", "M", "Q", "H"]
+DEFAULT_QR_ERROR_CORRECTION = "M"
+
+# Seconds
+PROFILING_DEFAULT_DURATION = 60
+PROFILING_MAX_DURATION = 3600
+
+# Milliseconds, 0 turns the event loop block monitor off.
+DEFAULT_LOOP_BLOCK_THRESHOLD = 0
+LOOP_MONITOR_STACK_DEPTH = 12
+
+USAGE_FLUSH_SIZE = 100
+USAGE_FLUSH_DELAY = 5
+
+# Seconds; scheduled tokens get their HA credentials PREWARM_LEAD to
+# PREWARM_LEAD + PREWARM_SPREAD before they start.
+PREWARM_LEAD = 300
+PREWARM_SPREAD = 600
+PREWARM_IMMEDIATE_SPREAD = 30
+
+SCHEDULE_HORIZON_DAYS = 400
+
+SIGNAL_TOKENS_UPDATED = f"{DOMAIN}_tokens_updated"
 
 ICONS = [
     "mdi:lock","mdi:lock-open","mdi:key",
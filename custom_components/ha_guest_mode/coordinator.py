@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+from datetime import datetime, timezone
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+
+from .const import DATABASE, SIGNAL_TOKENS_UPDATED
+from .instrumentation import instrumented
+from .schedule import get_compiled_schedule
+from .timestamps import now_ts
+from .token_query import STATUS_ACTIVE, STATUS_EXPIRED, STATUS_SCHEDULED
+from .token_record import TokenRecord, token_record_factory
+
+_LOGGER = logging.getLogger(__name__)
+
+STATUS_EXHAUSTED = "exhausted"
+STATUS_PAUSED = "paused"
+TOKEN_STATES = [STATUS_SCHEDULED, STATUS_ACTIVE, STATUS_PAUSED, STATUS_EXPIRED, STATUS_EXHAUSTED]
+
+
+@callback
+def async_signal_tokens_changed(hass: HomeAssistant) -> None:
+    """Tell listeners that rows in the tokens table were added, changed or removed."""
+    async_dispatcher_send(hass, SIGNAL_TOKENS_UPDATED)
+
+
+def token_status(token: TokenRecord, now: int) -> str:
+    usage_limit = token["usage_limit"]
+    if usage_limit is not None and usage_limit > 0 and (token["times_used"] or 0) >= usage_limit:
+        return STATUS_EXHAUSTED
+    if not token.never_expires:
+        if token["start_ts"] is not None and now < token["start_ts"]:
+            return STATUS_SCHEDULED
+        if token["end_ts"] is None or now >= token["end_ts"]:
+            return STATUS_EXPIRED
+    compiled = get_compiled_schedule(token, now)
+    if compiled is not None and not compiled.is_active(now):
+        return STATUS_PAUSED
+    return STATUS_ACTIVE
+
+
+class GuestTokenCoordinator(DataUpdateCoordinator[dict[int, TokenRecord]]):
+    """Read the tokens table once for every token entity.
+
+    There is no polling interval: the data is refreshed when a token changes,
+    and entities are re-rendered when a token starts or ends.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        super().__init__(hass, _LOGGER, name="ha_guest_mode tokens")
+        self._database_path = hass.config.path(DATABASE)
+        self._unsub_boundary: CALLBACK_TYPE | None = None
+
+    @instrumented
+    async def _async_update_data(self) -> dict[int, TokenRecord]:
+        tokens = await self.hass.async_add_executor_job(self._fetch)
+        self._schedule_next_boundary(tokens)
+        return tokens
+
+    def _fetch(self) -> dict[int, TokenRecord]:
+        conn = sqlite3.connect(self._database_path)
+        conn.row_factory = token_record_factory
+        try:
+            rows = conn.execute(
+                """
+                SELECT id, token_name, userId, dashboard, is_never_expire,
+                       start_ts, end_ts, last_used_ts, times_used, usage_limit,
+                       schedule, COALESCE(token_ha, '') != '' AS has_credentials
+                FROM tokens
+                """
+            ).fetchall()
+        finally:
+            conn.close()
+        return {row["id"]: row for row in rows}
+
+    @callback
+    def _schedule_next_boundary(self, tokens: dict[int, TokenRecord]) -> None:
+        self.async_cancel_boundary()
+        now = now_ts()
+        upcoming = [
+            ts
+            for token in tokens.values()
+            if not token.never_expires
+            for ts in (token["start_ts"], token["end_ts"])
+            if ts is not None and ts > now
+        ]
+        for token in tokens.values():
+            compiled = get_compiled_schedule(token, now)
+            if compiled is not None and (boundary := compiled.next_boundary(now)) is not None:
+                upcoming.append(boundary)
+        if upcoming:
+            self._unsub_boundary = async_track_point_in_utc_time(
+                self.hass,
+                self._async_boundary_reached,
+                datetime.fromtimestamp(min(upcoming), timezone.utc),
+            )
+
+    @callback
+    def _async_boundary_reached(self, _now) -> None:
+        self._unsub_boundary = None
+        self.async_update_listeners()
+        if self.data:
+            self._schedule_next_boundary(self.data)
+
+    @callback
+    def async_cancel_boundary(self) -> None:
+        if self._unsub_boundary is not None:
+            self._unsub_boundary()
+            self._unsub_boundary = None
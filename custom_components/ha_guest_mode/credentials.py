@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import timedelta
+
+from homeassistant.auth.models import TOKEN_TYPE_LONG_LIVED_ACCESS_TOKEN
+from homeassistant.core import HomeAssistant
+
+from .const import DATABASE, DOMAIN
+from .schedule import access_end
+from .token_record import TokenRecord
+
+
+class CredentialError(Exception):
+    """Raised when no HA credentials can be issued; the message is a translation label."""
+
+
+async def async_issue_credentials(hass: HomeAssistant, token: TokenRecord, now: int) -> str:
+    """Create the HA refresh and access token for a guest token and store them.
+
+    Shared by the login view and the prewarmer. Returns the access token.
+    """
+    reconciler = hass.data[DOMAIN]["auth_reconciler"]
+
+    user = await hass.auth.async_get_user(token["userId"])
+    if user is None and token["managed_user"]:
+        user = await reconciler.async_restore_managed_user(token["userId"])
+    if user is None:
+        raise CredentialError("user_not_found")
+
+    token_args = {
+        "client_name": token["token_name"],
+        "token_type": TOKEN_TYPE_LONG_LIVED_ACCESS_TOKEN,
+    }
+    end = access_end(token, now)
+    if end is not None:
+        # Relative to now, so the access token expires at the end of the token
+        # (or of the scheduled window) whenever it is minted.
+        token_args["access_token_expiration"] = timedelta(seconds=end - now)
+
+    try:
+        refresh_token = await hass.auth.async_create_refresh_token(user, **token_args)
+    except ValueError:
+        refresh_token = next(
+            (rt for rt in user.refresh_tokens.values() if rt.client_name == token["token_name"]),
+            None,
+        )
+        if refresh_token is None:
+            raise CredentialError("internal_server_error") from None
+
+    access_token = hass.auth.async_create_access_token(refresh_token)
+    await hass.async_add_executor_job(
+        _store_credentials, hass.config.path(DATABASE), token["id"], refresh_token.id, access_token
+    )
+    reconciler.async_track_refresh_token(refresh_token.id)
+    return access_token
+
+
+def _store_credentials(database_path: str, token_id: int, refresh_token_id: str, access_token: str) -> None:
+    conn = sqlite3.connect(database_path)
+    try:
+        with conn:
+            conn.execute(
+                "UPDATE tokens SET token_ha_id = ?, token_ha = ? WHERE id = ?",
+                (refresh_token_id, access_token, token_id),
+            )
+    finally:
+        conn.close()
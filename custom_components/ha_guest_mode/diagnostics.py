@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, config_entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    domain_data = hass.data.get(DOMAIN, {})
+    maintenance = domain_data.get("maintenance")
+    loop_monitor = domain_data.get("loop_monitor")
+    return {
+        "version": domain_data.get("version"),
+        "options": dict(config_entry.options),
+        "startup_timings": domain_data.get("startup_timings", {}),
+        "last_backup_snapshot": domain_data.get("last_backup_snapshot"),
+        "last_maintenance": maintenance.last_result if maintenance else None,
+        "loop_blocking": loop_monitor.as_dict() if loop_monitor else None,
+    }
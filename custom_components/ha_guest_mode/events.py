@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN
+
+EVENT_TOKEN_USED = f"{DOMAIN}_token_used"
+EVENT_TOKEN_CREATED = f"{DOMAIN}_token_created"
+EVENT_TOKEN_EXPIRED = f"{DOMAIN}_token_expired"
+EVENT_TOKEN_DELETED = f"{DOMAIN}_token_deleted"
+
+
+def token_event_data(token: Mapping[str, Any], **extra: Any) -> dict[str, Any]:
+    """Build the event payload from a tokens row (or any mapping with the same keys)."""
+    return {
+        "token_id": token["id"],
+        "token_name": token["token_name"],
+        "user_id": token["userId"],
+        "dashboard": token["dashboard"],
+        "times_used": token["times_used"] or 0,
+        "usage_limit": token["usage_limit"],
+        **extra,
+    }
+
+
+@callback
+def async_fire_token_event(hass: HomeAssistant, event_type: str, token: Mapping[str, Any], **extra: Any) -> None:
+    # async_fire only schedules the listeners, callers never wait on automations.
+    hass.bus.async_fire(event_type, token_event_data(token, **extra))
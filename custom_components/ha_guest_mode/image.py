@@ -1,12 +1,14 @@
 
 import logging
 import sqlite3
-import qrcode
 import io
 from homeassistant.components.image import ImageEntity
 from homeassistant.helpers.entity import DeviceInfo
-from homeassistant.helpers.network import get_url, NoURLAvailableError
-from .const import DOMAIN, DATABASE
+from .const import DEFAULT_QR_ERROR_CORRECTION, DOMAIN, DATABASE
+from .instrumentation import instrumented
+from .links import guest_login_url
+from .qr_sheet import make_qr
+from .token_record import token_record_factory
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -58,6 +60,7 @@ class GuestQRCodeImage(ImageEntity):
         self.async_write_ha_state()
 
 
+    @instrumented
     async def async_update(self):
         """Update the QR code and attributes."""
         self._token_attributes = {}
@@ -74,10 +77,10 @@ class GuestQRCodeImage(ImageEntity):
                         "user": user_name,
                         "token_name": row.get("token_name"),
                         "dashboard": row.get("dashboard"),
-                        "start_date": row.get("start_date"),
-                        "end_date": row.get("end_date"),
-                        "first_used": row.get("first_used"),
-                        "last_used": row.get("last_used"),
+                        "start_date": row.start_iso,
+                        "end_date": row.end_iso,
+                        "first_used": row.first_used_iso,
+                        "last_used": row.last_used_iso,
                         "times_used": row.get("times_used"),
                         "usage_limit": row.get("usage_limit"),
                         "uid": row.get("uid"),
@@ -86,10 +89,10 @@ class GuestQRCodeImage(ImageEntity):
 
             self._token_attributes = {"tokens": tokens}
 
-            first_uid = token_rows[0].get("uid")
-            if first_uid:
-                self._image_bytes = await self.hass.async_add_executor_job(self._generate_qr_code, first_uid)
+            if token_rows[0].get("uid"):
+                self._image_bytes = await self.hass.async_add_executor_job(self._generate_qr_code, token_rows[0])
 
+    @instrumented
     async def async_image(self):
         """Return bytes of image."""
         if self._image_bytes is None:
@@ -99,18 +102,19 @@ class GuestQRCodeImage(ImageEntity):
     def _get_all_token_rows(self):
         """Fetch all token rows from the database ordered by newest first."""
         conn = sqlite3.connect(self.hass.config.path(DATABASE))
-        conn.row_factory = sqlite3.Row
+        conn.row_factory = token_record_factory
         cursor = conn.cursor()
         cursor.execute(
             """
-            SELECT userId, token_name, dashboard, start_date, end_date, first_used, last_used, times_used, usage_limit, uid, managed_user_name
+            SELECT userId, token_name, dashboard, start_date, end_date, first_used, last_used, times_used, usage_limit, uid, short_code, managed_user_name,
+                   start_ts, end_ts, first_used_ts, last_used_ts
             FROM tokens
             ORDER BY id DESC
             """
         )
         rows = cursor.fetchall()
         conn.close()
-        return [dict(row) for row in rows] if rows else []
+        return rows
 
     async def _resolve_user_name(self, user_id, managed_user_name):
         """Resolve a human-friendly user label for attributes."""
@@ -123,19 +127,16 @@ class GuestQRCodeImage(ImageEntity):
 
         return managed_user_name or user_id
  
-    def _generate_qr_code(self, uid):
-        """Generate the QR code for the provided token uid."""
-        if not uid:
+    @instrumented
+    def _generate_qr_code(self, token_row):
+        """Generate the QR code for the provided token row."""
+        if not token_row.get("uid"):
             return None
 
-        try:
-            base_url = get_url(self.hass, prefer_external=True)
-        except NoURLAvailableError:
-            base_url = get_url(self.hass)
-        guest_login_path = self.hass.data.get("get_path_to_login", "/guest-mode/login")
-        full_url = f"{base_url}{guest_login_path}?token={uid}"
-        
-        img = qrcode.make(full_url)
+        full_url = guest_login_url(self.hass, token_row)
+        error_correction = self.hass.data.get("qr_error_correction", DEFAULT_QR_ERROR_CORRECTION)
+
+        img = make_qr(full_url, error_correction).make_image()
         buf = io.BytesIO()
         img.save(buf, "PNG")
         return buf.getvalue()
@@ -0,0 +1,96 @@
+"""Decorator for the integration's entry points.
+
+``instrumented`` feeds the debug tools with the handler's own work: the
+profiling session started by the ``start_profiling`` service and the event
+loop block monitor enabled by the ``loop_block_threshold`` option. With both
+off, a call costs two global lookups.
+
+Coroutines are driven one step at a time, between two awaits, so the time
+other tasks spend on the event loop while a handler waits is never attributed
+to it.
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+from collections.abc import Callable, Coroutine, Generator
+from typing import Any
+
+from .loop_monitor import LoopBlockMonitor, current_monitor
+from .profiling import ProfilingSession, current_session
+
+
+class _InstrumentedCoroutine:
+    """Drive a coroutine, profiling and timing each step it runs on the event loop."""
+
+    __slots__ = ("_coro", "_name", "_session", "_monitor")
+
+    def __init__(self, coro: Coroutine, name: str, session: ProfilingSession | None, monitor: LoopBlockMonitor | None):
+        self._coro = coro
+        self._name = name
+        self._session = session
+        self._monitor = monitor
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        send_value, error = None, None
+        while True:
+            step = self._monitor.step_started(self._name) if self._monitor is not None else None
+            enabled = self._session is not None and self._session.try_enable()
+            try:
+                if error is not None:
+                    yielded = self._coro.throw(error)
+                else:
+                    yielded = self._coro.send(send_value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                if enabled:
+                    self._session.disable()
+                if self._monitor is not None:
+                    self._monitor.step_finished(step, self._coro.cr_frame)
+            try:
+                send_value, error = (yield yielded), None
+            except BaseException as err:  # noqa: BLE001 - forwarded into the coroutine
+                send_value, error = None, err
+
+
+def instrumented(func: Callable) -> Callable:
+    """Profile and time ``func`` while a debug tool is on, a no-op otherwise."""
+    name = f"{func.__module__.rpartition('.')[2]}.{func.__qualname__}"
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            session = current_session()
+            monitor = current_monitor()
+            if session is None and monitor is None:
+                return await func(*args, **kwargs)
+            if session is not None:
+                session.calls += 1
+            return await _InstrumentedCoroutine(func(*args, **kwargs), name, session, monitor)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session = current_session()
+        monitor = current_monitor()
+        if monitor is not None and not monitor.on_loop():
+            # Executor jobs cannot block the loop.
+            monitor = None
+        if session is None and monitor is None:
+            return func(*args, **kwargs)
+        enabled = session is not None and session.try_enable()
+        if enabled:
+            session.calls += 1
+        step = monitor.step_started(name) if monitor is not None else None
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if enabled:
+                session.disable()
+            if monitor is not None:
+                monitor.step_finished(step, None)
+
+    return wrapper
@@ -1,54 +1,88 @@
-import os
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.backends import default_backend
 import asyncio
+import logging
+import os
 
 from .const import KEY_FILE_PATH
+from .instrumentation import instrumented
+
+_LOGGER = logging.getLogger(__name__)
 
 class KeyManager:
-    def __init__(self, key_file_path=KEY_FILE_PATH):
+    """Signing key pair, loaded (or generated) the first time a token is signed or checked.
+
+    Nothing is read at startup, so cryptography is only imported once a token
+    is created or a guest logs in.
+    """
+
+    def __init__(self, hass, key_file_path=KEY_FILE_PATH):
+        self.hass = hass
         self.key_file_path = key_file_path
         self.private_key = None
         self.public_key = None
+        self._lock = asyncio.Lock()
+
+    async def async_get_private_key(self):
+        """Return the private key, None when it cannot be loaded."""
+        if self.private_key is None:
+            await self._async_load()
+        return self.private_key
 
-    async def load_or_generate_key(self):
+    async def async_get_public_key(self):
+        """Return the public key, None when the key pair cannot be loaded."""
+        if self.public_key is None:
+            await self._async_load()
+        return self.public_key
+
+    async def _async_load(self):
+        # Concurrent first uses must not both generate a key.
+        async with self._lock:
+            if self.private_key is None:
+                try:
+                    await self.load_or_generate_key(self.hass)
+                except (OSError, ValueError):
+                    _LOGGER.exception("Could not load the guest mode signing key from %s", self.key_file_path)
+
+    @instrumented
+    async def load_or_generate_key(self, hass):
+        # File access and RSA generation are blocking, keep them off the event loop.
+        private_key = await hass.async_add_executor_job(self._load_or_generate_key)
+        self.public_key = private_key.public_key()
+        self.private_key = private_key
+
+    def _load_or_generate_key(self):
         if os.path.exists(self.key_file_path):
-            await self._load_key()
-        else:
-            await self._generate_key()
+            return self._read_key_from_file()
+        return self._generate_key()
 
-    async def _generate_key(self):
-        self.private_key = rsa.generate_private_key(
+    def _generate_key(self):
+        # cryptography is only needed here, import it lazily to keep startup light.
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.hazmat.primitives import serialization
+
+        private_key = rsa.generate_private_key(
             public_exponent=65537,
             key_size=2048,
-            backend=default_backend()
         )
 
-        pem_data = self.private_key.private_bytes(
+        pem_data = private_key.private_bytes(
             encoding=serialization.Encoding.PEM,
             format=serialization.PrivateFormat.PKCS8,
             encryption_algorithm=serialization.NoEncryption()
         )
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, self._write_key_to_file, pem_data)
-        self.public_key = self.private_key.public_key()
+        self._write_key_to_file(pem_data)
+        return private_key
 
     def _write_key_to_file(self, pem_data):
         with open(self.key_file_path, "wb") as key_file:
             key_file.write(pem_data)
 
-    async def _load_key(self):
-        loop = asyncio.get_running_loop()
-        self.private_key = await loop.run_in_executor(None, self._read_key_from_file)
-        self.public_key = self.private_key.public_key()
-
     def _read_key_from_file(self):
+        from cryptography.hazmat.primitives import serialization
+
         with open(self.key_file_path, "rb") as key_file:
             return serialization.load_pem_private_key(
                 key_file.read(),
                 password=None,
-                backend=default_backend()
             )
 
     def get_private_key(self):
@@ -0,0 +1,101 @@
+"""Send guest login links through notify services.
+
+Sends run concurrently up to SEND_LINKS_CONCURRENCY, but one at a time per
+notify service, so a bulk send cannot flood a single notifier. A failed send
+is retried with exponential backoff while that notifier's other messages wait.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ServiceNotFound, ServiceValidationError, TemplateError
+from homeassistant.helpers.template import Template
+
+from .const import SEND_LINKS_BACKOFF, SEND_LINKS_CONCURRENCY, SEND_LINKS_RETRIES
+from .links import guest_base_url, guest_login_url
+from .repository import serialize_token
+from .timestamps import now_ts
+from .token_record import TokenRecord
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_send_links(
+    hass: HomeAssistant,
+    tokens: list[TokenRecord],
+    target: Template,
+    message: Template,
+    title: Template | None = None,
+) -> dict[str, Any]:
+    """Send each token's link to the notify service rendered from ``target``.
+
+    Templates get ``token`` (as listed by the REST API) and ``url``. Returns
+    how many links were sent and the tokens that failed, with the reason.
+    """
+    base_url = guest_base_url(hass)
+    now = now_ts()
+    failed: list[dict[str, Any]] = []
+    jobs: list[tuple[TokenRecord, str, dict[str, Any]]] = []
+
+    for token in tokens:
+        variables = {"token": serialize_token(token, now), "url": guest_login_url(hass, token, base_url)}
+        try:
+            service = target.async_render(variables, parse_result=False).strip()
+            data = {"message": message.async_render(variables, parse_result=False)}
+            if title is not None:
+                data["title"] = title.async_render(variables, parse_result=False)
+        except TemplateError as err:
+            failed.append(_failure(token, None, str(err)))
+            continue
+
+        domain, _, name = service.partition(".")
+        if domain != "notify" or not hass.services.has_service(domain, name):
+            failed.append(_failure(token, service, "notify service not found"))
+            continue
+        jobs.append((token, name, data))
+
+    semaphore = asyncio.Semaphore(SEND_LINKS_CONCURRENCY)
+    target_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+    sent = 0
+
+    async def send(token: TokenRecord, name: str, data: dict[str, Any]) -> None:
+        nonlocal sent
+        async with target_locks[name]:
+            error = await _async_notify(hass, semaphore, name, data)
+        if error is None:
+            sent += 1
+        else:
+            failed.append(_failure(token, f"notify.{name}", error))
+
+    await asyncio.gather(*(send(*job) for job in jobs))
+    return {"sent": sent, "failed": failed}
+
+
+async def _async_notify(hass: HomeAssistant, semaphore: asyncio.Semaphore, name: str, data: dict[str, Any]) -> str | None:
+    """Call a notify service with retries, return the last error or None once sent."""
+    for attempt in range(SEND_LINKS_RETRIES + 1):
+        async with semaphore:
+            try:
+                await hass.services.async_call("notify", name, data, blocking=True)
+                return None
+            except (ServiceNotFound, ServiceValidationError, vol.Invalid) as err:
+                return str(err)
+            except Exception as err:  # noqa: BLE001 - notifiers raise anything
+                error = str(err) or type(err).__name__
+        if attempt < SEND_LINKS_RETRIES:
+            delay = SEND_LINKS_BACKOFF * 2**attempt * random.uniform(1, 1.5)
+            _LOGGER.debug("Sending a guest link with notify.%s failed (%s), retrying in %.1fs", name, error, delay)
+            # Outside the semaphore, so other notifiers keep going meanwhile.
+            await asyncio.sleep(delay)
+    return error
+
+
+def _failure(token: TokenRecord, target: str | None, error: str) -> dict[str, Any]:
+    return {"token_id": token["id"], "token_name": token["token_name"], "target": target, "error": error}
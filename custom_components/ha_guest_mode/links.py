@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import base64
+import secrets
+from collections.abc import Mapping
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.network import NoURLAvailableError, get_url
+
+from .const import SHORT_CODE_LENGTH
+
+
+def new_short_code() -> str:
+    """Random 60-bit code made of A-Z and 2-7.
+
+    12 characters instead of the 36 of the uid, so the link is shorter and its
+    QR code needs fewer modules. The link as a whole is still lowercase, so it
+    is encoded in byte mode; the alphabet only keeps the code unambiguous when
+    typed, and lookups upper-case it.
+    """
+    return base64.b32encode(secrets.token_bytes(8)).decode()[:SHORT_CODE_LENGTH]
+
+
+def link_token(hass: HomeAssistant, token: Mapping[str, Any]) -> str:
+    """The value for ``?token=``, the short code when compact links are on."""
+    if hass.data.get("compact_links") and token["short_code"]:
+        return token["short_code"]
+    return token["uid"]
+
+
+def guest_base_url(hass: HomeAssistant) -> str:
+    """Base URL for guest links, the external one when configured."""
+    try:
+        return get_url(hass, prefer_external=True)
+    except NoURLAvailableError:
+        return get_url(hass)
+
+
+def guest_login_url(hass: HomeAssistant, token: Mapping[str, Any], base_url: str | None = None) -> str:
+    """Full login link for a token row; pass ``base_url`` when building many."""
+    if base_url is None:
+        base_url = guest_base_url(hass)
+    guest_login_path = hass.data.get("get_path_to_login", "/guest-mode/login")
+    return f"{base_url}{guest_login_path}?token={link_token(hass, token)}"
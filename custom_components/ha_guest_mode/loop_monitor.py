@@ -0,0 +1,148 @@
+"""Detect integration handlers that block the event loop.
+
+Handlers decorated with ``instrumented`` report each step they run on the
+event loop, from one await to the next. A step longer than the threshold is
+logged with a stack excerpt and counted against the handler, and the worst
+step of every handler is kept for the diagnostics.
+
+The stack is sampled by a watchdog thread while the step is still running, so
+it shows where the loop is stuck rather than where the handler resumed. Only
+the outermost instrumented step is timed: a handler awaiting another one is
+charged for the whole step.
+"""
+from __future__ import annotations
+
+import logging
+import sys
+import threading
+import time
+import traceback
+from types import FrameType
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, LOOP_MONITOR_STACK_DEPTH
+
+_LOGGER = logging.getLogger(__name__)
+
+_monitor: LoopBlockMonitor | None = None
+
+
+def current_monitor() -> LoopBlockMonitor | None:
+    return _monitor
+
+
+def _format_stack(frame: FrameType | None) -> str | None:
+    if frame is None:
+        return None
+    # The instrumentation wrappers sit between every two handler frames.
+    stack = [entry for entry in traceback.extract_stack(frame) if not entry.filename.endswith("instrumentation.py")]
+    return "".join(traceback.format_list(stack[-LOOP_MONITOR_STACK_DEPTH:]))
+
+
+class LoopBlockMonitor:
+    def __init__(self, threshold_ms: int):
+        self.threshold_ms = threshold_ms
+        self.started_at = dt_util.utcnow()
+        self.handlers: dict[str, dict[str, Any]] = {}
+        self._threshold = threshold_ms / 1000
+        self._loop_thread_id = threading.get_ident()
+        self._depth = 0
+        self._step = 0
+        # (step, handler, start) of the step running now, set on the loop only.
+        self._running: tuple[int, str, float] | None = None
+        # (step, stack) sampled by the watchdog for a step past the threshold.
+        self._sampled: tuple[int, str | None] | None = None
+        self._stopped = threading.Event()
+        self._watchdog = threading.Thread(target=self._watch, name=f"{DOMAIN}_loop_monitor", daemon=True)
+
+    def start(self) -> None:
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def on_loop(self) -> bool:
+        return threading.get_ident() == self._loop_thread_id
+
+    def step_started(self, handler: str) -> int | None:
+        """Mark the start of a step, return its id or None for a nested step."""
+        self._depth += 1
+        if self._depth > 1:
+            return None
+        self._step += 1
+        self._running = (self._step, handler, time.perf_counter())
+        return self._step
+
+    def step_finished(self, step: int | None, frame: FrameType | None) -> None:
+        """Record the step started as ``step``, ``frame`` is where the handler paused."""
+        self._depth -= 1
+        if step is None or self._running is None:
+            return
+        _step, handler, start = self._running
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._running = None
+
+        stats = self.handlers.get(handler)
+        if stats is None:
+            stats = self.handlers[handler] = {"steps": 0, "blocking_steps": 0, "worst_ms": 0.0, "worst_at": None, "worst_stack": None}
+        stats["steps"] += 1
+        if elapsed_ms < stats["worst_ms"] and elapsed_ms < self.threshold_ms:
+            return
+
+        sampled = self._sampled
+        stack = sampled[1] if sampled is not None and sampled[0] == step else None
+        if elapsed_ms >= self.threshold_ms:
+            stats["blocking_steps"] += 1
+            stack = stack or _format_stack(frame)
+            _LOGGER.warning(
+                "%s blocked the event loop for %.0f ms (threshold %d ms):\n%s",
+                handler,
+                elapsed_ms,
+                self.threshold_ms,
+                stack or "no stack available",
+            )
+        if elapsed_ms >= stats["worst_ms"]:
+            stats["worst_ms"] = round(elapsed_ms, 3)
+            stats["worst_at"] = dt_util.utcnow().isoformat()
+            stats["worst_stack"] = stack
+
+    def _watch(self) -> None:
+        interval = max(self._threshold / 4, 0.001)
+        while not self._stopped.wait(interval):
+            running = self._running
+            if running is None or time.perf_counter() - running[2] < self._threshold:
+                continue
+            sampled = self._sampled
+            if sampled is not None and sampled[0] == running[0]:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            # The step may have ended while the frame was fetched.
+            if self._running is running:
+                self._sampled = (running[0], _format_stack(frame))
+
+    def as_dict(self) -> dict[str, Any]:
+        """Handlers sorted by their worst step, for the diagnostics."""
+        return {
+            "threshold_ms": self.threshold_ms,
+            "since": self.started_at.isoformat(),
+            "handlers": dict(sorted(self.handlers.items(), key=lambda item: item[1]["worst_ms"], reverse=True)),
+        }
+
+
+@callback
+def async_configure_loop_monitor(hass: HomeAssistant, threshold_ms: int) -> None:
+    """Start, restart with a new threshold or stop (threshold 0) the monitor."""
+    global _monitor
+    if _monitor is not None and _monitor.threshold_ms == threshold_ms:
+        return
+    if _monitor is not None:
+        _monitor.stop()
+        _monitor = None
+    if threshold_ms > 0:
+        _monitor = LoopBlockMonitor(threshold_ms)
+        _monitor.start()
+        _LOGGER.info("Reporting guest mode handlers that block the event loop for more than %d ms", threshold_ms)
+    hass.data[DOMAIN]["loop_monitor"] = _monitor
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .const import DATABASE, MAINTENANCE_MAX_VACUUM_STEPS, MAINTENANCE_VACUUM_PAGES
+from .instrumentation import instrumented
+
+_LOGGER = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL_DAYS = 7
+
+_AUTO_VACUUM_INCREMENTAL = 2
+_COUNTED_TABLES = ("tokens", "tokens_archive", "token_usage_events", "token_usage_rollups")
+
+
+def _page_stats(conn) -> dict[str, int]:
+    return {
+        "page_size": conn.execute("PRAGMA page_size").fetchone()[0],
+        "page_count": conn.execute("PRAGMA page_count").fetchone()[0],
+        "freelist_count": conn.execute("PRAGMA freelist_count").fetchone()[0],
+    }
+
+
+def run_maintenance(database_path: str) -> dict[str, Any]:
+    """Compact, analyze and check the database. Runs in the executor.
+
+    The first run switches the file to incremental auto-vacuum, which needs one
+    full VACUUM; afterwards free pages are released in bounded steps so a
+    concurrent login never waits on a long exclusive lock.
+    """
+    started = time.perf_counter()
+    conn = sqlite3.connect(database_path, isolation_level=None)
+    try:
+        before = _page_stats(conn)
+
+        converted = False
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != _AUTO_VACUUM_INCREMENTAL:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            converted = True
+
+        vacuum_steps = 0
+        while (
+            vacuum_steps < MAINTENANCE_MAX_VACUUM_STEPS
+            and conn.execute("PRAGMA freelist_count").fetchone()[0] > 0
+        ):
+            conn.execute(f"PRAGMA incremental_vacuum({MAINTENANCE_VACUUM_PAGES})").fetchall()
+            vacuum_steps += 1
+            time.sleep(0)
+
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+
+        integrity = [row[0] for row in conn.execute("PRAGMA integrity_check(10)")]
+
+        existing_tables = {
+            row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+        row_counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in _COUNTED_TABLES
+            if table in existing_tables
+        }
+
+        after = _page_stats(conn)
+    finally:
+        conn.close()
+
+    return {
+        "before": before,
+        "after": after,
+        "converted_to_incremental_vacuum": converted,
+        "vacuum_steps": vacuum_steps,
+        "integrity": "ok" if integrity == ["ok"] else integrity,
+        "row_counts": row_counts,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+class DatabaseMaintenance:
+    """Serialize maintenance runs from the service and the weekly schedule."""
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._lock = asyncio.Lock()
+        self.last_result: dict[str, Any] | None = None
+
+    @instrumented
+    async def async_run(self, _now=None) -> dict[str, Any]:
+        async with self._lock:
+            result = await self.hass.async_add_executor_job(
+                run_maintenance, self.hass.config.path(DATABASE)
+            )
+        result["finished_at"] = dt_util.utcnow().isoformat()
+        self.last_result = result
+        if result["integrity"] != "ok":
+            _LOGGER.error("Guest mode database integrity check failed: %s", result["integrity"])
+        else:
+            _LOGGER.debug("Guest mode database maintenance finished: %s", result)
+        return result
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from typing import Any, Iterable
+
+from homeassistant.core import HomeAssistant
+
+from .const import DATABASE
+
+
+async def async_get_all_groups(hass: HomeAssistant):
+    """Return all auth groups, compatible with multiple HA versions."""
+    auth = hass.auth
+    groups = []
+
+    store = getattr(auth, "_store", None)
+    if store is not None:
+        getter = getattr(store, "async_get_groups", None)
+        if getter is not None:
+            groups = await getter()
+            return list(groups)
+
+    # Fallback to fetching known groups individually
+    potential_ids = ("system-admin", "system-users", "system-read-only")
+    getter = getattr(auth, "async_get_group", None)
+    if getter is not None:
+        for group_id in potential_ids:
+            group = await getter(group_id)
+            if group is not None:
+                groups.append(group)
+
+    return groups
+
+
+def _stored_group_ids(token: Any, available_group_ids: set[str]) -> list[str]:
+    stored_groups = token["managed_user_groups"]
+    group_ids: list[str] = []
+    if stored_groups:
+        try:
+            parsed = json.loads(stored_groups)
+            if isinstance(parsed, list):
+                group_ids = [gid for gid in parsed if gid in available_group_ids]
+        except (ValueError, TypeError):
+            group_ids = []
+    return list(dict.fromkeys(group_ids))  # preserve order, ensure unique
+
+
+async def async_create_managed_user(hass: HomeAssistant, token: Any, available_group_ids: set[str] | None = None):
+    """Recreate the dedicated user described by a managed token row.
+
+    Returns the new user and the values to store back on the token row, or
+    ``(None, None)`` if HA refused to create the user.
+    """
+    if available_group_ids is None:
+        available_group_ids = {group.id for group in await async_get_all_groups(hass)}
+
+    group_ids = _stored_group_ids(token, available_group_ids)
+
+    local_only_flag = None
+    if token["managed_user_local_only"] is not None:
+        local_only_flag = bool(token["managed_user_local_only"])
+
+    user_name = token["managed_user_name"] or token["token_name"] or "Guest"
+    try:
+        user = await hass.auth.async_create_user(
+            user_name,
+            group_ids=group_ids or None,
+            local_only=local_only_flag,
+        )
+    except ValueError:
+        return None, None
+
+    values = {
+        "userId": user.id,
+        "managed_user_name": user.name,
+        "managed_user_groups": json.dumps(group_ids) if group_ids else None,
+        "managed_user_local_only": 1 if user.local_only else 0,
+    }
+    return user, values
+
+
+def update_managed_user_rows(cursor, old_user_id: str, values: dict[str, Any]) -> None:
+    """Point every token of a vanished managed user at its replacement."""
+    cursor.execute(
+        """
+        UPDATE tokens
+        SET userId = ?, managed_user_name = ?, managed_user_groups = ?, managed_user_local_only = ?,
+            token_ha_id = '', token_ha = ''
+        WHERE userId = ? AND managed_user = 1
+        """,
+        (
+            values["userId"],
+            values["managed_user_name"],
+            values["managed_user_groups"],
+            values["managed_user_local_only"],
+            old_user_id,
+        ),
+    )
+
+
+def _users_with_tokens(database_path: str, user_ids: list[str]) -> set[str]:
+    conn = sqlite3.connect(database_path)
+    try:
+        placeholders = ",".join("?" * len(user_ids))
+        cursor = conn.execute(
+            f"SELECT DISTINCT userId FROM tokens WHERE userId IN ({placeholders})", tuple(user_ids)
+        )
+        return {row[0] for row in cursor}
+    finally:
+        conn.close()
+
+
+async def async_remove_unused_managed_users(hass: HomeAssistant, user_ids: Iterable[str]) -> None:
+    """Remove dedicated users once none of their tokens are left."""
+    user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id]
+    if not user_ids:
+        return
+
+    still_used = await hass.async_add_executor_job(
+        _users_with_tokens, hass.config.path(DATABASE), user_ids
+    )
+    for user_id in user_ids:
+        if user_id in still_used:
+            continue
+        user = await hass.auth.async_get_user(user_id)
+        if user and not user.system_generated:
+            await hass.auth.async_remove_user(user)
@@ -1,3 +1,8 @@
+import sqlite3
+
+from .links import new_short_code
+from .timestamps import EPOCH_COLUMNS, to_ts
+
 def migration(cursor):
     cursor.execute("PRAGMA table_info(tokens)")
     columns = {column[1]: column for column in cursor.fetchall()}
@@ -73,3 +78,62 @@ def migration(cursor):
 
     if "managed_user_local_only" not in columns:
         cursor.execute("ALTER TABLE tokens ADD COLUMN managed_user_local_only BOOLEAN")
+
+    if "schedule" not in columns:
+        cursor.execute("ALTER TABLE tokens ADD COLUMN schedule TEXT")
+
+    if "allowed_networks" not in columns:
+        cursor.execute("ALTER TABLE tokens ADD COLUMN allowed_networks TEXT")
+
+    if "event_id" not in columns:
+        cursor.execute("ALTER TABLE tokens ADD COLUMN event_id TEXT")
+
+    if "short_code" not in columns:
+        cursor.execute("ALTER TABLE tokens ADD COLUMN short_code TEXT")
+
+    cursor.execute("SELECT id FROM tokens WHERE short_code IS NULL")
+    missing = [(new_short_code(), token_id) for (token_id,) in cursor.fetchall()]
+    if missing:
+        cursor.executemany("UPDATE tokens SET short_code = ? WHERE id = ?", missing)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tokens_user_id ON tokens (userId)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tokens_token_ha_id ON tokens (token_ha_id)")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tokens_event_id ON tokens (event_id)")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tokens_short_code ON tokens (short_code)")
+
+    try:
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tokens_uid ON tokens (uid)")
+    except sqlite3.IntegrityError:
+        # Duplicated legacy uids, keep the lookup index without the constraint.
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tokens_uid_lookup ON tokens (uid)")
+
+
+def migrate_epoch_columns(cursor, legacy_tz):
+    """Add the UTC epoch columns and backfill them from the ISO text columns.
+
+    Naive legacy strings were written with the local clock, so they are read
+    in ``legacy_tz``. Runs on every start, which also catches rows written by
+    an older release after a downgrade.
+    """
+    cursor.execute("PRAGMA table_info(tokens)")
+    columns = {column[1] for column in cursor.fetchall()}
+
+    for text_column, ts_column in EPOCH_COLUMNS:
+        if ts_column not in columns:
+            cursor.execute(f"ALTER TABLE tokens ADD COLUMN {ts_column} INTEGER")
+
+        cursor.execute(
+            f"SELECT id, {text_column} FROM tokens WHERE {ts_column} IS NULL AND {text_column} IS NOT NULL AND {text_column} != ''"
+        )
+        updates = []
+        for token_id, value in cursor.fetchall():
+            try:
+                updates.append((to_ts(value, legacy_tz), token_id))
+            except (TypeError, ValueError):
+                continue
+        if updates:
+            cursor.executemany(f"UPDATE tokens SET {ts_column} = ? WHERE id = ?", updates)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tokens_start_ts ON tokens (start_ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tokens_end_ts ON tokens (end_ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tokens_last_used_ts ON tokens (last_used_ts)")
@@ -0,0 +1,95 @@
+"""Client network allowlists for the login view.
+
+Networks are stored as a JSON list of CIDR strings per token, with a global
+default from the options. Each distinct list is compiled once into a binary
+prefix trie, so a lookup walks at most 32 (IPv4) or 128 (IPv6) bits no matter
+how many networks are allowed.
+"""
+from __future__ import annotations
+
+import json
+import re
+from functools import lru_cache
+from ipaddress import IPv4Address, IPv6Address, ip_address, ip_network
+
+# Node layout: [child for bit 0, child for bit 1, terminal]
+_ZERO, _ONE, _TERMINAL = 0, 1, 2
+
+
+def parse_networks(value: str | list[str] | None) -> tuple[str, ...]:
+    """Validate and normalise networks given as a list or a comma separated string.
+
+    Raises ValueError on an invalid network.
+    """
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = re.split(r"[\s,]+", value)
+    networks = {str(ip_network(item.strip(), strict=False)) for item in value if item.strip()}
+    return tuple(sorted(networks))
+
+
+def dump_networks(value: str | list[str] | None) -> str | None:
+    networks = parse_networks(value)
+    return json.dumps(list(networks)) if networks else None
+
+
+def load_networks(value: str | None) -> tuple[str, ...]:
+    return tuple(json.loads(value)) if value else ()
+
+
+class NetworkTrie:
+    __slots__ = ("_roots",)
+
+    def __init__(self, networks: tuple[str, ...] = ()):
+        self._roots = {4: [None, None, False], 6: [None, None, False]}
+        for network in networks:
+            self.add(network)
+
+    def add(self, network: str) -> None:
+        parsed = ip_network(network, strict=False)
+        node = self._roots[parsed.version]
+        prefix = int(parsed.network_address) >> (parsed.max_prefixlen - parsed.prefixlen)
+        for shift in range(parsed.prefixlen - 1, -1, -1):
+            bit = (prefix >> shift) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, False]
+            node = node[bit]
+        node[_TERMINAL] = True
+
+    def __contains__(self, address: IPv4Address | IPv6Address) -> bool:
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        node = self._roots[address.version]
+        value = int(address)
+        for shift in range(address.max_prefixlen - 1, -1, -1):
+            if node[_TERMINAL]:
+                return True
+            node = node[(value >> shift) & 1]
+            if node is None:
+                return False
+        return node[_TERMINAL]
+
+
+@lru_cache(maxsize=256)
+def compile_networks(networks: tuple[str, ...]) -> NetworkTrie:
+    return NetworkTrie(networks)
+
+
+def client_allowed(remote: str | None, token_networks: str | None, default_networks: tuple[str, ...]) -> bool:
+    """Check a client address against the token's networks, or the default ones.
+
+    ``remote`` comes from request.remote, which HA's http component already
+    resolves from X-Forwarded-For when the request came through a trusted
+    proxy, so proxies are honoured as configured there.
+    """
+    networks = load_networks(token_networks) or default_networks
+    if not networks:
+        return True
+    if not remote:
+        return False
+    try:
+        address = ip_address(remote)
+    except ValueError:
+        return False
+    return address in compile_networks(networks)
@@ -1,7 +1,8 @@
 import voluptuous as vol
 from homeassistant import config_entries
 
-from .const import ICONS
+from .const import DEFAULT_ARCHIVE_RETENTION_DAYS, DEFAULT_LOOP_BLOCK_THRESHOLD, DEFAULT_QR_ERROR_CORRECTION, ICONS, QR_ERROR_CORRECTION_LEVELS
+from .network_filter import parse_networks
 
 class OptionsFlowHandler(config_entries.OptionsFlow):
     """Handle options flow for Guest Mode."""
@@ -11,12 +12,15 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
 
     async def async_step_init(self, user_input=None):
         """Manage the options."""
+        errors = {}
         if user_input is not None:
-            self.hass.config_entries.async_update_entry(
-                self.config_entry, options=user_input
-            )
-            await self.hass.config_entries.async_reload(self.config_entry.entry_id)
-            return self.async_create_entry(title="Guest Mode", data=self.config_entry.options)
+            try:
+                parse_networks(user_input.get("allowed_networks"))
+            except ValueError:
+                errors["allowed_networks"] = "invalid_network"
+            else:
+                # Applied in place by the entry's update listener, no reload.
+                return self.async_create_entry(title="Guest Mode", data=user_input)
 
         tab_icon = self.config_entry.options.get("tab_icon", self.config_entry.data.get("tab_icon", "mdi:shield-key"))
         tab_name = self.config_entry.options.get("tab_name", self.config_entry.data.get("tab_name", "Guest"))
@@ -25,6 +29,13 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         copy_link = self.config_entry.options.get("copy_link_mode", self.config_entry.data.get("copy_link_mode", False))
         default_user = self.config_entry.options.get("default_user", self.config_entry.data.get("default_user", ""))
         default_dashboard = self.config_entry.options.get("default_dashboard", self.config_entry.data.get("default_dashboard", ""))
+        archive_retention_days = self.config_entry.options.get("archive_retention_days", self.config_entry.data.get("archive_retention_days", DEFAULT_ARCHIVE_RETENTION_DAYS))
+        weekly_maintenance = self.config_entry.options.get("weekly_maintenance", self.config_entry.data.get("weekly_maintenance", False))
+        allowed_networks = self.config_entry.options.get("allowed_networks", self.config_entry.data.get("allowed_networks", ""))
+        calendar_entity = self.config_entry.options.get("calendar_entity", self.config_entry.data.get("calendar_entity", ""))
+        compact_links = self.config_entry.options.get("compact_links", self.config_entry.data.get("compact_links", False))
+        qr_error_correction = self.config_entry.options.get("qr_error_correction", self.config_entry.data.get("qr_error_correction", DEFAULT_QR_ERROR_CORRECTION))
+        loop_block_threshold = self.config_entry.options.get("loop_block_threshold", self.config_entry.data.get("loop_block_threshold", DEFAULT_LOOP_BLOCK_THRESHOLD))
         return self.async_show_form(
             step_id="init",
             data_schema=vol.Schema({
@@ -35,5 +46,13 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 vol.Optional("copy_link_mode", default=copy_link): bool,
                 vol.Optional("default_user", default=default_user): str,
                 vol.Optional("default_dashboard", default=default_dashboard): str,
+                vol.Optional("archive_retention_days", default=archive_retention_days): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                vol.Optional("weekly_maintenance", default=weekly_maintenance): bool,
+                vol.Optional("allowed_networks", default=allowed_networks): str,
+                vol.Optional("calendar_entity", default=calendar_entity): str,
+                vol.Optional("compact_links", default=compact_links): bool,
+                vol.Optional("qr_error_correction", default=qr_error_correction): vol.In(QR_ERROR_CORRECTION_LEVELS),
+                vol.Optional("loop_block_threshold", default=loop_block_threshold): vol.All(vol.Coerce(int), vol.Range(min=0)),
             }),
+            errors=errors,
         )
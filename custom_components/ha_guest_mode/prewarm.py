@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import sqlite3
+from functools import partial
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import DATABASE, PREWARM_IMMEDIATE_SPREAD, PREWARM_LEAD, PREWARM_SPREAD
+from .coordinator import STATUS_EXHAUSTED, GuestTokenCoordinator, async_signal_tokens_changed, token_status
+from .credentials import CredentialError, async_issue_credentials
+from .instrumentation import instrumented
+from .schedule import next_access_start
+from .timestamps import now_ts
+from .token_query import STATUS_EXPIRED
+from .token_record import TokenRecord, token_record_factory
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _needs_credentials(token: TokenRecord, now: int) -> bool:
+    # Never-expiring tokens only get a short-lived access token, minting it
+    # ahead would just replace their refresh token over and over.
+    return (
+        not token.never_expires
+        and not token["has_credentials"]
+        and token_status(token, now) not in (STATUS_EXPIRED, STATUS_EXHAUSTED)
+        and next_access_start(token, now) is not None
+    )
+
+
+class CredentialPrewarmer:
+    """Mint the HA refresh and access token of a guest token before its first login.
+
+    Scheduled tokens (and recurring windows) are warmed between PREWARM_LEAD and PREWARM_LEAD +
+    PREWARM_SPREAD seconds before they start, at a random point so that many
+    tokens starting at the same minute do not all hit the auth store at once.
+    Tokens that are already valid are warmed within PREWARM_IMMEDIATE_SPREAD.
+    The login view then only has to validate the stored access token. Tokens
+    that never expire are left to the login view.
+    """
+
+    def __init__(self, hass: HomeAssistant, coordinator: GuestTokenCoordinator):
+        self.hass = hass
+        self.coordinator = coordinator
+        self._database_path = hass.config.path(DATABASE)
+        self._scheduled: dict[int, CALLBACK_TYPE] = {}
+        self._failed: set[int] = set()
+        self._lock = asyncio.Lock()
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        remove_listener = self.coordinator.async_add_listener(self._async_sync)
+        self._async_sync()
+
+        @callback
+        def stop() -> None:
+            remove_listener()
+            for unsub in self._scheduled.values():
+                unsub()
+            self._scheduled.clear()
+
+        return stop
+
+    @callback
+    def _async_sync(self) -> None:
+        tokens = self.coordinator.data or {}
+        now = now_ts()
+        self._failed.intersection_update(tokens)
+        wanted = {
+            token_id
+            for token_id, token in tokens.items()
+            if token_id not in self._failed and _needs_credentials(token, now)
+        }
+
+        for token_id in set(self._scheduled) - wanted:
+            self._scheduled.pop(token_id)()
+
+        for token_id in wanted - set(self._scheduled):
+            start = next_access_start(tokens[token_id], now)
+            if start - PREWARM_LEAD <= now:
+                delay = random.uniform(0, PREWARM_IMMEDIATE_SPREAD)
+            else:
+                delay = max(0, start - PREWARM_LEAD - random.uniform(0, PREWARM_SPREAD) - now)
+            self._scheduled[token_id] = async_call_later(self.hass, delay, partial(self._async_prewarm, token_id))
+
+    @instrumented
+    async def _async_prewarm(self, token_id: int, _now=None) -> None:
+        self._scheduled.pop(token_id, None)
+        async with self._lock:
+            token = await self.hass.async_add_executor_job(self._fetch, token_id)
+            now = now_ts()
+            if token is None or token["token_ha"] or token.never_expires:
+                return
+            start = next_access_start(token, now)
+            if start is None:
+                return
+            if start - PREWARM_LEAD - PREWARM_SPREAD > now:
+                # The start date moved since this run was scheduled.
+                self._async_sync()
+                return
+
+            try:
+                await async_issue_credentials(self.hass, token, now)
+            except CredentialError as err:
+                _LOGGER.debug("Unable to prewarm credentials of token %s: %s", token_id, err)
+                self._failed.add(token_id)
+                return
+
+        async_signal_tokens_changed(self.hass)
+
+    def _fetch(self, token_id: int) -> TokenRecord | None:
+        conn = sqlite3.connect(self._database_path)
+        conn.row_factory = token_record_factory
+        try:
+            return conn.execute("SELECT * FROM tokens WHERE id = ?", (token_id,)).fetchone()
+        finally:
+            conn.close()
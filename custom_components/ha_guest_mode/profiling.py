@@ -0,0 +1,157 @@
+"""On-demand profiling of the integration's own handlers.
+
+Only functions decorated with ``instrumented`` are measured, coroutines one
+step at a time (see the instrumentation module). A single profiler runs at a
+time; a handler that starts while another one is being profiled (in an
+executor thread for example) simply runs unprofiled, so enabling and disabling
+always happen in the same thread and never block.
+
+cProfile is used unless pyinstrument, a sampling profiler with a much lower
+overhead, is installed.
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import logging
+import pstats
+import threading
+from datetime import datetime
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+_LOGGER = logging.getLogger(__name__)
+
+_session: ProfilingSession | None = None
+
+
+def current_session() -> ProfilingSession | None:
+    return _session
+
+
+class _CProfileBackend:
+    name = "cprofile"
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def enable(self) -> None:
+        self._profile.enable()
+
+    def disable(self) -> None:
+        self._profile.disable()
+
+    def write(self, base_path: str) -> list[str]:
+        stats_path = f"{base_path}.prof"
+        self._profile.dump_stats(stats_path)
+        text = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=text).strip_dirs().sort_stats("cumulative")
+        stats.print_stats(60)
+        stats.print_callees(60)
+        text_path = f"{base_path}.txt"
+        with open(text_path, "w", encoding="utf-8") as file:
+            file.write(text.getvalue())
+        return [stats_path, text_path]
+
+
+class _PyinstrumentBackend:
+    name = "pyinstrument"
+
+    def __init__(self):
+        from pyinstrument import Profiler
+
+        # Each stop() folds the run into the profiler's session.
+        self._profiler = Profiler(interval=0.001, async_mode="disabled")
+
+    def enable(self) -> None:
+        self._profiler.start()
+
+    def disable(self) -> None:
+        self._profiler.stop()
+
+    def write(self, base_path: str) -> list[str]:
+        session_path = f"{base_path}.pyisession"
+        self._profiler.last_session.save(session_path)
+        text_path = f"{base_path}.txt"
+        with open(text_path, "w", encoding="utf-8") as file:
+            file.write(self._profiler.output_text(unicode=True, show_all=True))
+        return [session_path, text_path]
+
+
+def _new_backend():
+    try:
+        return _PyinstrumentBackend()
+    except ImportError:
+        return _CProfileBackend()
+
+
+class ProfilingSession:
+    def __init__(self):
+        self.backend = _new_backend()
+        self.started_at = datetime.now()
+        self.calls = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def try_enable(self) -> bool:
+        if not self._lock.acquire(blocking=False):
+            self.skipped += 1
+            return False
+        try:
+            self.backend.enable()
+        except (RuntimeError, ValueError):
+            # Another profiler (e.g. Home Assistant's) already owns the hook.
+            self._lock.release()
+            self.skipped += 1
+            return False
+        return True
+
+    def disable(self) -> None:
+        try:
+            self.backend.disable()
+        finally:
+            self._lock.release()
+
+
+class GuestModeProfiler:
+    """Start and stop profiling sessions for the services, with a time limit."""
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._cancel_timeout: CALLBACK_TYPE | None = None
+
+    @property
+    def running(self) -> bool:
+        return _session is not None
+
+    @callback
+    def async_start(self, duration: float) -> str:
+        """Start a session that stops by itself after ``duration`` seconds."""
+        global _session
+        if _session is not None:
+            raise RuntimeError("profiling is already running")
+        _session = ProfilingSession()
+        self._cancel_timeout = async_call_later(self.hass, duration, self._async_timeout)
+        _LOGGER.info("Profiling guest mode handlers with %s for %ss", _session.backend.name, duration)
+        return _session.backend.name
+
+    async def async_stop(self) -> dict[str, Any] | None:
+        """Stop the session and write its files to the config directory."""
+        global _session
+        session, _session = _session, None
+        if self._cancel_timeout is not None:
+            self._cancel_timeout()
+            self._cancel_timeout = None
+        if session is None:
+            return None
+
+        base_path = self.hass.config.path(f"ha_guest_mode_profile_{session.started_at:%Y%m%d_%H%M%S}")
+        files = await self.hass.async_add_executor_job(session.backend.write, base_path)
+        _LOGGER.info("Guest mode profile written to %s", ", ".join(files))
+        return {"backend": session.backend.name, "calls": session.calls, "skipped": session.skipped, "files": files}
+
+    async def _async_timeout(self, _now) -> None:
+        self._cancel_timeout = None
+        await self.async_stop()
@@ -0,0 +1,95 @@
+from contextlib import aclosing
+
+import voluptuous as vol
+from aiohttp import hdrs, web
+
+from homeassistant.components.http import HomeAssistantView, require_admin
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .const import DEFAULT_QR_ERROR_CORRECTION, DOMAIN, QR_SHEET_MAX_TOKENS
+from .links import guest_base_url, guest_login_url
+from .instrumentation import instrumented
+from .qr_sheet import Card, QrRenderPool, paginate
+from .token_query import STATUSES
+from .token_record import TokenRecord
+
+QR_SHEET_FILENAME = "ha_guest_mode_qr_codes.pdf"
+
+_FILTER_SCHEMA = vol.Schema(
+    {
+        vol.Optional("ids"): vol.All(str, lambda value: [int(item) for item in value.split(",") if item.strip()]),
+        vol.Optional("status"): vol.In(STATUSES),
+        vol.Optional("user_id"): str,
+    },
+    extra=vol.REMOVE_EXTRA,
+)
+
+
+def _format_datetime(value):
+    return dt_util.as_local(value).strftime("%Y-%m-%d %H:%M")
+
+
+def _card(hass: HomeAssistant, token: TokenRecord, base_url: str) -> Card:
+    if token.never_expires or token.end_at is None:
+        validity = "No expiry"
+    else:
+        validity = f"{_format_datetime(token.start_at)} - {_format_datetime(token.end_at)}"
+    return Card(
+        guest_login_url(hass, token, base_url),
+        token["token_name"],
+        (f"/{token['dashboard'] or 'lovelace'}", validity),
+    )
+
+
+class QrSheetView(HomeAssistantView):
+    """Printable PDF of QR cards for the selected tokens, streamed page by page.
+
+    Pages are rendered in the integration's QrRenderPool and written in order
+    while later pages are still rendering.
+    """
+
+    name = "api:ha_guest_mode:qr_sheet"
+    url = "/api/ha_guest_mode/tokens/qr_sheet"
+    requires_auth = True
+
+    def __init__(self, hass: HomeAssistant, pool: QrRenderPool):
+        self.hass = hass
+        self._pool = pool
+
+    @require_admin
+    @instrumented
+    async def get(self, request: web.Request):
+        try:
+            query = _FILTER_SCHEMA(dict(request.query))
+        except (vol.Invalid, ValueError) as err:
+            return self.json_message(str(err), 400)
+
+        tokens = await self.hass.data[DOMAIN]["repository"].async_list(
+            status=query.get("status"),
+            user_id=query.get("user_id"),
+            token_ids=query.get("ids"),
+            limit=QR_SHEET_MAX_TOKENS + 1,
+        )
+        if not tokens:
+            return self.json_message("No token matches", 404)
+        if len(tokens) > QR_SHEET_MAX_TOKENS:
+            return self.json_message(f"At most {QR_SHEET_MAX_TOKENS} tokens per sheet", 400)
+
+        base_url = guest_base_url(self.hass)
+        pages = paginate([_card(self.hass, token, base_url) for token in tokens])
+
+        response = web.StreamResponse(
+            headers={
+                hdrs.CONTENT_TYPE: "application/pdf",
+                hdrs.CONTENT_DISPOSITION: f'attachment; filename="{QR_SHEET_FILENAME}"',
+            }
+        )
+        await response.prepare(request)
+
+        error_correction = self.hass.data.get("qr_error_correction", DEFAULT_QR_ERROR_CORRECTION)
+        async with aclosing(self._pool.async_render(pages, error_correction)) as chunks:
+            async for chunk in chunks:
+                await response.write(chunk)
+        await response.write_eof()
+        return response
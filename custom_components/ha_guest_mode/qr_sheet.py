@@ -0,0 +1,101 @@
+"""Printable QR card sheets, rendered in a process pool kept for the whole run.
+
+The renderer lives in ``workers/ha_guest_mode_qr_sheet.py`` and is loaded as
+a top-level module under that name, not as part of this package. Cards and
+``render_page`` are pickled by that name, and the pool initializer puts the
+workers directory on the workers' path, so a worker imports qrcode and Pillow
+but never the integration package or Home Assistant.
+
+The processes are spawned (not forked from Home Assistant) on the first sheet
+and reused by the following ones. No Home Assistant imports, so the benchmark
+scripts load this module the way the view does.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import multiprocessing
+import site
+import sys
+from collections.abc import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from types import ModuleType
+
+WORKERS_DIRECTORY = Path(__file__).parent / "workers"
+RENDERER_MODULE = "ha_guest_mode_qr_sheet"
+
+
+def _load_renderer() -> ModuleType:
+    module = sys.modules.get(RENDERER_MODULE)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(RENDERER_MODULE, WORKERS_DIRECTORY / f"{RENDERER_MODULE}.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[RENDERER_MODULE] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+_renderer = _load_renderer()
+
+Card = _renderer.Card
+RenderedPage = _renderer.RenderedPage
+PdfStreamWriter = _renderer.PdfStreamWriter
+CARDS_PER_PAGE = _renderer.CARDS_PER_PAGE
+make_qr = _renderer.make_qr
+paginate = _renderer.paginate
+render_page = _renderer.render_page
+
+
+class QrRenderPool:
+    """Render sheets in worker processes started on first use and kept until shutdown."""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: ProcessPoolExecutor | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=site.addsitedir,
+                initargs=(str(WORKERS_DIRECTORY),),
+            )
+        return self._executor
+
+    async def async_render(self, pages: list[list[Card]], error_correction: str) -> AsyncIterator[bytes]:
+        """Yield the PDF chunk by chunk, each page as soon as it and the ones before are rendered."""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        writer = PdfStreamWriter(len(pages))
+        yield writer.header()
+
+        pending: list[asyncio.Future] = []
+        try:
+            # Keep only a couple of pages per worker in flight, so a large sheet
+            # does not pile finished bitmaps up in memory.
+            for index, cards in enumerate(pages):
+                pending.append(loop.run_in_executor(executor, render_page, cards, error_correction))
+                if len(pending) >= 2 * self.max_workers:
+                    yield writer.page(index - len(pending) + 1, await pending.pop(0))
+            first = len(pages) - len(pending)
+            while pending:
+                yield writer.page(first, await pending.pop(0))
+                first += 1
+        except BrokenProcessPool:
+            # A worker died, the next sheet starts a new pool.
+            if self._executor is executor:
+                self.shutdown()
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+        yield writer.trailer()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
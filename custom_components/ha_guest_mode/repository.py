@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import uuid
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Any
+
+from homeassistant.auth.models import TOKEN_TYPE_LONG_LIVED_ACCESS_TOKEN
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .const import DATABASE, DOMAIN
+from .coordinator import async_signal_tokens_changed
+from .events import EVENT_TOKEN_CREATED, async_fire_token_event
+from .links import new_short_code
+from .network_filter import dump_networks, load_networks
+from .schedule import dump_schedule
+from .timestamps import to_ts
+from .token_query import token_filter_clause
+from .token_record import TokenRecord, token_record_factory
+
+_INSERT_COLUMNS = (
+    "userId",
+    "token_name",
+    "start_date",
+    "end_date",
+    "token_ha_id",
+    "token_ha",
+    "token_ha_guest_mode",
+    "uid",
+    "is_never_expire",
+    "dashboard",
+    "times_used",
+    "usage_limit",
+    "managed_user",
+    "managed_user_name",
+    "managed_user_groups",
+    "managed_user_local_only",
+    "start_ts",
+    "end_ts",
+    "schedule",
+    "allowed_networks",
+    "event_id",
+    "short_code",
+)
+
+
+def new_token_row(
+    *,
+    user_id: str,
+    token_name: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    dashboard: str | None = None,
+    usage_limit: int | None = None,
+    schedule: dict[str, Any] | None = None,
+    allowed_networks: list[str] | str | None = None,
+    managed_user_values: dict[str, Any] | None = None,
+    event_id: str | None = None,
+) -> dict[str, Any]:
+    """Build a tokens row ready for TokenRepository.async_create.
+
+    A token without an end never expires. Naive datetimes are local time.
+    Raises ValueError or vol.Invalid on an invalid schedule or network.
+    """
+    is_never_expire = end is None
+    start_utc = end_utc = None
+    if not is_never_expire:
+        start_utc = dt_util.as_utc(start) if start else dt_util.utcnow()
+        end_utc = dt_util.as_utc(end)
+
+    managed = managed_user_values or {}
+    return {
+        "userId": user_id,
+        "token_name": token_name,
+        "start_date": start_utc.isoformat() if start_utc else None,
+        "end_date": end_utc.isoformat() if end_utc else None,
+        "token_ha_id": "",
+        "token_ha": "",
+        "token_ha_guest_mode": None,
+        "uid": str(uuid.uuid4()),
+        "is_never_expire": is_never_expire,
+        "dashboard": dashboard,
+        "times_used": None,
+        "usage_limit": usage_limit,
+        "managed_user": 1 if managed else 0,
+        "managed_user_name": managed.get("managed_user_name"),
+        "managed_user_groups": managed.get("managed_user_groups"),
+        "managed_user_local_only": managed.get("managed_user_local_only"),
+        "start_ts": to_ts(start_utc),
+        "end_ts": to_ts(end_utc),
+        "schedule": dump_schedule(schedule),
+        "allowed_networks": dump_networks(allowed_networks),
+        "event_id": event_id,
+        "short_code": new_short_code(),
+    }
+
+
+def serialize_token(token: TokenRecord, now: int) -> dict[str, Any]:
+    """Shape a tokens row for the panel and the REST API."""
+    return {
+        "id": token["id"],
+        "name": token["token_name"],
+        "user_id": token["userId"],
+        "type": TOKEN_TYPE_LONG_LIVED_ACCESS_TOKEN,
+        "end_date": token.end_iso,
+        "end_ts": token["end_ts"],
+        "remaining": token.remaining(now),
+        "start_date": token.start_iso,
+        "start_ts": token["start_ts"],
+        # Prewarmed credentials are stored before the first login, only a counted use marks it used.
+        "isUsed": bool(token["times_used"] or token["first_used_ts"] or token["first_used"]),
+        "uid": token["uid"],
+        "short_code": token["short_code"],
+        "isNeverExpire": token.never_expires,
+        "dashboard": token["dashboard"],
+        "first_used": token.first_used_iso,
+        "last_used": token.last_used_iso,
+        "times_used": token["times_used"] or 0,
+        "usage_limit": token["usage_limit"],
+        "schedule": json.loads(token["schedule"]) if token["schedule"] else None,
+        "allowed_networks": list(load_networks(token["allowed_networks"])),
+    }
+
+
+def sign_token_row(row: dict[str, Any], private_key) -> str:
+    """Sign the guest JWT for a row, the login link carries only its uid."""
+    import jwt
+
+    token_payload = {"id": row["uid"], "isNeverExpire": row["is_never_expire"]}
+    if not row["is_never_expire"]:
+        token_payload["startDate"] = row["start_date"]
+        token_payload["endDate"] = row["end_date"]
+    return jwt.encode(token_payload, private_key, algorithm="RS256")
+
+
+def insert_token_rows(conn: sqlite3.Connection, rows: list[dict[str, Any]], private_key) -> None:
+    """Sign and insert rows inside the caller's transaction, setting each ``row["id"]``."""
+    for row in rows:
+        row["token_ha_guest_mode"] = sign_token_row(row, private_key)
+        cursor = conn.execute(
+            f"""
+            INSERT INTO tokens ({", ".join(_INSERT_COLUMNS)})
+            VALUES ({", ".join("?" * len(_INSERT_COLUMNS))})
+            """,
+            tuple(row[column] for column in _INSERT_COLUMNS),
+        )
+        row["id"] = cursor.lastrowid
+
+
+class TokenRepository:
+    """Create, query and delete tokens for the panel, the services and the REST API."""
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._database_path = hass.config.path(DATABASE)
+
+    async def async_create(self, rows: list[dict[str, Any]]) -> list[TokenRecord]:
+        """Sign and insert rows built by new_token_row in a single transaction."""
+        if not rows:
+            return []
+        private_key = await self.hass.data[DOMAIN]["key_manager"].async_get_private_key()
+        if private_key is None:
+            raise ValueError("private key not found")
+
+        created = await self.hass.async_add_executor_job(self._insert, rows, private_key)
+        await self.async_notify_created(created)
+        return created
+
+    async def async_notify_created(self, created: list[Mapping[str, Any]]) -> None:
+        """Refresh entities and fire the created events for rows inserted elsewhere."""
+        async_signal_tokens_changed(self.hass)
+        for row in created:
+            async_fire_token_event(self.hass, EVENT_TOKEN_CREATED, row)
+        await self.hass.services.async_call(
+            "homeassistant", "update_entity", {"entity_id": "image.guest_qr_code"}, blocking=False
+        )
+
+    async def async_list(
+        self,
+        *,
+        status: str | None = None,
+        user_id: str | None = None,
+        last_used_after: int | None = None,
+        last_used_before: int | None = None,
+        after_id: int | None = None,
+        token_ids: list[int] | None = None,
+        limit: int | None = None,
+    ) -> list[TokenRecord]:
+        """Return matching tokens ordered by id, starting after ``after_id``."""
+        where, params = token_filter_clause(
+            status,
+            user_id=user_id,
+            last_used_after=last_used_after,
+            last_used_before=last_used_before,
+            after_id=after_id,
+            token_ids=token_ids,
+        )
+        return await self.hass.async_add_executor_job(self._select, where, params, limit)
+
+    async def async_delete(self, token_ids: list[int]) -> int:
+        """Revoke tokens through the archiver, which also releases their HA credentials."""
+        return await self.hass.data[DOMAIN]["archiver"].async_revoke_many(token_ids)
+
+    def _insert(self, rows: list[dict[str, Any]], private_key) -> list[TokenRecord]:
+        conn = sqlite3.connect(self._database_path)
+        try:
+            with conn:
+                insert_token_rows(conn, rows, private_key)
+        finally:
+            conn.close()
+        return [TokenRecord.from_mapping(row) for row in rows]
+
+    def _select(self, where: str, params: list[Any], limit: int | None) -> list[TokenRecord]:
+        query = f"SELECT * FROM tokens{where} ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params = [*params, limit]
+        conn = sqlite3.connect(self._database_path)
+        conn.row_factory = token_record_factory
+        try:
+            return conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
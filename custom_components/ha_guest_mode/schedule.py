@@ -0,0 +1,261 @@
+"""Recurring access windows.
+
+A schedule is stored as JSON on the token row::
+
+    {
+        "windows": [{"weekdays": [0, 2, 4], "start_time": "09:00", "end_time": "12:00"}],
+        "exceptions": ["2026-12-25"]
+    }
+
+Weekdays count from Monday = 0 and times are local. A window whose end time
+is not after its start time runs past midnight. The token's own start and
+end dates still bound the schedule.
+
+Rules are expanded once into a sorted flat tuple of epoch boundaries
+``(start0, end0, start1, end1, ...)``, so "is now allowed?" is a single
+bisect: an odd insertion point means now is inside an interval.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta, tzinfo
+from functools import lru_cache
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.util import dt as dt_util
+
+from .const import DATABASE, SCHEDULE_HORIZON_DAYS
+from .instrumentation import instrumented
+from .timestamps import now_ts
+from .token_record import TokenRecord
+
+_WEEK = 7 * 86400
+
+
+def _time_of_day(value):
+    return time.fromisoformat(value).strftime("%H:%M")
+
+
+def _iso_date(value):
+    return date.fromisoformat(value).isoformat()
+
+
+SCHEDULE_SCHEMA = vol.Schema(
+    {
+        vol.Required("windows"): vol.All(
+            [
+                vol.Schema(
+                    {
+                        vol.Required("weekdays"): vol.All(
+                            [vol.All(vol.Coerce(int), vol.Range(min=0, max=6))], vol.Length(min=1)
+                        ),
+                        vol.Required("start_time"): vol.All(str, _time_of_day),
+                        vol.Required("end_time"): vol.All(str, _time_of_day),
+                    }
+                )
+            ],
+            vol.Length(min=1),
+        ),
+        vol.Optional("exceptions", default=list): [vol.All(str, _iso_date)],
+    }
+)
+
+
+def dump_schedule(schedule: dict[str, Any] | None) -> str | None:
+    """Validate a schedule and return its canonical JSON, which is also the cache key."""
+    if not schedule:
+        return None
+    return json.dumps(SCHEDULE_SCHEMA(schedule), sort_keys=True, separators=(",", ":"))
+
+
+class CompiledSchedule:
+    __slots__ = ("bounds",)
+
+    def __init__(self, bounds: tuple[int, ...]):
+        self.bounds = bounds
+
+    def is_active(self, ts: int) -> bool:
+        return bisect_right(self.bounds, ts) % 2 == 1
+
+    def next_boundary(self, ts: int) -> int | None:
+        index = bisect_right(self.bounds, ts)
+        return self.bounds[index] if index < len(self.bounds) else None
+
+    def next_start(self, ts: int) -> int | None:
+        """Return ts if an interval is open at ts, else the start of the next one."""
+        index = bisect_right(self.bounds, ts)
+        if index % 2 == 1:
+            return ts
+        return self.bounds[index] if index < len(self.bounds) else None
+
+    def next_end(self, ts: int) -> int | None:
+        """Return the end of the interval open at ts, or of the next one."""
+        index = bisect_right(self.bounds, ts)
+        if index % 2 == 0:
+            index += 1
+        return self.bounds[index] if index < len(self.bounds) else None
+
+
+@lru_cache(maxsize=1024)
+def _compile(
+    schedule_json: str, start_ts: int | None, end_ts: int | None, tz: tzinfo, anchor_week: int
+) -> CompiledSchedule:
+    schedule = json.loads(schedule_json)
+    exceptions = {date.fromisoformat(value) for value in schedule.get("exceptions", [])}
+
+    # Tokens can run for years or forever, only a rolling horizon is expanded.
+    horizon_start = anchor_week * _WEEK
+    horizon_end = horizon_start + SCHEDULE_HORIZON_DAYS * 86400
+    lower = horizon_start if start_ts is None else max(start_ts, horizon_start)
+    upper = horizon_end if end_ts is None else min(end_ts, horizon_end)
+    if lower >= upper:
+        return CompiledSchedule(())
+
+    # Start a day early for windows running past midnight.
+    day = datetime.fromtimestamp(lower, tz).date() - timedelta(days=1)
+    last_day = datetime.fromtimestamp(upper, tz).date()
+    windows = [
+        (set(window["weekdays"]), time.fromisoformat(window["start_time"]), time.fromisoformat(window["end_time"]))
+        for window in schedule["windows"]
+    ]
+
+    intervals = []
+    while day <= last_day:
+        if day not in exceptions:
+            for weekdays, start, end in windows:
+                if day.weekday() not in weekdays:
+                    continue
+                opens = int(datetime.combine(day, start, tz).timestamp())
+                end_day = day if end > start else day + timedelta(days=1)
+                closes = int(datetime.combine(end_day, end, tz).timestamp())
+                opens, closes = max(opens, lower), min(closes, upper)
+                if opens < closes:
+                    intervals.append((opens, closes))
+        day += timedelta(days=1)
+
+    intervals.sort()
+    bounds: list[int] = []
+    for opens, closes in intervals:
+        if bounds and opens <= bounds[-1]:
+            bounds[-1] = max(bounds[-1], closes)
+        else:
+            bounds += [opens, closes]
+    return CompiledSchedule(tuple(bounds))
+
+
+def get_compiled_schedule(token: TokenRecord, now: int) -> CompiledSchedule | None:
+    schedule_json = token["schedule"]
+    if not schedule_json:
+        return None
+    start_ts = None if token.never_expires else token["start_ts"]
+    end_ts = None if token.never_expires else token["end_ts"]
+    return _compile(schedule_json, start_ts, end_ts, dt_util.get_default_time_zone(), now // _WEEK)
+
+
+def next_access_start(token: TokenRecord, now: int) -> int | None:
+    """Return when the token next grants access, now if it already does, None if never again."""
+    if token.never_expires:
+        start = now
+    else:
+        if token["start_ts"] is None or token["end_ts"] is None or now >= token["end_ts"]:
+            return None
+        start = max(now, token["start_ts"])
+    compiled = get_compiled_schedule(token, now)
+    return start if compiled is None else compiled.next_start(start)
+
+
+def access_end(token: TokenRecord, now: int) -> int | None:
+    """Return when access granted from now on ends, None for no end."""
+    compiled = get_compiled_schedule(token, now)
+    if compiled is not None:
+        return compiled.next_end(now)
+    return None if token.never_expires else token["end_ts"]
+
+
+class ScheduleEnforcer:
+    """End guest sessions when a scheduled window closes.
+
+    At the end of every open interval the token's HA refresh token is removed;
+    the auth reconciler then clears the stored credentials and the prewarmer
+    grants new ones before the next interval.
+    """
+
+    def __init__(self, hass: HomeAssistant, coordinator):
+        self.hass = hass
+        self.coordinator = coordinator
+        self._database_path = hass.config.path(DATABASE)
+        self._scheduled: dict[int, tuple[int, CALLBACK_TYPE]] = {}
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        remove_listener = self.coordinator.async_add_listener(self._async_sync)
+        self._async_sync()
+
+        @callback
+        def stop() -> None:
+            remove_listener()
+            for _, unsub in self._scheduled.values():
+                unsub()
+            self._scheduled.clear()
+
+        return stop
+
+    @callback
+    def _async_sync(self) -> None:
+        now = now_ts()
+        wanted: dict[int, int] = {}
+        for token_id, token in (self.coordinator.data or {}).items():
+            if not token["has_credentials"]:
+                continue
+            compiled = get_compiled_schedule(token, now)
+            if compiled is not None and (end := compiled.next_end(now)) is not None:
+                wanted[token_id] = end
+
+        for token_id, (end, unsub) in list(self._scheduled.items()):
+            if wanted.get(token_id) != end:
+                unsub()
+                del self._scheduled[token_id]
+
+        for token_id, end in wanted.items():
+            if token_id not in self._scheduled:
+                self._scheduled[token_id] = (
+                    end,
+                    async_track_point_in_utc_time(
+                        self.hass,
+                        self._async_window_closed,
+                        dt_util.utc_from_timestamp(end),
+                    ),
+                )
+
+    @instrumented
+    async def _async_window_closed(self, now: datetime) -> None:
+        ts = int(now.timestamp())
+        due = [token_id for token_id, (end, _) in self._scheduled.items() if end <= ts]
+        for token_id in due:
+            del self._scheduled[token_id]
+        refresh_token_ids = await self.hass.async_add_executor_job(self._fetch_refresh_token_ids, due)
+        for refresh_token_id in refresh_token_ids:
+            refresh_token = self.hass.auth.async_get_refresh_token(refresh_token_id)
+            if refresh_token is not None:
+                self.hass.auth.async_remove_refresh_token(refresh_token)
+        self._async_sync()
+
+    def _fetch_refresh_token_ids(self, token_ids: list[int]) -> list[str]:
+        if not token_ids:
+            return []
+        conn = sqlite3.connect(self._database_path)
+        try:
+            placeholders = ",".join("?" * len(token_ids))
+            cursor = conn.execute(
+                f"SELECT token_ha_id FROM tokens WHERE id IN ({placeholders}) AND COALESCE(token_ha_id, '') != ''",
+                tuple(token_ids),
+            )
+            return [row[0] for row in cursor]
+        finally:
+            conn.close()
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.const import EntityCategory
+from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import DOMAIN
+from .coordinator import TOKEN_STATES, GuestTokenCoordinator, token_status
+from .timestamps import now_ts
+from .token_record import TokenRecord
+
+
+def _as_datetime(value: int | None) -> datetime | None:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc)
+
+
+@dataclass(frozen=True, kw_only=True)
+class GuestTokenSensorEntityDescription(SensorEntityDescription):
+    value_fn: Callable[[TokenRecord], Any]
+
+
+SENSOR_TYPES: tuple[GuestTokenSensorEntityDescription, ...] = (
+    GuestTokenSensorEntityDescription(
+        key="status",
+        translation_key="token_status",
+        device_class=SensorDeviceClass.ENUM,
+        options=TOKEN_STATES,
+        value_fn=lambda token: token_status(token, now_ts()),
+    ),
+    # A timestamp rather than a countdown, so the state only changes with the
+    # token and the frontend renders the remaining time itself.
+    GuestTokenSensorEntityDescription(
+        key="expires",
+        translation_key="token_expires",
+        device_class=SensorDeviceClass.TIMESTAMP,
+        value_fn=lambda token: None if token.never_expires else token.end_at,
+    ),
+    GuestTokenSensorEntityDescription(
+        key="times_used",
+        translation_key="token_times_used",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda token: token["times_used"] or 0,
+    ),
+    GuestTokenSensorEntityDescription(
+        key="last_used",
+        translation_key="token_last_used",
+        device_class=SensorDeviceClass.TIMESTAMP,
+        value_fn=lambda token: _as_datetime(token["last_used_ts"]),
+    ),
+)
+
+
+def _unique_id(token_id: int, key: str) -> str:
+    return f"{DOMAIN}_token_{token_id}_{key}"
+
+
+async def async_setup_entry(hass, config_entry, async_add_entities):
+    """Set up one group of sensors per token and follow tokens as they come and go."""
+    coordinator: GuestTokenCoordinator = hass.data[DOMAIN]["coordinator"]
+    known: set[int] = set()
+
+    @callback
+    def _async_sync_entities() -> None:
+        current = set(coordinator.data or {})
+
+        added = current - known
+        if added:
+            async_add_entities(
+                GuestTokenSensor(coordinator, config_entry, token_id, description)
+                for token_id in sorted(added)
+                for description in SENSOR_TYPES
+            )
+
+        removed = known - current
+        if removed:
+            registry = er.async_get(hass)
+            for token_id in removed:
+                for description in SENSOR_TYPES:
+                    entity_id = registry.async_get_entity_id("sensor", DOMAIN, _unique_id(token_id, description.key))
+                    if entity_id:
+                        registry.async_remove(entity_id)
+
+        known.clear()
+        known.update(current)
+
+    _async_sync_entities()
+    config_entry.async_on_unload(coordinator.async_add_listener(_async_sync_entities))
+
+
+class GuestTokenSensor(CoordinatorEntity[GuestTokenCoordinator], SensorEntity):
+    """Diagnostic sensor for a single guest token."""
+
+    entity_description: GuestTokenSensorEntityDescription
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator, config_entry, token_id: int, description: GuestTokenSensorEntityDescription):
+        super().__init__(coordinator)
+        self.entity_description = description
+        self._token_id = token_id
+        token = coordinator.data[token_id]
+        self._attr_unique_id = _unique_id(token_id, description.key)
+        self._attr_translation_placeholders = {"token_name": token["token_name"]}
+        self._attr_device_info = DeviceInfo(identifiers={(DOMAIN, config_entry.entry_id)})
+
+    @property
+    def available(self) -> bool:
+        return super().available and self._token_id in (self.coordinator.data or {})
+
+    @property
+    def native_value(self):
+        token = (self.coordinator.data or {}).get(self._token_id)
+        if token is None:
+            return None
+        return self.entity_description.value_fn(token)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        token = (self.coordinator.data or {}).get(self._token_id)
+        if token is None:
+            return None
+        return {
+            "token_id": self._token_id,
+            "user_id": token["userId"],
+            "dashboard": token["dashboard"],
+            "usage_limit": token["usage_limit"],
+        }
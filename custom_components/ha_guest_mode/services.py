@@ -1,14 +1,16 @@
 import voluptuous as vol
-from datetime import timedelta, datetime
-import jwt
-import uuid
-import sqlite3
 
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
 from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.translation import async_get_translations
+from homeassistant.util import dt as dt_util
 
-from .const import DOMAIN, DATABASE
+from .const import DOMAIN, PROFILING_DEFAULT_DURATION, PROFILING_MAX_DURATION
+from .link_delivery import async_send_links
+from .instrumentation import instrumented
+from .repository import new_token_row
+from .schedule import SCHEDULE_SCHEMA
+from .token_query import STATUSES
 
 async def async_create_token_service(hass: HomeAssistant, call: ServiceCall):
     translations = await async_get_translations(hass, hass.config.language, "config")
@@ -45,84 +47,31 @@ async def async_create_token_service(hass: HomeAssistant, call: ServiceCall):
         raise vol.Invalid(translations.get("component.ha_guest_mode.config.error.expiration_exclusive"))
 
     if expiration_duration is None and expiration_date is None:
-        is_never_expire = True
-        startDate_iso = None
-        endDate_iso = None
+        start = end = None
     else:
-        is_never_expire = False
-        now = datetime.now()
-        
-        if start_date:
-            startDate = start_date
-        else:
-            startDate = now
-
+        # Naive datetimes from the service call are local time.
+        start = dt_util.as_utc(start_date) if start_date else dt_util.utcnow()
         if expiration_duration:
-            endDate = startDate + expiration_duration
+            end = start + expiration_duration
         else:
-            endDate = expiration_date
-        
-        startDate_iso = startDate.isoformat()
-        endDate_iso = endDate.isoformat()
-
-    uid = str(uuid.uuid4())
-    private_key = hass.data.get("private_key")
-    if private_key is None:
+            end = dt_util.as_utc(expiration_date)
+
+    if await hass.data[DOMAIN]["key_manager"].async_get_private_key() is None:
         return
 
-    token_payload = {"id": uid, "isNeverExpire": is_never_expire}
-    if not is_never_expire:
-        token_payload["startDate"] = startDate_iso
-        token_payload["endDate"] = endDate_iso
-    
-    tokenGenerated = jwt.encode(token_payload, private_key, algorithm="RS256")
-
-    query = """
-        INSERT INTO tokens (
-            userId,
-            token_name,
-            start_date,
-            end_date,
-            token_ha_id,
-            token_ha,
-            token_ha_guest_mode,
-            uid,
-            is_never_expire,
-            dashboard,
-            usage_limit,
-            managed_user,
-            managed_user_name,
-            managed_user_groups,
-            managed_user_local_only
+    try:
+        row = new_token_row(
+            user_id=user_id,
+            token_name=token_name,
+            start=start,
+            end=end,
+            dashboard=dashboard,
+            schedule=call.data.get("schedule"),
+            allowed_networks=call.data.get("allowed_networks"),
         )
-        values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """
-    conn = sqlite3.connect(hass.config.path(DATABASE))
-    cursor = conn.cursor()
-    cursor.execute(
-        query,
-        (
-            user_id,
-            token_name,
-            startDate_iso,
-            endDate_iso,
-            "",
-            "",
-            tokenGenerated,
-            uid,
-            is_never_expire,
-            dashboard,
-            None,
-            0,
-            None,
-            None,
-            None,
-        ),
-    )
-    conn.commit()
-    conn.close()
-
-    await hass.services.async_call("homeassistant", "update_entity", {"entity_id": "image.guest_qr_code"}, blocking=True)
+    except ValueError as err:
+        raise vol.Invalid(str(err)) from err
+    await hass.data[DOMAIN]["repository"].async_create([row])
 
 async def async_register_services(hass: HomeAssistant):
     SERVICE_CREATE_TOKEN_SCHEMA = vol.Schema({
@@ -132,9 +81,86 @@ async def async_register_services(hass: HomeAssistant):
         vol.Exclusive("expiration_date", "expiration"): cv.datetime,
         vol.Optional("start_date"): cv.datetime,
         vol.Optional("dashboard"): cv.string,
+        vol.Optional("schedule"): SCHEDULE_SCHEMA,
+        vol.Optional("allowed_networks"): vol.All(cv.ensure_list, [cv.string]),
     })
 
+    @instrumented
     async def async_handle_create_token(call: ServiceCall):
         await async_create_token_service(hass, call)
 
     hass.services.async_register(DOMAIN, "create_token", async_handle_create_token, schema=SERVICE_CREATE_TOKEN_SCHEMA)
+
+    @instrumented
+    async def async_handle_maintain_database(call: ServiceCall) -> ServiceResponse:
+        return await hass.data[DOMAIN]["maintenance"].async_run()
+
+    SERVICE_SEND_LINKS_SCHEMA = vol.All(
+        vol.Schema({
+            vol.Optional("token_ids"): vol.All(cv.ensure_list, [vol.Coerce(int)]),
+            vol.Optional("status"): vol.In(STATUSES),
+            vol.Required("target"): cv.template,
+            vol.Optional("message", default="{{ url }}"): cv.template,
+            vol.Optional("title"): cv.template,
+        }),
+        cv.has_at_least_one_key("token_ids", "status"),
+    )
+
+    @instrumented
+    async def async_handle_send_links(call: ServiceCall) -> ServiceResponse:
+        tokens = await hass.data[DOMAIN]["repository"].async_list(
+            status=call.data.get("status"), token_ids=call.data.get("token_ids")
+        )
+        return await async_send_links(
+            hass, tokens, call.data["target"], call.data["message"], call.data.get("title")
+        )
+
+    hass.services.async_register(
+        DOMAIN,
+        "send_links",
+        async_handle_send_links,
+        schema=SERVICE_SEND_LINKS_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    hass.services.async_register(
+        DOMAIN,
+        "maintain_database",
+        async_handle_maintain_database,
+        schema=vol.Schema({}),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    SERVICE_START_PROFILING_SCHEMA = vol.Schema({
+        vol.Optional("duration", default=PROFILING_DEFAULT_DURATION): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=PROFILING_MAX_DURATION)
+        ),
+    })
+
+    async def async_handle_start_profiling(call: ServiceCall) -> ServiceResponse:
+        profiler = hass.data[DOMAIN]["profiler"]
+        if profiler.running:
+            raise vol.Invalid("Profiling is already running, call stop_profiling first")
+        return {"backend": profiler.async_start(call.data["duration"])}
+
+    hass.services.async_register(
+        DOMAIN,
+        "start_profiling",
+        async_handle_start_profiling,
+        schema=SERVICE_START_PROFILING_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def async_handle_stop_profiling(call: ServiceCall) -> ServiceResponse:
+        result = await hass.data[DOMAIN]["profiler"].async_stop()
+        if result is None:
+            raise vol.Invalid("Profiling is not running")
+        return result
+
+    hass.services.async_register(
+        DOMAIN,
+        "stop_profiling",
+        async_handle_stop_profiling,
+        schema=vol.Schema({}),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
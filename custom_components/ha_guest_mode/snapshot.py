@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import time
+
+from .const import SNAPSHOT_PAGES_PER_STEP, SNAPSHOT_STEP_SLEEP
+
+_LOGGER = logging.getLogger(__name__)
+
+_SIDECAR_SUFFIXES = ("-journal", "-wal", "-shm")
+_RESTORE_MARKER_SUFFIX = ".restore"
+
+
+def is_healthy(database_path: str) -> bool:
+    """Return True if the file opens and passes SQLite's quick_check."""
+    try:
+        conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return False
+    try:
+        return conn.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        conn.close()
+
+
+def create_snapshot(database_path: str, snapshot_path: str) -> dict:
+    """Copy the live database with SQLite's online backup API.
+
+    Pages are copied a few at a time with a short sleep in between so logins can
+    keep writing; SQLite restarts the copy by itself if the source changes, which
+    guarantees the snapshot is a consistent point-in-time image. A restore marker
+    is written next to it before the copy starts, see restore_snapshot_if_needed.
+    Runs in the executor.
+    """
+    started = time.perf_counter()
+    tmp_path = f"{snapshot_path}.tmp"
+    with open(snapshot_path + _RESTORE_MARKER_SUFFIX, "w", encoding="utf-8"):
+        pass
+    source = sqlite3.connect(database_path)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target, pages=SNAPSHOT_PAGES_PER_STEP, sleep=SNAPSHOT_STEP_SLEEP)
+        page_count = target.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    os.replace(tmp_path, snapshot_path)
+    return {
+        "page_count": page_count,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def remove_snapshot(snapshot_path: str) -> None:
+    for path in (snapshot_path + _RESTORE_MARKER_SUFFIX, snapshot_path, f"{snapshot_path}.tmp"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _last_write_ns(database_path: str) -> int:
+    return max(
+        (os.stat(path).st_mtime_ns for path in (database_path, *(database_path + suffix for suffix in _SIDECAR_SUFFIXES)) if os.path.exists(path)),
+        default=0,
+    )
+
+
+def restore_snapshot_if_needed(database_path: str, snapshot_path: str) -> bool:
+    """Swap the snapshot in after an HA backup was restored.
+
+    The snapshot and its restore marker only stay on disk when they came out
+    of a backup archive, or when HA stopped between the pre and post backup
+    hooks. Restoring keeps the archived modification times, so a live
+    database last written before the marker is the copy from the archive:
+    the snapshot replaces it, as that copy was taken while it was being
+    written and may pass quick_check yet not match the snapshot. A live
+    database written after the marker kept running past the snapshot and is
+    kept, so nothing written since is rolled back. Without the marker
+    (snapshots from before it existed), the snapshot only recovers a live
+    database that fails quick_check. A snapshot that fails the check itself
+    is never swapped in. Runs in the executor.
+    """
+    marker_path = snapshot_path + _RESTORE_MARKER_SUFFIX
+    if not os.path.exists(snapshot_path):
+        if os.path.exists(marker_path):
+            os.remove(marker_path)
+        return False
+
+    restoring = os.path.exists(marker_path)
+    if restoring and os.path.exists(database_path) and _last_write_ns(database_path) > os.stat(marker_path).st_mtime_ns:
+        if is_healthy(database_path):
+            _LOGGER.warning(
+                "Guest mode database was written after its backup snapshot was taken, "
+                "Home Assistant probably stopped during a backup; keeping the database"
+            )
+            remove_snapshot(snapshot_path)
+            return False
+        restoring = False
+
+    if not restoring and os.path.exists(database_path) and is_healthy(database_path):
+        remove_snapshot(snapshot_path)
+        return False
+
+    if not is_healthy(snapshot_path):
+        if restoring:
+            _LOGGER.error("Guest mode backup snapshot is damaged, keeping the database as is")
+        else:
+            _LOGGER.error("Guest mode database and its backup snapshot are both damaged, keeping the database as is")
+        return False
+
+    if restoring:
+        _LOGGER.warning("Restoring the guest mode database from the backup snapshot")
+    else:
+        _LOGGER.warning("Guest mode database is damaged, restoring it from the backup snapshot")
+    for suffix in _SIDECAR_SUFFIXES:
+        if os.path.exists(database_path + suffix):
+            os.remove(database_path + suffix)
+    os.replace(snapshot_path, database_path)
+    if restoring:
+        os.remove(marker_path)
+    return True
@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+from aiohttp import hdrs, web
+
+from homeassistant.components.http import HomeAssistantView
+
+from .const import STATIC_CACHE_CONTROL, STATIC_URL_PATH
+from .instrumentation import instrumented
+
+_LOGGER = logging.getLogger(__name__)
+
+WWW_DIRECTORY = Path(__file__).parent / "www"
+ASSET_SUFFIXES = (".js", ".html")
+
+
+def _compressors():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    try:
+        import brotli
+    except ImportError:
+        return
+    yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+def _write_atomic(target: Path, data: bytes) -> None:
+    tmp_target = target.with_name(target.name + ".tmp")
+    tmp_target.write_bytes(data)
+    os.replace(tmp_target, target)
+
+
+def build_compressed_assets(cache_directory: Path, directory: Path = WWW_DIRECTORY) -> tuple[Path, list[str], str]:
+    """Copy the assets with .gz/.br siblings into the cache directory.
+
+    aiohttp's FileResponse picks those siblings up on its own when the client
+    accepts the encoding. The integration folder may be read-only and is
+    replaced on every update, so the copies live under .storage and are only
+    rewritten when an asset's content changed. Returns the directory to serve
+    from (the integration folder, uncompressed, if the cache cannot be
+    written), the asset names and a hash of their content used to version the
+    URLs. Runs in the executor.
+    """
+    sources = {
+        source.name: source.read_bytes()
+        for source in sorted(directory.iterdir())
+        if source.suffix in ASSET_SUFFIXES and source.is_file()
+    }
+    digest = hashlib.sha256()
+    for name, data in sources.items():
+        digest.update(name.encode())
+        digest.update(hashlib.sha256(data).digest())
+    content_version = digest.hexdigest()[:16]
+
+    try:
+        cache_directory.mkdir(parents=True, exist_ok=True)
+        for name, data in sources.items():
+            copy = cache_directory / name
+            if copy.exists() and copy.read_bytes() == data:
+                continue
+            for suffix, compress in _compressors():
+                _write_atomic(cache_directory / (name + suffix), compress(data))
+            # Written last, an interrupted run is redone on the next start.
+            _write_atomic(copy, data)
+        # The directory is ours alone, drop assets a previous release shipped.
+        suffixes = ("", *(suffix for suffix, _ in _compressors()))
+        expected = {name + suffix for name in sources for suffix in suffixes}
+        for stale in cache_directory.iterdir():
+            if stale.name not in expected and stale.is_file():
+                stale.unlink()
+    except OSError as err:
+        _LOGGER.warning("Unable to write precompressed assets to %s, serving them uncompressed: %s", cache_directory, err)
+        return directory, list(sources), content_version
+
+    return cache_directory, list(sources), content_version
+
+
+class StaticAssetsView(HomeAssistantView):
+    """Serve the panel assets, immutable under the hash of their content."""
+
+    name = "guest-mode:static"
+    url = STATIC_URL_PATH + "/{version}/{filename}"
+    requires_auth = False
+
+    def __init__(self, version: str, filenames: list[str], directory: Path):
+        self._version = version
+        self._filenames = frozenset(filenames)
+        self._directory = directory
+
+    @instrumented
+    async def get(self, request, version, filename):
+        if filename not in self._filenames:
+            raise web.HTTPNotFound()
+
+        # Only the URL of the current content is safe to cache forever.
+        cache_control = STATIC_CACHE_CONTROL if version == self._version else "no-cache"
+        return web.FileResponse(
+            self._directory / filename,
+            headers={hdrs.CACHE_CONTROL: cache_control},
+        )
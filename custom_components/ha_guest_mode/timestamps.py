@@ -0,0 +1,39 @@
+"""UTC epoch helpers for the ``*_ts`` columns.
+
+The ISO text columns (start_date, end_date, first_used, last_used) are still
+written for older readers and the export format, but every comparison and
+filter runs on the integer columns.
+"""
+from __future__ import annotations
+
+import time
+from datetime import datetime, timezone, tzinfo
+
+# (text column, epoch column)
+EPOCH_COLUMNS = (
+    ("start_date", "start_ts"),
+    ("end_date", "end_ts"),
+    ("first_used", "first_used_ts"),
+    ("last_used", "last_used_ts"),
+)
+
+
+def now_ts() -> int:
+    return int(time.time())
+
+
+def to_ts(value: datetime | str | None, default_tz: tzinfo = timezone.utc) -> int | None:
+    """Convert a datetime or ISO string to epoch seconds, naive values use default_tz."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=default_tz)
+    return int(value.timestamp())
+
+
+def ts_to_iso(value: int | None) -> str | None:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+
+class PhaseTimer:
+    """Record wall-clock durations of the named phases of a setup step."""
+
+    def __init__(self) -> None:
+        self._started = time.perf_counter()
+        self._phases: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases[name] = round((time.perf_counter() - start) * 1000, 3)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "total_ms": round((time.perf_counter() - self._started) * 1000, 3),
+            "phases_ms": dict(self._phases),
+        }
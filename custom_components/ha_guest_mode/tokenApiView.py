@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any
+
+import voluptuous as vol
+from aiohttp import hdrs, web
+
+from homeassistant.components.http import HomeAssistantView, require_admin
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import config_validation as cv
+
+from .const import API_BULK_MAX, API_PAGE_SIZE, API_PAGE_SIZE_MAX, DOMAIN
+from .instrumentation import instrumented
+from .links import link_token
+from .repository import new_token_row, serialize_token
+from .schedule import SCHEDULE_SCHEMA
+from .timestamps import now_ts
+from .token_query import STATUSES
+
+TOKEN_CREATE_SCHEMA = vol.Schema(
+    {
+        vol.Exclusive("user_id", "user"): str,
+        vol.Exclusive("user_name", "user"): str,
+        vol.Required("name"): vol.All(str, vol.Length(min=1)),
+        vol.Optional("start"): cv.datetime,
+        vol.Optional("end"): cv.datetime,
+        vol.Optional("dashboard"): str,
+        vol.Optional("usage_limit"): vol.Any(None, vol.All(vol.Coerce(int), vol.Range(min=0))),
+        vol.Optional("schedule"): vol.Any(None, SCHEDULE_SCHEMA),
+        vol.Optional("allowed_networks"): vol.Any(None, [str]),
+    }
+)
+
+_FILTER_SCHEMA = vol.Schema(
+    {
+        vol.Optional("status"): vol.In(STATUSES),
+        vol.Optional("user_id"): str,
+        vol.Optional("last_used_after"): vol.Coerce(int),
+        vol.Optional("last_used_before"): vol.Coerce(int),
+    },
+    extra=vol.REMOVE_EXTRA,
+)
+
+_LIST_SCHEMA = _FILTER_SCHEMA.extend(
+    {
+        vol.Optional("cursor"): vol.Coerce(int),
+        vol.Optional("limit", default=API_PAGE_SIZE): vol.All(vol.Coerce(int), vol.Range(min=1, max=API_PAGE_SIZE_MAX)),
+    }
+)
+
+
+def _etag_matches(request: web.Request, etag: str) -> bool:
+    header = request.headers.get(hdrs.IF_NONE_MATCH)
+    if not header:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+class TokensApiView(HomeAssistantView):
+    """Token CRUD over REST for external provisioning systems.
+
+    Shares the repository with the websocket commands, so tokens created here
+    get the same signing, events and entity updates.
+    """
+
+    name = "api:ha_guest_mode:tokens"
+    url = "/api/ha_guest_mode/tokens"
+    requires_auth = True
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+
+    @property
+    def _repository(self):
+        return self.hass.data[DOMAIN]["repository"]
+
+    @require_admin
+    @instrumented
+    async def get(self, request: web.Request):
+        """List tokens ordered by id; pass next_cursor back as cursor for the next page."""
+        try:
+            query = _LIST_SCHEMA(dict(request.query))
+        except vol.Invalid as err:
+            return self.json_message(str(err), 400)
+
+        limit = query.pop("limit")
+        tokens = await self._repository.async_list(after_id=query.pop("cursor", None), limit=limit + 1, **query)
+        next_cursor = None
+        if len(tokens) > limit:
+            tokens = tokens[:limit]
+            next_cursor = str(tokens[-1]["id"])
+
+        now = now_ts()
+        items = []
+        for token in tokens:
+            item = serialize_token(token, now)
+            # Derived from the clock, it would change the ETag on every request.
+            del item["remaining"]
+            items.append(item)
+        payload = {"tokens": items, "next_cursor": next_cursor}
+
+        etag = '"%s"' % hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        if _etag_matches(request, etag):
+            return web.Response(status=304, headers={hdrs.ETAG: etag})
+        return self.json(payload, headers={hdrs.ETAG: etag})
+
+    @require_admin
+    @instrumented
+    async def post(self, request: web.Request):
+        """Create up to API_BULK_MAX tokens in one transaction, all or nothing."""
+        try:
+            body = await request.json()
+        except ValueError:
+            return self.json_message("Invalid JSON", 400)
+        specs = body.get("tokens") if isinstance(body, dict) else None
+        if not isinstance(specs, list) or not specs:
+            return self.json_message("Expected a non-empty tokens list", 400)
+        if len(specs) > API_BULK_MAX:
+            return self.json_message(f"At most {API_BULK_MAX} tokens per request", 400)
+
+        users = await self.hass.auth.async_get_users()
+        user_ids = {user.id for user in users}
+        user_ids_by_name = {user.name: user.id for user in users if not user.system_generated}
+
+        rows = []
+        errors: list[dict[str, Any]] = []
+        for index, spec in enumerate(specs):
+            try:
+                spec = TOKEN_CREATE_SCHEMA(spec)
+                user_id = spec.get("user_id") or user_ids_by_name.get(spec.get("user_name"))
+                if user_id not in user_ids:
+                    raise vol.Invalid("user not found")
+                if "start" in spec and "end" not in spec:
+                    raise vol.Invalid("start requires end")
+                rows.append(
+                    new_token_row(
+                        user_id=user_id,
+                        token_name=spec["name"],
+                        start=spec.get("start"),
+                        end=spec.get("end"),
+                        dashboard=spec.get("dashboard", "lovelace"),
+                        usage_limit=spec.get("usage_limit"),
+                        schedule=spec.get("schedule"),
+                        allowed_networks=spec.get("allowed_networks"),
+                    )
+                )
+            except (vol.Invalid, ValueError) as err:
+                errors.append({"index": index, "error": str(err)})
+
+        if errors:
+            return self.json({"errors": errors}, 400)
+
+        try:
+            created = await self._repository.async_create(rows)
+        except ValueError as err:
+            return self.json_message(str(err), 500)
+
+        login_path = self.hass.data.get("get_path_to_login", "/guest-mode/login")
+        return self.json(
+            {
+                "created": [
+                    {
+                        "id": row["id"],
+                        "uid": row["uid"],
+                        "login_path": f"{login_path}?token={link_token(self.hass, row)}",
+                    }
+                    for row in created
+                ]
+            },
+            201,
+        )
+
+    @require_admin
+    @instrumented
+    async def delete(self, request: web.Request):
+        """Revoke the tokens given by ids=1,2,3 or matching the list filters."""
+        ids = request.query.get("ids")
+        if ids:
+            try:
+                token_ids = [int(value) for value in ids.split(",") if value.strip()]
+            except ValueError:
+                return self.json_message("ids must be a comma separated list of integers", 400)
+        else:
+            try:
+                filters = _FILTER_SCHEMA(dict(request.query))
+            except vol.Invalid as err:
+                return self.json_message(str(err), 400)
+            if not filters:
+                return self.json_message("Pass ids or at least one filter", 400)
+            token_ids = [token["id"] for token in await self._repository.async_list(**filters)]
+
+        deleted = await self._repository.async_delete(token_ids) if token_ids else 0
+        return self.json({"deleted": deleted})
@@ -0,0 +1,62 @@
+from aiohttp import hdrs, web
+
+from homeassistant.components.http import HomeAssistantView, require_admin
+from homeassistant.core import HomeAssistant
+
+from .instrumentation import instrumented
+from .transfer import CONFLICT_REPLACE, CONFLICT_SKIP, TokenImporter, async_iter_export
+
+EXPORT_FILENAME = "ha_guest_mode_tokens.jsonl"
+
+
+class ExportTokensView(HomeAssistantView):
+    """Download every token as a JSON Lines file, streamed in chunks."""
+
+    name = "api:ha_guest_mode:export_tokens"
+    url = "/api/ha_guest_mode/tokens/export"
+    requires_auth = True
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+
+    @require_admin
+    @instrumented
+    async def get(self, request):
+        response = web.StreamResponse(
+            headers={
+                hdrs.CONTENT_TYPE: "application/x-ndjson",
+                hdrs.CONTENT_DISPOSITION: f'attachment; filename="{EXPORT_FILENAME}"',
+            }
+        )
+        await response.prepare(request)
+        async for chunk in async_iter_export(self.hass):
+            await response.write(chunk.encode("utf-8"))
+        await response.write_eof()
+        return response
+
+
+class ImportTokensView(HomeAssistantView):
+    """Upload a JSON Lines export, read and inserted chunk by chunk."""
+
+    name = "api:ha_guest_mode:import_tokens"
+    url = "/api/ha_guest_mode/tokens/import"
+    requires_auth = True
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+
+    @require_admin
+    @instrumented
+    async def post(self, request):
+        on_conflict = request.query.get("on_conflict", CONFLICT_SKIP)
+        if on_conflict not in (CONFLICT_SKIP, CONFLICT_REPLACE):
+            return self.json_message("on_conflict must be skip or replace", 400)
+
+        importer = TokenImporter(self.hass, on_conflict)
+        try:
+            await importer.async_prepare()
+        except ValueError as err:
+            return self.json_message(str(err), 500)
+        async for line in request.content:
+            await importer.async_feed_line(line)
+        return self.json(await importer.async_finish())
@@ -0,0 +1,60 @@
+"""SQL predicates over the indexed epoch columns of the tokens table."""
+from __future__ import annotations
+
+from typing import Any
+
+from .timestamps import now_ts
+
+STATUS_ALL = "all"
+STATUS_ACTIVE = "active"
+STATUS_SCHEDULED = "scheduled"
+STATUS_EXPIRED = "expired"
+STATUSES = (STATUS_ALL, STATUS_ACTIVE, STATUS_SCHEDULED, STATUS_EXPIRED)
+
+_NEVER_EXPIRE = "COALESCE(is_never_expire, 0) = 1"
+
+
+def token_filter_clause(
+    status: str | None = None,
+    user_id: str | None = None,
+    last_used_after: int | None = None,
+    last_used_before: int | None = None,
+    now: int | None = None,
+    after_id: int | None = None,
+    token_ids: list[int] | None = None,
+) -> tuple[str, list[Any]]:
+    """Return a ``WHERE`` clause (possibly empty) and its parameters."""
+    now = now_ts() if now is None else now
+    clauses: list[str] = []
+    params: list[Any] = []
+
+    if status == STATUS_ACTIVE:
+        clauses.append(f"({_NEVER_EXPIRE} OR (start_ts <= ? AND end_ts > ?))")
+        params += [now, now]
+    elif status == STATUS_SCHEDULED:
+        clauses.append(f"(NOT {_NEVER_EXPIRE} AND start_ts > ?)")
+        params.append(now)
+    elif status == STATUS_EXPIRED:
+        clauses.append(f"(NOT {_NEVER_EXPIRE} AND end_ts <= ?)")
+        params.append(now)
+
+    if user_id:
+        clauses.append("userId = ?")
+        params.append(user_id)
+    if last_used_after is not None:
+        clauses.append("last_used_ts >= ?")
+        params.append(last_used_after)
+    if last_used_before is not None:
+        clauses.append("last_used_ts < ?")
+        params.append(last_used_before)
+    if token_ids is not None:
+        clauses.append(f"id IN ({','.join('?' * len(token_ids))})" if token_ids else "0")
+        params += token_ids
+    if after_id is not None:
+        # Keyset pagination cursor, stable while rows are added or removed.
+        clauses.append("id > ?")
+        params.append(after_id)
+
+    if not clauses:
+        return "", params
+    return " WHERE " + " AND ".join(clauses), params
@@ -0,0 +1,208 @@
+"""Read-only view of a tokens row, shared by every module that reads the table.
+
+A record wraps the tuple sqlite returns together with a column layout shared
+by every row of the same query, so holding a record costs one small object
+on top of the tuple instead of a dict per row. Columns read as attributes
+(``record.end_ts``) or as keys (``record["end_ts"]``), and ``dict(record)``
+still gives the plain row.
+
+Values derived from several columns (whether the token expires, the seconds
+left, the validity window as datetimes and ISO strings) are computed on first
+use, the datetimes are kept for the next caller.
+
+No Home Assistant imports, so the benchmark script can load it on its own.
+"""
+from __future__ import annotations
+
+import functools
+import sqlite3
+from collections.abc import Iterator, Mapping
+from datetime import datetime, timezone
+from typing import Any, Generic, TypeVar, overload
+
+_T = TypeVar("_T")
+
+# Marks a derived value not computed yet, None is a valid value.
+_UNSET: Any = object()
+
+TOKEN_COLUMNS = (
+    "id",
+    "userId",
+    "token_name",
+    "start_date",
+    "end_date",
+    "token_ha_id",
+    "token_ha",
+    "token_ha_guest_mode",
+    "uid",
+    "is_never_expire",
+    "dashboard",
+    "first_used",
+    "last_used",
+    "times_used",
+    "usage_limit",
+    "managed_user",
+    "managed_user_name",
+    "managed_user_groups",
+    "managed_user_local_only",
+    "schedule",
+    "allowed_networks",
+    "event_id",
+    "short_code",
+    "start_ts",
+    "end_ts",
+    "first_used_ts",
+    "last_used_ts",
+)
+
+
+@functools.lru_cache(maxsize=64)
+def _layout(columns: tuple[str, ...]) -> dict[str, int]:
+    """Position of every column, one shared dict per distinct SELECT list."""
+    return {column: index for index, column in enumerate(columns)}
+
+
+class _Column(Generic[_T]):
+    """Attribute access to one column of a record."""
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    @overload
+    def __get__(self, record: None, owner: type) -> _Column[_T]: ...
+
+    @overload
+    def __get__(self, record: TokenRecord, owner: type) -> _T: ...
+
+    def __get__(self, record, owner=None):
+        if record is None:
+            return self
+        try:
+            return record._values[record._layout[self.name]]
+        except KeyError:
+            raise AttributeError(f"column {self.name} was not selected") from None
+
+
+class TokenRecord(Mapping[str, Any]):
+    """One tokens row, holding only the columns its query selected."""
+
+    __slots__ = ("_values", "_layout", "_start_at", "_end_at")
+
+    id = _Column[int]()
+    userId = _Column[str]()
+    token_name = _Column[str]()
+    start_date = _Column["str | None"]()
+    end_date = _Column["str | None"]()
+    token_ha_id = _Column["str | None"]()
+    token_ha = _Column["str | None"]()
+    token_ha_guest_mode = _Column["str | None"]()
+    uid = _Column[str]()
+    is_never_expire = _Column["int | bool | None"]()
+    dashboard = _Column["str | None"]()
+    first_used = _Column["str | None"]()
+    last_used = _Column["str | None"]()
+    times_used = _Column["int | None"]()
+    usage_limit = _Column["int | None"]()
+    managed_user = _Column["int | None"]()
+    managed_user_name = _Column["str | None"]()
+    managed_user_groups = _Column["str | None"]()
+    managed_user_local_only = _Column["int | None"]()
+    schedule = _Column["str | None"]()
+    allowed_networks = _Column["str | None"]()
+    event_id = _Column["str | None"]()
+    short_code = _Column["str | None"]()
+    start_ts = _Column["int | None"]()
+    end_ts = _Column["int | None"]()
+    first_used_ts = _Column["int | None"]()
+    last_used_ts = _Column["int | None"]()
+    # Computed by the coordinator query.
+    has_credentials = _Column[int]()
+
+    def __init__(self, values: tuple, layout: dict[str, int]):
+        self._values = values
+        self._layout = layout
+        self._start_at = self._end_at = _UNSET
+
+    @classmethod
+    def from_mapping(cls, row: Mapping[str, Any]) -> TokenRecord:
+        """Record for a row built in memory, such as new_token_row after insert."""
+        return cls(tuple(row.get(column) for column in TOKEN_COLUMNS), _layout(TOKEN_COLUMNS))
+
+    def __getitem__(self, column: str) -> Any:
+        return self._values[self._layout[column]]
+
+    def __contains__(self, column: object) -> bool:
+        return column in self._layout
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._layout)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return f"<TokenRecord {dict(self)!r}>"
+
+    @property
+    def never_expires(self) -> bool:
+        return bool(self["is_never_expire"])
+
+    def remaining(self, now: int) -> int | None:
+        """Seconds until the end of the validity window, None without one."""
+        end_ts = self["end_ts"]
+        if end_ts is None or self["is_never_expire"]:
+            return None
+        return end_ts - now
+
+    @property
+    def start_at(self) -> datetime | None:
+        if self._start_at is _UNSET:
+            self._start_at = _as_datetime(self["start_ts"])
+        return self._start_at
+
+    @property
+    def end_at(self) -> datetime | None:
+        if self._end_at is _UNSET:
+            self._end_at = _as_datetime(self["end_ts"])
+        return self._end_at
+
+    # The epoch columns win, the text columns are only set on older rows.
+    @property
+    def start_iso(self) -> str | None:
+        start_ts = self["start_ts"]
+        return datetime.fromtimestamp(start_ts, timezone.utc).isoformat() if start_ts is not None else self["start_date"]
+
+    @property
+    def end_iso(self) -> str | None:
+        end_ts = self["end_ts"]
+        return datetime.fromtimestamp(end_ts, timezone.utc).isoformat() if end_ts is not None else self["end_date"]
+
+    @property
+    def first_used_iso(self) -> str | None:
+        first_used_ts = self["first_used_ts"]
+        return datetime.fromtimestamp(first_used_ts, timezone.utc).isoformat() if first_used_ts is not None else self["first_used"]
+
+    @property
+    def last_used_iso(self) -> str | None:
+        last_used_ts = self["last_used_ts"]
+        return datetime.fromtimestamp(last_used_ts, timezone.utc).isoformat() if last_used_ts is not None else self["last_used"]
+
+
+def _as_datetime(value: int | None) -> datetime | None:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc)
+
+
+# (cursor.description, layout) of the last query, every row of a query shares it.
+_last_layout: tuple[Any, dict[str, int]] | None = None
+
+
+def token_record_factory(cursor: sqlite3.Cursor, row: tuple) -> TokenRecord:
+    """sqlite3 row_factory building a TokenRecord straight from the row tuple."""
+    global _last_layout
+    description = cursor.description
+    last = _last_layout
+    if last is None or last[0] is not description:
+        last = _last_layout = (description, _layout(tuple(column[0] for column in description)))
+    return TokenRecord(row, last[1])
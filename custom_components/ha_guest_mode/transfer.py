@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import threading
+from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .const import DATABASE, DOMAIN, EXPORT_CHUNK_SIZE, IMPORT_CHUNK_SIZE, SHORT_CODE_LENGTH
+from .coordinator import async_signal_tokens_changed
+from .links import new_short_code
+from .managed_users import async_create_managed_user, async_get_all_groups
+from .network_filter import dump_networks, load_networks, parse_networks
+from .schedule import SCHEDULE_SCHEMA, dump_schedule
+from .timestamps import EPOCH_COLUMNS, to_ts
+from .token_record import TokenRecord, token_record_factory
+
+EXPORT_FORMAT = "ha_guest_mode.tokens"
+EXPORT_VERSION = 1
+
+CONFLICT_SKIP = "skip"
+CONFLICT_REPLACE = "replace"
+
+MAX_REPORTED_ERRORS = 100
+
+# Credentials are bound to this instance (HA refresh tokens, our signing key)
+# and are never exported; imported tokens get a fresh signature.
+_EXPORT_COLUMNS = (
+    "uid",
+    "token_name",
+    "userId",
+    "start_date",
+    "end_date",
+    "is_never_expire",
+    "dashboard",
+    "first_used",
+    "last_used",
+    "times_used",
+    "usage_limit",
+    "managed_user",
+    "managed_user_name",
+    "managed_user_groups",
+    "managed_user_local_only",
+    "schedule",
+    "allowed_networks",
+    "short_code",
+)
+
+def _iso_datetime(value):
+    if value is None:
+        return None
+    datetime.fromisoformat(value)
+    return value
+
+
+def _networks(value):
+    parse_networks(value)
+    return value
+
+
+_OPTIONAL_DATE = vol.Any(None, vol.All(str, _iso_datetime))
+_OPTIONAL_INT = vol.Any(None, vol.All(vol.Coerce(int), vol.Range(min=0)))
+
+IMPORT_RECORD_SCHEMA = vol.Schema(
+    {
+        vol.Required("uid"): vol.All(str, vol.Length(min=1, max=128)),
+        vol.Required("token_name"): vol.All(str, vol.Length(min=1)),
+        vol.Optional("userId"): vol.Any(None, str),
+        vol.Optional("user_name"): vol.Any(None, str),
+        vol.Optional("start_date"): _OPTIONAL_DATE,
+        vol.Optional("end_date"): _OPTIONAL_DATE,
+        vol.Optional("is_never_expire", default=False): vol.Coerce(bool),
+        vol.Optional("dashboard"): vol.Any(None, str),
+        vol.Optional("first_used"): _OPTIONAL_DATE,
+        vol.Optional("last_used"): _OPTIONAL_DATE,
+        vol.Optional("times_used"): _OPTIONAL_INT,
+        vol.Optional("usage_limit"): _OPTIONAL_INT,
+        vol.Optional("managed_user", default=False): vol.Coerce(bool),
+        vol.Optional("managed_user_name"): vol.Any(None, str),
+        vol.Optional("managed_user_groups"): vol.Any(None, [str]),
+        vol.Optional("managed_user_local_only"): vol.Any(None, vol.Coerce(bool)),
+        vol.Optional("schedule"): vol.Any(None, SCHEDULE_SCHEMA),
+        vol.Optional("allowed_networks"): vol.Any(None, vol.All([str], _networks)),
+        vol.Optional("short_code"): vol.Any(None, vol.Match(rf"^[A-Z2-7]{{{SHORT_CODE_LENGTH}}}$")),
+    },
+    extra=vol.REMOVE_EXTRA,
+)
+
+
+def _export_record(row: TokenRecord, user_names: dict[str, str]) -> dict[str, Any]:
+    record = dict(row)
+    record["is_never_expire"] = row.never_expires
+    record["managed_user"] = bool(record["managed_user"])
+    if record["managed_user_local_only"] is not None:
+        record["managed_user_local_only"] = bool(record["managed_user_local_only"])
+    groups = record["managed_user_groups"]
+    try:
+        record["managed_user_groups"] = json.loads(groups) if groups else None
+    except (ValueError, TypeError):
+        record["managed_user_groups"] = None
+    record["schedule"] = json.loads(record["schedule"]) if record["schedule"] else None
+    record["allowed_networks"] = list(load_networks(record["allowed_networks"])) or None
+    record["user_name"] = user_names.get(row["userId"])
+    return record
+
+
+async def async_iter_export(hass: HomeAssistant) -> AsyncIterator[str]:
+    """Yield the tokens table as JSON Lines, a chunk of rows at a time.
+
+    A worker thread walks a single cursor with fetchmany and hands chunks over
+    through a bounded queue, so only a couple of chunks are ever in memory.
+    """
+    user_names = {user.id: user.name for user in await hass.auth.async_get_users()}
+    database_path = hass.config.path(DATABASE)
+    loop = hass.loop
+    queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=2)
+    stop = threading.Event()
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        try:
+            conn = sqlite3.connect(database_path)
+            conn.row_factory = token_record_factory
+            try:
+                cursor = conn.execute(f"SELECT {', '.join(_EXPORT_COLUMNS)} FROM tokens ORDER BY id")
+                while not stop.is_set() and (rows := cursor.fetchmany(EXPORT_CHUNK_SIZE)):
+                    put("".join(json.dumps(_export_record(row, user_names)) + "\n" for row in rows))
+            finally:
+                conn.close()
+        finally:
+            put(None)
+
+    producer = hass.async_add_executor_job(produce)
+    try:
+        yield json.dumps({"format": EXPORT_FORMAT, "version": EXPORT_VERSION}) + "\n"
+        while (chunk := await queue.get()) is not None:
+            yield chunk
+    finally:
+        # Unblock the worker if the consumer went away early.
+        stop.set()
+        while not producer.done():
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait((getter, producer), return_when=asyncio.FIRST_COMPLETED)
+            getter.cancel()
+        await producer
+
+
+class TokenImporter:
+    """Validate JSON Lines records and insert them in chunked transactions."""
+
+    def __init__(self, hass: HomeAssistant, on_conflict: str = CONFLICT_SKIP):
+        self.hass = hass
+        self._on_conflict = on_conflict
+        self._database_path = hass.config.path(DATABASE)
+        self._pending: list[tuple[int, dict[str, Any]]] = []
+        self._line_number = 0
+        self._users: dict[str, Any] = {}
+        self._users_by_name: dict[str, Any] = {}
+        self._replaced_users: dict[str, str] = {}
+        self._available_group_ids: set[str] = set()
+        # Older exports carry naive dates written in local time.
+        self._local_tz = dt_util.get_default_time_zone()
+        self._private_key = None
+        self.result: dict[str, Any] = {"imported": 0, "skipped": 0, "users_created": 0, "errors": []}
+
+    async def async_prepare(self) -> None:
+        """Load the users, raise ValueError when tokens cannot be signed."""
+        self._private_key = await self.hass.data[DOMAIN]["key_manager"].async_get_private_key()
+        if self._private_key is None:
+            raise ValueError("private key not found")
+        users = await self.hass.auth.async_get_users()
+        self._users = {user.id: user for user in users}
+        self._users_by_name = {user.name: user for user in users if not user.system_generated}
+        self._available_group_ids = {group.id for group in await async_get_all_groups(self.hass)}
+
+    async def async_feed_line(self, line: str | bytes) -> None:
+        self._line_number += 1
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            return
+
+        try:
+            data = json.loads(line)
+            if "format" in data:
+                if data.get("format") != EXPORT_FORMAT or data.get("version") != EXPORT_VERSION:
+                    raise vol.Invalid("unsupported export format")
+                return
+            record = IMPORT_RECORD_SCHEMA(data)
+        except (ValueError, TypeError, AttributeError, vol.Invalid) as err:
+            self._add_error(self._line_number, str(err))
+            return
+
+        self._pending.append((self._line_number, record))
+        if len(self._pending) >= IMPORT_CHUNK_SIZE:
+            await self._async_flush()
+
+    async def async_finish(self) -> dict[str, Any]:
+        await self._async_flush()
+        return self.result
+
+    def _add_error(self, line_number: int, error: str) -> None:
+        self.result["skipped"] += 1
+        if len(self.result["errors"]) < MAX_REPORTED_ERRORS:
+            self.result["errors"].append({"line": line_number, "error": error})
+
+    async def _async_resolve_user(self, record: dict[str, Any]) -> str | None:
+        user_id = record.get("userId")
+        if user_id in self._users:
+            return user_id
+
+        if record["managed_user"]:
+            if user_id in self._replaced_users:
+                return self._replaced_users[user_id]
+            user, values = await async_create_managed_user(
+                self.hass,
+                {
+                    "managed_user_name": record.get("managed_user_name"),
+                    "managed_user_groups": json.dumps(record.get("managed_user_groups") or []),
+                    "managed_user_local_only": record.get("managed_user_local_only"),
+                    "token_name": record["token_name"],
+                },
+                self._available_group_ids,
+            )
+            if user is None:
+                return None
+            self._users[user.id] = user
+            self.result["users_created"] += 1
+            if user_id:
+                self._replaced_users[user_id] = user.id
+            record["managed_user_name"] = values["managed_user_name"]
+            record["managed_user_groups"] = values["managed_user_groups"]
+            record["managed_user_local_only"] = values["managed_user_local_only"]
+            return user.id
+
+        user = self._users_by_name.get(record.get("user_name"))
+        return user.id if user else None
+
+    async def _async_flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+
+        records = []
+        for line_number, record in pending:
+            user_id = await self._async_resolve_user(record)
+            if user_id is None:
+                self._add_error(line_number, "user not found")
+                continue
+            record["userId"] = user_id
+            records.append((line_number, record))
+
+        if not records:
+            return
+
+        imported, created, errors = await self.hass.async_add_executor_job(self._insert, records, self._private_key)
+        self.result["imported"] += imported
+        self.result["skipped"] += len(records) - imported - len(errors)
+        for line_number, error in errors:
+            self._add_error(line_number, error)
+
+        if created:
+            await self.hass.data[DOMAIN]["repository"].async_notify_created(created)
+        elif imported:
+            async_signal_tokens_changed(self.hass)
+            await self.hass.services.async_call(
+                "homeassistant", "update_entity", {"entity_id": "image.guest_qr_code"}, blocking=False
+            )
+
+    def _insert(
+        self, records: list[tuple[int, dict[str, Any]]], private_key
+    ) -> tuple[int, list[dict[str, Any]], list[tuple[int, str]]]:
+        """Write records row by row in one transaction.
+
+        Returns the number of rows written, the inserted rows for the created
+        events and the (line, error) of rows the database rejected. A rejected
+        row (a short code already taken) only rolls back its own statement.
+        The uid is looked up first rather than upserted: databases with
+        duplicated legacy uids only have a non-unique uid index.
+        """
+        import jwt
+
+        imported = 0
+        created: list[dict[str, Any]] = []
+        errors: list[tuple[int, str]] = []
+        conn = sqlite3.connect(self._database_path)
+        try:
+            with conn:
+                for line_number, record in records:
+                    is_never_expire = record["is_never_expire"]
+                    token_payload = {"id": record["uid"], "isNeverExpire": is_never_expire}
+                    if not is_never_expire:
+                        token_payload["startDate"] = record.get("start_date")
+                        token_payload["endDate"] = record.get("end_date")
+                    groups = record.get("managed_user_groups")
+                    if isinstance(groups, list):
+                        groups = json.dumps(groups) if groups else None
+                    local_only = record.get("managed_user_local_only")
+                    values = {
+                        "userId": record["userId"],
+                        "token_name": record["token_name"],
+                        "start_date": record.get("start_date"),
+                        "end_date": record.get("end_date"),
+                        "token_ha_guest_mode": jwt.encode(token_payload, private_key, algorithm="RS256"),
+                        "is_never_expire": is_never_expire,
+                        "dashboard": record.get("dashboard"),
+                        "first_used": record.get("first_used"),
+                        "last_used": record.get("last_used"),
+                        "times_used": record.get("times_used"),
+                        "usage_limit": record.get("usage_limit"),
+                        "managed_user": 1 if record["managed_user"] else 0,
+                        "managed_user_name": record.get("managed_user_name"),
+                        "managed_user_groups": groups,
+                        "managed_user_local_only": None if local_only is None else int(bool(local_only)),
+                        **{
+                            epoch_column: to_ts(record.get(column), self._local_tz)
+                            for column, epoch_column in EPOCH_COLUMNS
+                        },
+                        "schedule": dump_schedule(record.get("schedule")),
+                        "allowed_networks": dump_networks(record.get("allowed_networks")),
+                        # Keeps printed compact links working after a move.
+                        "short_code": record.get("short_code") or new_short_code(),
+                    }
+
+                    existing = conn.execute("SELECT id FROM tokens WHERE uid = ? ORDER BY id LIMIT 1", (record["uid"],)).fetchone()
+                    if existing and self._on_conflict != CONFLICT_REPLACE:
+                        continue
+                    try:
+                        if existing:
+                            # Credentials only stay valid for the same user.
+                            conn.execute(
+                                f"""
+                                UPDATE tokens SET
+                                    token_ha_id = CASE WHEN userId = :userId THEN token_ha_id ELSE '' END,
+                                    token_ha = CASE WHEN userId = :userId THEN token_ha ELSE '' END,
+                                    {", ".join(f"{column} = :{column}" for column in values)}
+                                WHERE id = :id
+                                """,
+                                {**values, "id": existing[0]},
+                            )
+                        else:
+                            columns = ("uid", "token_ha_id", "token_ha", *values)
+                            cursor = conn.execute(
+                                f"""
+                                INSERT INTO tokens ({", ".join(columns)})
+                                VALUES ({", ".join(f":{column}" for column in columns)})
+                                """,
+                                {**values, "uid": record["uid"], "token_ha_id": "", "token_ha": ""},
+                            )
+                            created.append({**values, "id": cursor.lastrowid, "uid": record["uid"]})
+                    except sqlite3.IntegrityError as err:
+                        errors.append((line_number, str(err)))
+                        continue
+                    imported += 1
+        finally:
+            conn.close()
+        return imported, created, errors
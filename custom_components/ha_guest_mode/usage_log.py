@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import DATABASE, USAGE_FLUSH_DELAY, USAGE_FLUSH_SIZE
+from .instrumentation import instrumented
+
+_LOGGER = logging.getLogger(__name__)
+
+OUTCOME_SUCCESS = "success"
+
+BUCKET_HOUR = "hour"
+BUCKET_DAY = "day"
+BUCKET_SECONDS = {BUCKET_HOUR: 3600, BUCKET_DAY: 86400}
+
+
+def create_usage_tables(cursor) -> None:
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS token_usage_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token_id INTEGER NOT NULL,
+            user_id TEXT,
+            used_at INTEGER NOT NULL,
+            ip TEXT,
+            user_agent TEXT,
+            outcome TEXT NOT NULL
+        )
+        """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_token_usage_events_token ON token_usage_events (token_id, used_at)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_token_usage_events_used_at ON token_usage_events (used_at)"
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS token_usage_rollups (
+            token_id INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            logins INTEGER NOT NULL DEFAULT 0,
+            denied INTEGER NOT NULL DEFAULT 0,
+            last_used_at INTEGER,
+            PRIMARY KEY (token_id, bucket, bucket_start)
+        ) WITHOUT ROWID
+        """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_token_usage_rollups_bucket ON token_usage_rollups (bucket, bucket_start)"
+    )
+
+
+def _rollup(events: list[tuple]) -> list[tuple]:
+    """Fold a batch of events into (token_id, bucket, bucket_start) increments."""
+    totals: dict[tuple[int, str, int], list[int]] = defaultdict(lambda: [0, 0, 0])
+    for token_id, _, used_at, _, _, outcome in events:
+        for bucket, size in BUCKET_SECONDS.items():
+            entry = totals[(token_id, bucket, used_at - used_at % size)]
+            if outcome == OUTCOME_SUCCESS:
+                entry[0] += 1
+            else:
+                entry[1] += 1
+            entry[2] = max(entry[2], used_at)
+    return [(*key, logins, denied, last_used_at) for key, (logins, denied, last_used_at) in totals.items()]
+
+
+class UsageEventWriter:
+    """Buffer login events in memory and write them in batches off the event loop.
+
+    Recording an event is a plain list append so the login response never
+    waits on SQLite; rollups are updated in the same transaction as the batch.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._database_path = hass.config.path(DATABASE)
+        self._buffer: list[tuple] = []
+        self._flush_lock = asyncio.Lock()
+        self._unsub_timer: CALLBACK_TYPE | None = None
+
+    @callback
+    def async_record(self, token_id: int, user_id: str | None, request, outcome: str) -> None:
+        self._buffer.append(
+            (
+                token_id,
+                user_id,
+                int(time.time()),
+                request.remote,
+                request.headers.get("User-Agent"),
+                outcome,
+            )
+        )
+        if len(self._buffer) >= USAGE_FLUSH_SIZE:
+            self._cancel_timer()
+            self.hass.async_create_task(self.async_flush())
+        elif self._unsub_timer is None:
+            self._unsub_timer = async_call_later(self.hass, USAGE_FLUSH_DELAY, self._async_timer_flush)
+
+    async def _async_timer_flush(self, _now) -> None:
+        self._unsub_timer = None
+        await self.async_flush()
+
+    @callback
+    def _cancel_timer(self) -> None:
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+
+    @instrumented
+    async def async_flush(self, _event=None) -> None:
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            events, self._buffer = self._buffer, []
+            try:
+                await self.hass.async_add_executor_job(self._write, events)
+            except sqlite3.Error as err:
+                _LOGGER.warning("Unable to write %s guest login event(s): %s", len(events), err)
+
+    def _write(self, events: list[tuple]) -> None:
+        conn = sqlite3.connect(self._database_path)
+        try:
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT INTO token_usage_events (token_id, user_id, used_at, ip, user_agent, outcome)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    events,
+                )
+                conn.executemany(
+                    """
+                    INSERT INTO token_usage_rollups (token_id, bucket, bucket_start, logins, denied, last_used_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (token_id, bucket, bucket_start) DO UPDATE SET
+                        logins = logins + excluded.logins,
+                        denied = denied + excluded.denied,
+                        last_used_at = MAX(last_used_at, excluded.last_used_at)
+                    """,
+                    _rollup(events),
+                )
+        finally:
+            conn.close()
+
+    async def async_query_rollups(
+        self, bucket: str, start: int, end: int, token_id: int | None = None
+    ) -> list[dict[str, Any]]:
+        await self.async_flush()
+        return await self.hass.async_add_executor_job(self._query_rollups, bucket, start, end, token_id)
+
+    async def async_query_events(
+        self, token_id: int, before_id: int | None = None, limit: int = 100
+    ) -> list[dict[str, Any]]:
+        await self.async_flush()
+        return await self.hass.async_add_executor_job(self._query_events, token_id, before_id, limit)
+
+    def _query_rollups(self, bucket, start, end, token_id) -> list[dict[str, Any]]:
+        query = """
+            SELECT token_id, bucket_start, logins, denied, last_used_at
+            FROM token_usage_rollups
+            WHERE bucket = ? AND bucket_start >= ? AND bucket_start < ?
+        """
+        params: list[Any] = [bucket, start, end]
+        if token_id is not None:
+            query += " AND token_id = ?"
+            params.append(token_id)
+        query += " ORDER BY bucket_start, token_id"
+
+        conn = sqlite3.connect(self._database_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(query, tuple(params))]
+        finally:
+            conn.close()
+
+    def _query_events(self, token_id, before_id, limit) -> list[dict[str, Any]]:
+        query = """
+            SELECT id, token_id, user_id, used_at, ip, user_agent, outcome
+            FROM token_usage_events
+            WHERE token_id = ?
+        """
+        params: list[Any] = [token_id]
+        if before_id:
+            query += " AND id < ?"
+            params.append(before_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+
+        conn = sqlite3.connect(self._database_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(query, tuple(params))]
+        finally:
+            conn.close()
@@ -1,224 +1,238 @@
-import jwt
+import logging
 import sqlite3
-from datetime import timedelta, datetime
-from aiohttp import web
+from aiohttp import hdrs, web, web_urldispatcher
 from typing import Any
-import json
+
+from yarl import URL
+
+import voluptuous as vol
 
 from homeassistant.core import HomeAssistant
-from homeassistant.auth.models import TOKEN_TYPE_LONG_LIVED_ACCESS_TOKEN
 from homeassistant.components.http import HomeAssistantView
 from homeassistant.helpers.translation import async_get_translations
 
-from .const import DATABASE, DOMAIN
+from .const import DATABASE, DOMAIN, LOGIN_SHELL_CACHE_CONTROL, SHORT_CODE_LENGTH, TOKEN_EXCHANGE_URL
+from .credentials import CredentialError, async_issue_credentials
+from .network_filter import client_allowed
+from .instrumentation import instrumented
+from .schedule import get_compiled_schedule
+from .coordinator import async_signal_tokens_changed
+from .events import EVENT_TOKEN_USED, async_fire_token_event
+from .staticAssetsView import WWW_DIRECTORY
+from .timestamps import now_ts, ts_to_iso
+from .token_record import TokenRecord, token_record_factory
+from .usage_log import OUTCOME_SUCCESS
+
+_LOGGER = logging.getLogger(__name__)
+
+LOGIN_SHELL = "login.html"
+
+_EXCHANGE_SCHEMA = vol.Schema({vol.Optional("token", default=""): str}, extra=vol.REMOVE_EXTRA)
+
+
+class ValidateTokenView(web_urldispatcher.AbstractResource):
+    """Guest login page, served at the login path currently configured.
+
+    Every link gets the same static shell (precompressed with the panel
+    assets), which reads the token from its URL and trades it through
+    TokenExchangeView.
+
+    A router resource rather than a view, like the frontend's index: it is
+    registered once at startup and matches only the configured path, so
+    changing the option adds no route, a previous path stops answering and
+    every other request falls through to the rest of the router.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        super().__init__()
+        self.hass = hass
+        self._route = web_urldispatcher.ResourceRoute(hdrs.METH_GET, self.get, self)
+
+    @property
+    def canonical(self) -> str:
+        return "/"
+
+    def url_for(self, **kwargs: str) -> URL:
+        return URL(self.hass.data.get("get_path_to_login", "/"))
+
+    async def resolve(self, request: web.Request) -> tuple[web_urldispatcher.UrlMappingMatchInfo | None, set[str]]:
+        if request.path != self.hass.data.get("get_path_to_login"):
+            return None, set()
+        if request.method not in (hdrs.METH_GET, hdrs.METH_HEAD):
+            return None, {hdrs.METH_GET}
+        return web_urldispatcher.UrlMappingMatchInfo({}, self._route), {hdrs.METH_GET}
+
+    def add_prefix(self, prefix: str) -> None:
+        """The login path is absolute."""
+
+    def get_info(self) -> dict[str, Any]:
+        return {"path": self.hass.data.get("get_path_to_login")}
+
+    def raw_match(self, path: str) -> bool:
+        return False
+
+    def __len__(self) -> int:
+        return 1
+
+    def __iter__(self):
+        return iter([self._route])
+
+    @instrumented
+    async def get(self, request):
+        # Served next to its precompressed copies, see build_compressed_assets.
+        directory = self.hass.data[DOMAIN].get("asset_directory", WWW_DIRECTORY)
+        return web.FileResponse(directory / LOGIN_SHELL, headers={hdrs.CACHE_CONTROL: LOGIN_SHELL_CACHE_CONTROL})
+
+
+class TokenExchangeView(HomeAssistantView):
+    """Exchange the token of a guest link for a Home Assistant access token.
+
+    POST {"token": "<uid or short code>"} returns {"access_token", "redirect"}.
+    Errors come back as {"error": <label>, "message": <translated text>} with
+    the matching status. Used by the login shell, and open to kiosk clients.
+    """
 
-class ValidateTokenView(HomeAssistantView):
-    name = "guest-mode:login"
+    name = "api:ha_guest_mode:exchange"
+    url = TOKEN_EXCHANGE_URL
     requires_auth = False
 
     def __init__(self, hass: HomeAssistant):
         self.hass = hass
-        self.url = hass.data.get("get_path_to_login")
+        self._database_path = hass.config.path(DATABASE)
 
     def get_translations(self, translations: dict[str, Any], label: str):
         key = f"component.{DOMAIN}.entity.guest_error.{label}.name"
         return translations.get(key, f"Missing translation: {key}")
 
-    async def _restore_managed_user(self, cursor, token_row: sqlite3.Row):
-        available_groups = []
-        store = getattr(self.hass.auth, "_store", None)
-        if store is not None:
-            getter = getattr(store, "async_get_groups", None)
-            if getter is not None:
-                available_groups = await getter()
-
-        if not available_groups:
-            getter = getattr(self.hass.auth, "async_get_group", None)
-            if getter is not None:
-                for group_id in ("system-admin", "system-users", "system-read-only"):
-                    group = await getter(group_id)
-                    if group is not None:
-                        available_groups.append(group)
-
-        available_group_ids = {group.id for group in available_groups}
-
-        stored_groups = token_row["managed_user_groups"]
-        stored_local_only = token_row["managed_user_local_only"]
-        group_ids: list[str] = []
-        if stored_groups:
-            try:
-                parsed = json.loads(stored_groups)
-                if isinstance(parsed, list):
-                    group_ids = [gid for gid in parsed if gid in available_group_ids]
-            except (ValueError, TypeError):
-                group_ids = []
+    async def _error(self, label: str, status: int):
+        translations = await async_get_translations(self.hass, self.hass.config.language, "entity")
+        return self.json({"error": label, "message": self.get_translations(translations, label)}, status_code=status)
 
-        group_ids = list(dict.fromkeys(group_ids))
+    def _record_usage(self, request, token_row, outcome: str):
+        """Queue a login event, the write happens later in a batch."""
+        self.hass.data[DOMAIN]["usage_log"].async_record(
+            token_row["id"], token_row["userId"], request, outcome
+        )
 
-        user_name = token_row["managed_user_name"] or token_row["token_name"] or "Guest"
+    def _lookup(self, token_param: str) -> TokenRecord | None:
+        conn = sqlite3.connect(self._database_path)
+        conn.row_factory = token_record_factory
+        try:
+            # Compact links carry the short code instead of the uid, both are indexed.
+            if len(token_param) == SHORT_CODE_LENGTH:
+                return conn.execute("SELECT * FROM tokens WHERE short_code = ?", (token_param.upper(),)).fetchone()
+            return conn.execute("SELECT * FROM tokens WHERE uid = ?", (token_param,)).fetchone()
+        finally:
+            conn.close()
+
+    def _claim_use(self, token_id: int, used_ts: int) -> bool:
+        """Count a login, unless the usage limit is already reached.
+
+        Checked and counted in one statement, so concurrent logins cannot
+        both take the last use.
+        """
+        used_iso = ts_to_iso(used_ts)
+        conn = sqlite3.connect(self._database_path)
+        try:
+            with conn:
+                cursor = conn.execute(
+                    """
+                    UPDATE tokens SET
+                        last_used = ?,
+                        last_used_ts = ?,
+                        times_used = COALESCE(times_used, 0) + 1,
+                        first_used = COALESCE(NULLIF(first_used, ''), ?),
+                        first_used_ts = CASE WHEN NULLIF(first_used, '') IS NULL THEN ? ELSE first_used_ts END
+                    WHERE id = ?
+                      AND (usage_limit IS NULL OR usage_limit <= 0 OR COALESCE(times_used, 0) < usage_limit)
+                    """,
+                    (used_iso, used_ts, used_iso, used_ts, token_id),
+                )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
 
-        local_only_flag = None
-        if stored_local_only is not None:
-            local_only_flag = bool(stored_local_only)
+    @instrumented
+    async def post(self, request):
+        # PyJWT is only needed once a guest actually logs in.
+        import jwt
 
         try:
-            user = await self.hass.auth.async_create_user(
-                user_name,
-                group_ids=group_ids or None,
-                local_only=local_only_flag,
-            )
-        except ValueError:
-            return None
-
-        local_only_value = 1 if user.local_only else 0
-        cursor.execute(
-            """
-            UPDATE tokens
-            SET userId = ?, managed_user_name = ?, managed_user_groups = ?, managed_user_local_only = ?
-            WHERE id = ?
-            """,
-            (user.id, user.name, json.dumps(group_ids) if group_ids else None, local_only_value, token_row["id"]),
-        )
-        return user
-
-    async def get(self, request):
-        language = self.hass.config.language 
-        translations = await async_get_translations(self.hass, language, "entity")
+            body = _EXCHANGE_SCHEMA(await request.json())
+        except (ValueError, vol.Invalid):
+            return self.json_message("Expected a JSON object with a token", 400)
 
-        token_param = request.query.get("token")
+        token_param = body["token"]
         if not token_param:
-            return web.Response(status=400, text=self.get_translations(translations, "missing_token"))
-        
-        conn = sqlite3.connect(self.hass.config.path(DATABASE))
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT * FROM tokens WHERE uid = ?',
-            (token_param,)
-        )
-        result = cursor.fetchone()
+            return await self._error("missing_token", 400)
 
-        
+        result = await self.hass.async_add_executor_job(self._lookup, token_param)
         if result is None:
-            return web.Response(status=404, text=self.get_translations(translations, "token_not_found"))
+            return await self._error("token_not_found", 404)
 
-        try:
-            first_used = result["first_used"]
-            times_used = result["times_used"] or 0
-            usage_limit = result["usage_limit"]
-            if usage_limit is not None and usage_limit > 0 and times_used >= usage_limit:
-                return web.Response(status=403, text=self.get_translations(translations, "usage_limit_reached"))
-            
-            now_iso = datetime.now().isoformat()
-            new_times_used = times_used + 1
-            
-            update_query = "UPDATE tokens SET last_used = ?, times_used = ?"
-            params = [now_iso, new_times_used]
-
-            if not first_used:
-                update_query += ", first_used = ?"
-                params.append(now_iso)
-            
-            update_query += " WHERE id = ?"
-            params.append(result["id"])
-
-            cursor.execute(update_query, tuple(params))
-            conn.commit()
-        except (ValueError, IndexError):
-            # Columns not present, do nothing
-            pass
+        # Checked before anything is written or verified, a rejected caller costs one indexed read.
+        if not client_allowed(request.remote, result["allowed_networks"], self.hass.data.get("default_allowed_networks", ())):
+            self._record_usage(request, result, "ip_not_allowed")
+            return await self._error("ip_not_allowed", 403)
 
         try:
-            public_key = self.hass.data.get("public_key")
+            public_key = await self.hass.data[DOMAIN]["key_manager"].async_get_public_key()
             if public_key is None:
-                return web.Response(status=500, text=self.get_translations(translations, "internal_server_error"))
-            decoded_token = jwt.decode(result["token_ha_guest_mode"], public_key, algorithms=["RS256"])
-            is_never_expire = bool(result["is_never_expire"])
-            start_date = None
-            end_date = None
-            if not is_never_expire:
-                start_date = datetime.fromisoformat(decoded_token.get("startDate"))
-                end_date = datetime.fromisoformat(decoded_token.get("endDate"))
+                return await self._error("internal_server_error", 500)
+            # The signature still proves the row was issued by us, the
+            # validity window is read from the indexed epoch columns.
+            jwt.decode(result["token_ha_guest_mode"], public_key, algorithms=["RS256"])
         except jwt.ExpiredSignatureError:
-            return web.Response(status=401, text=self.get_translations(translations, "expired_token"))
+            self._record_usage(request, result, "expired_token")
+            return await self._error("expired_token", 401)
         except jwt.InvalidTokenError:
-            return web.Response(status=401, text=self.get_translations(translations, "invalid_token"))
-        except Exception as e:
-            return web.Response(status=400, text=str(e))
-
-        now = datetime.now()
-        if not is_never_expire and (now < start_date or now > end_date):
-            return web.Response(status=403, text=self.get_translations(translations, "not_yet_or_expired"))
-        
+            self._record_usage(request, result, "invalid_token")
+            return await self._error("invalid_token", 401)
+        except Exception:
+            _LOGGER.exception("Could not verify guest token %s", result["id"])
+            self._record_usage(request, result, "internal_server_error")
+            return await self._error("internal_server_error", 500)
+
+        now = now_ts()
+        start_ts, end_ts = result["start_ts"], result["end_ts"]
+        if not result.never_expires and (start_ts is None or end_ts is None or now < start_ts or now > end_ts):
+            self._record_usage(request, result, "not_yet_or_expired")
+            return await self._error("not_yet_or_expired", 403)
+
+        schedule = get_compiled_schedule(result, now)
+        if schedule is not None and not schedule.is_active(now):
+            self._record_usage(request, result, "outside_schedule")
+            return await self._error("outside_schedule", 403)
+
+        # Only a login that passed every check counts towards the usage limit;
+        # the conditional update still settles concurrent logins on the last use.
+        if not await self.hass.async_add_executor_job(self._claim_use, result["id"], now):
+            self._record_usage(request, result, "usage_limit_reached")
+            return await self._error("usage_limit_reached", 403)
+        async_signal_tokens_changed(self.hass)
+
         token = result["token_ha"]
-        if token:
-            refresh_token = self.hass.auth.async_validate_access_token(token)
-            if refresh_token is None:
-                token = ""
-        else:
-            token = "" 
-
-        dashboard = result["dashboard"]
-        if dashboard and dashboard.startswith('/'):
-            dashboard = dashboard[1:]
-        
-        if token == "" and (is_never_expire or (start_date and now > start_date)):
-            """ if is_never_expire or (start_date and now > start_date): """
-            users = await self.hass.auth.async_get_users()
-
-            user = next((u for u in users if u.id == result["userId"]), None)
-            if user is None and result["managed_user"]:
-                user = await self._restore_managed_user(cursor, result)
-                if user:
-                    conn.commit()
-                    users = await self.hass.auth.async_get_users()
-
-            if user is None:
-                return web.Response(status=404, text=self.get_translations(translations, "user_not_found"))
-            
-            token_args = {
-                "client_name": result["token_name"],
-                "token_type": TOKEN_TYPE_LONG_LIVED_ACCESS_TOKEN,
-            }
-            if not is_never_expire and end_date:
-                endDateInSeconds = (end_date - now).total_seconds()
-                token_args["access_token_expiration"] = timedelta(seconds=endDateInSeconds)
+        if token and self.hass.auth.async_validate_access_token(token) is None:
+            token = ""
+
+        dashboard = (result["dashboard"] or "").lstrip("/")
 
+        if not token:
             try:
-                refresh_token = await self.hass.auth.async_create_refresh_token(
-                    user,
-                    **token_args
-                )
-            except ValueError:
-                refresh_token = next(
-                    (rt for rt in user.refresh_tokens.values() if rt.client_name == result["token_name"]),
-                    None,
-                )
-                if refresh_token is None:
-                    return web.Response(status=500, text=self.get_translations(translations, "internal_server_error"))
-
-            token = self.hass.auth.async_create_access_token(refresh_token)
-
-            query = """
-                UPDATE tokens SET token_ha_id = ?, token_ha = ? WHERE id = ?
-            """
-            cursor.execute(query, (refresh_token.id, token, result["id"]))
-            conn.commit()
-
-
-        conn.close()
-
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-            <body>
-                <script type="text/javascript">
-                    const hassUrl = window.location.protocol + '//' + window.location.host;
-                    const access_token = '{token}';
-                    localStorage.setItem('hassTokens', JSON.stringify({{ access_token: access_token, hassUrl: hassUrl }}));
-                    window.location.href = hassUrl + '/{dashboard}';
-                </script>
-            </body>
-        </html>
-        """
-        return web.Response(content_type="text/html", text=html_content)
+                token = await async_issue_credentials(self.hass, result, now)
+            except CredentialError as err:
+                if str(err) == "user_not_found":
+                    self._record_usage(request, result, "user_not_found")
+                    return await self._error("user_not_found", 404)
+                return await self._error(str(err), 500)
+
+        self._record_usage(request, result, OUTCOME_SUCCESS)
+        async_fire_token_event(
+            self.hass, EVENT_TOKEN_USED, result, times_used=(result["times_used"] or 0) + 1
+        )
+
+        # Never cached: the body is a live credential.
+        return self.json(
+            {"access_token": token, "redirect": f"/{dashboard}"},
+            headers={hdrs.CACHE_CONTROL: "no-store"},
+        )
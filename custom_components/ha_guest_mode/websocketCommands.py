@@ -1,154 +1,62 @@
-import sqlite3
-from datetime import timedelta, datetime, timezone
+from datetime import timedelta
 from typing import Any
 from collections import defaultdict
 import voluptuous as vol
 from contextlib import suppress
-import jwt
-import uuid
 import json
+import io
 
 from homeassistant.core import HomeAssistant
-from homeassistant.auth.models import TOKEN_TYPE_LONG_LIVED_ACCESS_TOKEN
 from homeassistant.components import websocket_api
 from homeassistant.util import dt as dt_util
 from homeassistant.helpers.network import NoURLAvailableError, get_url
 from homeassistant.helpers import config_validation as cv
 
-from .const import DATABASE
+from .archive import REASON_CANCELLED, REASON_EXPIRED, REASON_REVOKED, REASON_USAGE_EXHAUSTED
+from .const import API_PAGE_SIZE, API_PAGE_SIZE_MAX, DOMAIN
+from .managed_users import async_get_all_groups
+from .transfer import CONFLICT_REPLACE, CONFLICT_SKIP, TokenImporter, async_iter_export
+from .links import link_token
+from .instrumentation import instrumented
+from .repository import new_token_row, serialize_token
+from .schedule import SCHEDULE_SCHEMA
+from .timestamps import now_ts
+from .token_query import STATUSES
+from .usage_log import BUCKET_DAY, BUCKET_HOUR, BUCKET_SECONDS
 
 
-async def _async_get_all_groups(hass: HomeAssistant):
-    """Return all auth groups, compatible with multiple HA versions."""
-    auth = hass.auth
-    groups = []
-
-    store = getattr(auth, "_store", None)
-    if store is not None:
-        getter = getattr(store, "async_get_groups", None)
-        if getter is not None:
-            groups = await getter()
-            return list(groups)
-
-    # Fallback to fetching known groups individually
-    potential_ids = ("system-admin", "system-users", "system-read-only")
-    getter = getattr(auth, "async_get_group", None)
-    if getter is not None:
-        for group_id in potential_ids:
-            group = await getter(group_id)
-            if group is not None:
-                groups.append(group)
-
-    return groups
-
-@websocket_api.websocket_command({vol.Required("type"): "ha_guest_mode/list_users"})
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "ha_guest_mode/list_users",
+        vol.Optional("status"): vol.In(STATUSES),
+        vol.Optional("last_used_after"): vol.Coerce(int),
+        vol.Optional("last_used_before"): vol.Coerce(int),
+        # The panel pages through list_tokens instead.
+        vol.Optional("include_tokens", default=True): bool,
+    }
+)
 @websocket_api.require_admin
 @websocket_api.async_response
+@instrumented
 async def list_users(
     hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
 ) -> None:
     result = []
-    now = dt_util.utcnow()
-
-    conn = sqlite3.connect(hass.config.path(DATABASE))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM tokens')
-    token_rows = cursor.fetchall()
-
-    async def remove_managed_user_if_needed(user_id: str, managed: bool) -> None:
-        if not managed:
-            return
-
-        cursor.execute('SELECT COUNT(*) FROM tokens WHERE userId = ?', (user_id,))
-        remaining = cursor.fetchone()[0]
-        if remaining:
-            return
-
-        user = await hass.auth.async_get_user(user_id)
-        if user and not user.system_generated:
-            await hass.auth.async_remove_user(user)
-
+    now = now_ts()
     active_tokens = []
-    for row in token_rows:
-        token = dict(row)
-        is_never_expire = bool(token.get("is_never_expire"))
-        end_date_str = token.get("end_date")
-
-        if not is_never_expire and end_date_str:
-            end_date = datetime.fromisoformat(end_date_str).replace(tzinfo=timezone.utc)
-
-            if end_date < now:
-                refresh_token_id = token.get("token_ha_id")
-                if refresh_token_id:
-                    with suppress(Exception):
-                        refresh_token = hass.auth.async_get_refresh_token(refresh_token_id)
-                        if refresh_token:
-                            hass.auth.async_remove_refresh_token(refresh_token)
-
-                cursor.execute('DELETE FROM tokens WHERE id = ?', (token["id"],))
-                await remove_managed_user_if_needed(token["userId"], bool(token.get("managed_user")))
-                continue
 
-        active_tokens.append(token)
+    if msg["include_tokens"]:
+        # Expired and exhausted tokens leave the hot table before we read it.
+        await hass.data[DOMAIN]["archiver"].async_archive_due()
 
-    conn.commit()
+        active_tokens = await hass.data[DOMAIN]["repository"].async_list(
+            status=msg.get("status"),
+            last_used_after=msg.get("last_used_after"),
+            last_used_before=msg.get("last_used_before"),
+        )
 
     existing_users = {user.id: user for user in await hass.auth.async_get_users()}
 
-    managed_tokens_missing_user = [
-        token for token in active_tokens
-        if token.get("managed_user") and token.get("userId") not in existing_users
-    ]
-
-    if managed_tokens_missing_user:
-        available_groups = {group.id: group for group in await _async_get_all_groups(hass)}
-        for token in managed_tokens_missing_user:
-            stored_groups = token.get("managed_user_groups")
-            stored_local_only = token.get("managed_user_local_only")
-            group_ids: list[str] = []
-            if stored_groups:
-                try:
-                    parsed = json.loads(stored_groups)
-                    if isinstance(parsed, list):
-                        group_ids = [gid for gid in parsed if gid in available_groups]
-                except (ValueError, TypeError):
-                    group_ids = []
-            group_ids = list(dict.fromkeys(group_ids))  # preserve order, ensure unique
-
-            local_only_flag = None
-            if stored_local_only is not None:
-                local_only_flag = bool(stored_local_only)
-
-            user_name = token.get("managed_user_name") or token.get("token_name") or "Guest"
-            new_user = await hass.auth.async_create_user(
-                user_name,
-                group_ids=group_ids or None,
-                local_only=local_only_flag,
-            )
-            existing_users[new_user.id] = new_user
-
-            token["userId"] = new_user.id
-            token["managed_user_name"] = new_user.name
-
-            stored_group_value = json.dumps(group_ids) if group_ids else None
-            managed_user_local_only_value = 1 if new_user.local_only else 0
-
-            cursor.execute(
-                """
-                UPDATE tokens
-                SET userId = ?, managed_user_name = ?, managed_user_groups = ?, managed_user_local_only = ?
-                WHERE id = ?
-                """,
-                (new_user.id, new_user.name, stored_group_value, managed_user_local_only_value, token["id"]),
-            )
-
-            token["managed_user_groups"] = stored_group_value
-            token["managed_user_local_only"] = managed_user_local_only_value
-
-        conn.commit()
-        existing_users = {user.id: user for user in await hass.auth.async_get_users()}
-
     tokens_by_user = defaultdict(list)
     for token in active_tokens:
         tokens_by_user[token["userId"]].append(token)
@@ -156,33 +64,10 @@ async def list_users(
     for user in existing_users.values():
         ha_username = next((cred.data.get("username") for cred in user.credentials if cred.auth_provider_type == "homeassistant"), None)
 
-        tokens = []
-        for token in tokens_by_user.get(user.id, []):
-            is_never_expire = bool(token["is_never_expire"])
-            remaining_seconds = None
-            if not is_never_expire and token["end_date"]:
-                remaining_seconds = int(
-                    (datetime.fromisoformat(token["end_date"]).replace(tzinfo=timezone.utc) - now).total_seconds()
-                )
-
-            tokens.append(
-                {
-                    "id": token["id"],
-                    "name": token["token_name"],
-                    "type": TOKEN_TYPE_LONG_LIVED_ACCESS_TOKEN,
-                    "end_date": token["end_date"],
-                    "remaining": remaining_seconds,
-                    "start_date": token["start_date"],
-                    "isUsed": bool(token["token_ha"]),
-                    "uid": token["uid"],
-                    "isNeverExpire": is_never_expire,
-                    "dashboard": token["dashboard"],
-                    "first_used": token["first_used"],
-                    "last_used": token["last_used"],
-                    "times_used": token["times_used"] or 0,
-                    "usage_limit": token["usage_limit"],
-                }
-            )
+        tokens = [
+            {**serialize_token(token, now), "link_token": link_token(hass, token)}
+            for token in tokens_by_user.get(user.id, [])
+        ]
 
         result.append({
             "id": user.id,
@@ -197,18 +82,63 @@ async def list_users(
             "tokens": tokens,
         })
 
-    conn.commit()
-    conn.close()
     connection.send_result(msg["id"], result)
 
 
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "ha_guest_mode/list_tokens",
+        vol.Optional("cursor"): int,
+        vol.Optional("limit", default=API_PAGE_SIZE): vol.All(int, vol.Range(min=1, max=API_PAGE_SIZE_MAX)),
+    }
+)
+@websocket_api.require_admin
+@websocket_api.async_response
+@instrumented
+async def list_tokens(
+    hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
+) -> None:
+    """Return one page of the panel's tokens ordered by id, pass next_cursor back as cursor.
+
+    Tokens of removed, disabled or system users are left out, as list_users
+    does, so a page may hold fewer than ``limit`` tokens.
+    """
+    cursor = msg.get("cursor")
+    if cursor is None:
+        # Expired and exhausted tokens leave the hot table before we read it.
+        await hass.data[DOMAIN]["archiver"].async_archive_due()
+
+    limit = msg["limit"]
+    tokens = await hass.data[DOMAIN]["repository"].async_list(after_id=cursor, limit=limit + 1)
+    next_cursor = None
+    if len(tokens) > limit:
+        tokens = tokens[:limit]
+        next_cursor = tokens[-1]["id"]
+
+    users = {
+        user.id: user.name
+        for user in await hass.auth.async_get_users()
+        if user.is_active and not user.system_generated
+    }
+    now = now_ts()
+    connection.send_result(msg["id"], {
+        "tokens": [
+            {**serialize_token(token, now), "link_token": link_token(hass, token), "user_name": users[token["userId"]]}
+            for token in tokens
+            if token["userId"] in users
+        ],
+        "next_cursor": next_cursor,
+    })
+
+
 @websocket_api.websocket_command({vol.Required("type"): "ha_guest_mode/list_groups"})
 @websocket_api.require_admin
 @websocket_api.async_response
+@instrumented
 async def list_groups(
     hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
 ) -> None:
-    groups = await _async_get_all_groups(hass)
+    groups = await async_get_all_groups(hass)
     payload = [
         {
             "id": group.id,
@@ -234,25 +164,21 @@ async def list_groups(
         vol.Optional("new_user_name"): str,
         vol.Optional("group_ids"): vol.All(cv.ensure_list, [cv.string]),
         vol.Optional("new_user_local_only", default=False): bool,
+        vol.Optional("schedule"): vol.Any(None, SCHEDULE_SCHEMA),
+        vol.Optional("allowed_networks"): vol.Any(None, [str]),
     }
 )
 @websocket_api.require_admin
 @websocket_api.async_response
+@instrumented
 async def create_token(
     hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
 ) -> None:
     try:
         is_never_expire = msg.get("isNeverExpire", False)
-        startDate_iso = None
-        endDate_iso = None
-        dashboard = msg.get("dashboard", "lovelace")
-        usage_limit = msg.get("usage_limit")
         create_user = msg.get("create_user", False)
         user_id = msg.get("user_id")
-        managed_user = False
-        managed_user_name = None
-        managed_user_groups = None
-        managed_user_local_only = None
+        start = end = None
 
         if not is_never_expire:
             if "startDate" not in msg or "expirationDate" not in msg:
@@ -264,28 +190,53 @@ async def create_token(
                     )
                 )
                 return
-            now = datetime.now()
-            startDate = now + timedelta(minutes=msg["startDate"])
-            endDate = now + timedelta(minutes=msg["expirationDate"])
-            startDate_iso = startDate.isoformat()
-            endDate_iso = endDate.isoformat()
+            now = dt_util.utcnow()
+            start = now + timedelta(minutes=msg["startDate"])
+            end = now + timedelta(minutes=msg["expirationDate"])
 
-        uid = str(uuid.uuid4())
+        if not create_user and not user_id:
+            connection.send_message(
+                websocket_api.error_message(
+                    msg["id"],
+                    websocket_api.const.ERR_INVALID_FORMAT,
+                    "user_id is required",
+                )
+            )
+            return
 
-        if create_user:
-            new_user_name = msg.get("new_user_name")
-            if not new_user_name:
-                connection.send_message(
-                    websocket_api.error_message(
-                        msg["id"],
-                        websocket_api.const.ERR_INVALID_FORMAT,
-                        "new_user_name is required when create_user is true",
-                    )
+        if create_user and not msg.get("new_user_name"):
+            connection.send_message(
+                websocket_api.error_message(
+                    msg["id"],
+                    websocket_api.const.ERR_INVALID_FORMAT,
+                    "new_user_name is required when create_user is true",
                 )
-                return
+            )
+            return
 
+        # Validated before a managed user is created, so a bad schedule or
+        # network does not leave an orphaned user behind.
+        try:
+            row = new_token_row(
+                user_id=user_id or "",
+                token_name=msg["name"],
+                start=start,
+                end=end,
+                dashboard=msg.get("dashboard", "lovelace"),
+                usage_limit=msg.get("usage_limit"),
+                schedule=msg.get("schedule"),
+                allowed_networks=msg.get("allowed_networks"),
+            )
+        except (ValueError, vol.Invalid) as err:
+            connection.send_message(
+                websocket_api.error_message(msg["id"], websocket_api.const.ERR_INVALID_FORMAT, str(err))
+            )
+            return
+
+        user = None
+        if create_user:
             new_user_local_only = bool(msg.get("new_user_local_only", False))
-            groups = await _async_get_all_groups(hass)
+            groups = await async_get_all_groups(hass)
             valid_group_ids = {group.id for group in groups}
             requested_group_ids = msg.get("group_ids") or []
             if isinstance(requested_group_ids, str):
@@ -295,7 +246,7 @@ async def create_token(
 
             try:
                 user = await hass.auth.async_create_user(
-                    new_user_name,
+                    msg["new_user_name"],
                     group_ids=group_ids or None,
                     local_only=new_user_local_only,
                 )
@@ -307,80 +258,20 @@ async def create_token(
                 )
                 return
 
-            user_id = user.id
-            managed_user = True
-            managed_user_name = user.name
-            managed_user_groups = json.dumps(group_ids) if group_ids else None
-            managed_user_local_only = 1 if user.local_only else 0
-
-        if not user_id:
-            connection.send_message(
-                websocket_api.error_message(
-                    msg["id"],
-                    websocket_api.const.ERR_INVALID_FORMAT,
-                    "user_id is required",
-                )
-            )
-            return
-        
-        private_key = hass.data.get("private_key")
-        if private_key is None:
-            connection.send_message(msg["id"],  websocket_api.const.ERR_NOT_FOUND, "private key not found")
-            return
-
-        token_payload = {"id": msg["id"], "isNeverExpire": is_never_expire}
-        if not is_never_expire:
-            token_payload["startDate"] = startDate_iso
-            token_payload["endDate"] = endDate_iso
-        
-        tokenGenerated = jwt.encode(token_payload, private_key, algorithm="RS256")
-
-        query = """
-            INSERT INTO tokens (
-                userId,
-                token_name,
-                start_date,
-                end_date,
-                token_ha_id,
-                token_ha,
-                token_ha_guest_mode,
-                uid,
-                is_never_expire,
-                dashboard,
-                usage_limit,
-                managed_user,
-                managed_user_name,
-                managed_user_groups,
-                managed_user_local_only
+            row.update(
+                userId=user.id,
+                managed_user=1,
+                managed_user_name=user.name,
+                managed_user_groups=json.dumps(group_ids) if group_ids else None,
+                managed_user_local_only=1 if user.local_only else 0,
             )
-            values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-        conn = sqlite3.connect(hass.config.path(DATABASE))
-        cursor = conn.cursor()
-        cursor.execute(
-            query,
-            (
-                user_id,
-                msg["name"],
-                startDate_iso,
-                endDate_iso,
-                "",
-                "",
-                tokenGenerated,
-                uid,
-                is_never_expire,
-                dashboard,
-                usage_limit,
-                1 if managed_user else 0,
-                managed_user_name,
-                managed_user_groups,
-                managed_user_local_only,
-            ),
-        )
-        conn.commit()
-        conn.close()
 
-        await hass.services.async_call("homeassistant", "update_entity", {"entity_id": "image.guest_qr_code"}, blocking=True)
+        try:
+            await hass.data[DOMAIN]["repository"].async_create([row])
+        except Exception:
+            if user is not None:
+                await hass.auth.async_remove_user(user)
+            raise
 
     except ValueError as err:
         connection.send_message(
@@ -388,7 +279,7 @@ async def create_token(
         )
         return
 
-    connection.send_result(msg["id"], uid)
+    connection.send_result(msg["id"], row["uid"])
 
 @websocket_api.websocket_command(
     {
@@ -398,46 +289,129 @@ async def create_token(
 )
 @websocket_api.require_admin
 @websocket_api.async_response
+@instrumented
 async def delete_token(
     hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
 ) -> None:
-    # @Todo add try catch to catch error with slqite
-    conn = sqlite3.connect(hass.config.path(DATABASE))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT token_ha_id, userId, managed_user FROM tokens WHERE id = ?', (msg["token_id"],))
-    token = cursor.fetchone()
-
-    if token is None:
-        conn.close()
-        connection.send_result(msg["id"], False)
-        return
+    revoked = await hass.data[DOMAIN]["archiver"].async_revoke(msg["token_id"])
+    connection.send_result(msg["id"], revoked)
 
-    if token["token_ha_id"]:
-        try:
-            tokenHa = hass.auth.async_get_refresh_token(token["token_ha_id"])
-            hass.auth.async_remove_refresh_token(tokenHa)
-        except Exception:
-            # Ignore if token is already removed from HA
-            pass
-    
-    cursor.execute('DELETE FROM tokens WHERE id = ?', (msg["token_id"],))
-
-    if token["managed_user"]:
-        cursor.execute('SELECT COUNT(*) FROM tokens WHERE userId = ?', (token["userId"],))
-        remaining = cursor.fetchone()[0]
-        if not remaining:
-            user = await hass.auth.async_get_user(token["userId"])
-            if user and not user.system_generated:
-                await hass.auth.async_remove_user(user)
 
-    conn.commit()
-    conn.close()
-    connection.send_result(msg["id"], True)
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "ha_guest_mode/list_archived_tokens",
+        vol.Optional("user_id"): str,
+        vol.Optional("reason"): vol.In([REASON_CANCELLED, REASON_EXPIRED, REASON_REVOKED, REASON_USAGE_EXHAUSTED]),
+        vol.Optional("before_id"): int,
+        vol.Optional("limit", default=100): vol.All(int, vol.Range(min=1, max=1000)),
+    }
+)
+@websocket_api.require_admin
+@websocket_api.async_response
+@instrumented
+async def list_archived_tokens(
+    hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
+) -> None:
+    """Return archived tokens, newest first, paginated with before_id."""
+    tokens = await hass.data[DOMAIN]["archiver"].async_query(
+        user_id=msg.get("user_id"),
+        reason=msg.get("reason"),
+        before_id=msg.get("before_id"),
+        limit=msg["limit"],
+    )
+    connection.send_result(msg["id"], tokens)
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "ha_guest_mode/get_usage_history",
+        vol.Optional("token_id"): int,
+        vol.Optional("bucket", default=BUCKET_DAY): vol.In([BUCKET_HOUR, BUCKET_DAY]),
+        vol.Optional("start"): int, # epoch seconds
+        vol.Optional("end"): int, # epoch seconds
+    }
+)
+@websocket_api.require_admin
+@websocket_api.async_response
+@instrumented
+async def get_usage_history(
+    hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
+) -> None:
+    """Return login counts per token and time bucket, read from the rollups."""
+    bucket = msg["bucket"]
+    end = msg.get("end", int(dt_util.utcnow().timestamp()))
+    # Default to the last 48 hours or the last 30 days.
+    start = msg.get("start", end - BUCKET_SECONDS[bucket] * (48 if bucket == BUCKET_HOUR else 30))
+    history = await hass.data[DOMAIN]["usage_log"].async_query_rollups(
+        bucket, start, end, msg.get("token_id")
+    )
+    connection.send_result(msg["id"], history)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "ha_guest_mode/list_usage_events",
+        vol.Required("token_id"): int,
+        vol.Optional("before_id"): int,
+        vol.Optional("limit", default=100): vol.All(int, vol.Range(min=1, max=1000)),
+    }
+)
+@websocket_api.require_admin
+@websocket_api.async_response
+@instrumented
+async def list_usage_events(
+    hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
+) -> None:
+    """Return the raw login events of one token, newest first."""
+    events = await hass.data[DOMAIN]["usage_log"].async_query_events(
+        msg["token_id"], msg.get("before_id"), msg["limit"]
+    )
+    connection.send_result(msg["id"], events)
+
+
+@websocket_api.websocket_command({vol.Required("type"): "ha_guest_mode/export_tokens"})
+@websocket_api.require_admin
+@websocket_api.async_response
+@instrumented
+async def export_tokens(
+    hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
+) -> None:
+    """Stream the JSON Lines export as a series of events, then a final done event."""
+    connection.send_result(msg["id"])
+    async for chunk in async_iter_export(hass):
+        connection.send_message(websocket_api.event_message(msg["id"], {"data": chunk}))
+    connection.send_message(websocket_api.event_message(msg["id"], {"done": True}))
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "ha_guest_mode/import_tokens",
+        vol.Required("data"): str, # JSON Lines
+        vol.Optional("on_conflict", default=CONFLICT_SKIP): vol.In([CONFLICT_SKIP, CONFLICT_REPLACE]),
+    }
+)
+@websocket_api.require_admin
+@websocket_api.async_response
+@instrumented
+async def import_tokens(
+    hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
+) -> None:
+    importer = TokenImporter(hass, msg["on_conflict"])
+    try:
+        await importer.async_prepare()
+    except ValueError as err:
+        connection.send_message(
+            websocket_api.error_message(msg["id"], websocket_api.const.ERR_UNKNOWN_ERROR, str(err))
+        )
+        return
+    for line in io.StringIO(msg["data"]):
+        await importer.async_feed_line(line)
+    connection.send_result(msg["id"], await importer.async_finish())
+
 
 @websocket_api.websocket_command({vol.Required("type"): "ha_guest_mode/get_path_to_login"})
 @websocket_api.require_admin
 @websocket_api.async_response
+@instrumented
 async def get_path_to_login(
     hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
 ) -> None:
@@ -446,6 +420,7 @@ async def get_path_to_login(
 @websocket_api.websocket_command({vol.Required("type"): "ha_guest_mode/get_urls"})
 @websocket_api.require_admin
 @websocket_api.async_response
+@instrumented
 async def get_urls(
     hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
 ) -> None:
@@ -473,6 +448,7 @@ async def get_urls(
 @websocket_api.websocket_command({vol.Required("type"): "ha_guest_mode/get_panels"})
 @websocket_api.require_admin
 @websocket_api.async_response
+@instrumented
 async def get_panels(
     hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
 ) -> None:
@@ -492,6 +468,7 @@ async def get_panels(
 @websocket_api.websocket_command({vol.Required("type"): "ha_guest_mode/get_copy_link_mode"})
 @websocket_api.require_admin
 @websocket_api.async_response
+@instrumented
 async def get_copy_link_mode(
     hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
 ) -> None:
@@ -501,6 +478,7 @@ async def get_copy_link_mode(
 @websocket_api.websocket_command({vol.Required("type"): "ha_guest_mode/get_token_defaults"})
 @websocket_api.require_admin
 @websocket_api.async_response
+@instrumented
 async def get_token_defaults(
     hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict[str, Any]
 ) -> None:
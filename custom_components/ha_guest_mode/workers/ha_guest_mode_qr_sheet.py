@@ -0,0 +1,162 @@
+"""Printable QR card sheets.
+
+Pages are rendered by ``render_page`` in worker processes, since qrcode and
+Pillow are CPU bound pure Python. Each page comes back as a deflated grayscale
+bitmap that ``PdfStreamWriter`` wraps as a PDF page as soon as it is ready, so
+the sheet streams out page by page.
+
+A top-level module outside the integration package: qr_sheet loads it under
+its own name, so the worker processes import this file, qrcode and Pillow
+and never the package or Home Assistant. Keep it free of relative imports.
+"""
+from __future__ import annotations
+
+import zlib
+from typing import NamedTuple
+
+# A4 at 150 dpi, 3 x 4 cards per page.
+PAGE_WIDTH = 1240
+PAGE_HEIGHT = 1754
+PAGE_DPI = 150
+COLUMNS = 3
+ROWS = 4
+CARDS_PER_PAGE = COLUMNS * ROWS
+MARGIN = 40
+QR_SIZE = 300
+FONT_SIZE = 22
+LINE_HEIGHT = 28
+
+
+class Card(NamedTuple):
+    url: str
+    title: str
+    lines: tuple[str, ...]
+
+
+class RenderedPage(NamedTuple):
+    width: int
+    height: int
+    data: bytes  # zlib deflated 8-bit grayscale rows
+
+
+def _load_font():
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.load_default(size=FONT_SIZE)
+    except TypeError:
+        # Pillow < 10.1 only has the fixed size bitmap font.
+        return ImageFont.load_default()
+
+
+def _fit(draw, text: str, font, width: int) -> str:
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + "…", font=font) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+def make_qr(data: str, error_correction: str = "M", border: int = 4):
+    """Build a QR code at the smallest version that fits, ``error_correction`` is L, M, Q or H."""
+    import qrcode
+    from qrcode import constants
+
+    qr = qrcode.QRCode(error_correction=getattr(constants, f"ERROR_CORRECT_{error_correction}"), border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def render_page(cards: list[Card], error_correction: str = "M") -> RenderedPage:
+    """Draw up to CARDS_PER_PAGE cards on one page. Runs in a worker process."""
+    from PIL import Image, ImageDraw
+
+    page = Image.new("L", (PAGE_WIDTH, PAGE_HEIGHT), 255)
+    draw = ImageDraw.Draw(page)
+    font = _load_font()
+    card_width = (PAGE_WIDTH - 2 * MARGIN) // COLUMNS
+    card_height = (PAGE_HEIGHT - 2 * MARGIN) // ROWS
+
+    for index, card in enumerate(cards[:CARDS_PER_PAGE]):
+        left = MARGIN + (index % COLUMNS) * card_width
+        top = MARGIN + (index // COLUMNS) * card_height
+        draw.rectangle((left + 4, top + 4, left + card_width - 4, top + card_height - 4), outline=160)
+
+        qr = make_qr(card.url, error_correction, border=1)
+        image = qr.make_image().get_image().convert("L").resize((QR_SIZE, QR_SIZE), Image.NEAREST)
+        page.paste(image, (left + (card_width - QR_SIZE) // 2, top + 16))
+
+        text_width = card_width - 32
+        y = top + 24 + QR_SIZE
+        for line in (card.title, *card.lines):
+            draw.text((left + 16, y), _fit(draw, line, font, text_width), fill=0, font=font)
+            y += LINE_HEIGHT
+
+    return RenderedPage(PAGE_WIDTH, PAGE_HEIGHT, zlib.compress(page.tobytes(), 6))
+
+
+def paginate(cards: list[Card]) -> list[list[Card]]:
+    return [cards[start:start + CARDS_PER_PAGE] for start in range(0, len(cards), CARDS_PER_PAGE)]
+
+
+class PdfStreamWriter:
+    """Write a PDF of full-page images one page at a time.
+
+    Object numbers are fixed up front from the page count, so every chunk can
+    be sent as soon as it is produced: 1 catalog, 2 page tree, then a page,
+    its content stream and its image for each page.
+    """
+
+    def __init__(self, page_count: int):
+        self._page_count = page_count
+        self._offsets: dict[int, int] = {}
+        self._position = 0
+
+    def _object(self, number: int, body: bytes) -> bytes:
+        chunk = b"%d 0 obj\n" % number + body + b"\nendobj\n"
+        self._offsets[number] = self._position
+        self._position += len(chunk)
+        return chunk
+
+    def _emit(self, chunk: bytes) -> bytes:
+        self._position += len(chunk)
+        return chunk
+
+    def header(self) -> bytes:
+        kids = b" ".join(b"%d 0 R" % (3 + 3 * index) for index in range(self._page_count))
+        return (
+            self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+            + self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+            + self._object(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, self._page_count))
+        )
+
+    def page(self, index: int, page: RenderedPage) -> bytes:
+        page_number = 3 + 3 * index
+        width_pt = page.width * 72 / PAGE_DPI
+        height_pt = page.height * 72 / PAGE_DPI
+        content = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (width_pt, height_pt)
+        return (
+            self._object(
+                page_number,
+                b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Contents %d 0 R "
+                b"/Resources << /XObject << /Im0 %d 0 R >> >> >>"
+                % (width_pt, height_pt, page_number + 1, page_number + 2),
+            )
+            + self._object(page_number + 1, b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+            + self._object(
+                page_number + 2,
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream"
+                % (page.width, page.height, len(page.data), page.data),
+            )
+        )
+
+    def trailer(self) -> bytes:
+        count = 3 + 3 * self._page_count
+        xref = [b"xref\n0 %d\n" % count, b"0000000000 65535 f \n"]
+        xref += [b"%010d 00000 n \n" % self._offsets[number] for number in range(1, count)]
+        return b"".join(xref) + b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            count,
+            self._position,
+        )
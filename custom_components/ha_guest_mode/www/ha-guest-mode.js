@@ -3,6 +3,8 @@ import {
   html,
   css,
 } from "https://unpkg.com/lit-element@2.4.0/lit-element.js?module";
+// Same lit-html range lit-element 2.4.0 depends on, so the directive comes from the instance that renders it.
+import { repeat } from "https://unpkg.com/lit-html@^1.1.1/directives/repeat.js?module";
 import "https://unpkg.com/share-api-polyfill/dist/share-min.js";
 import QRCode from "https://cdn.skypack.dev/qrcode";
 
@@ -37,6 +39,37 @@ function getNow() {
   }`;
 }
 
+const TOKEN_PAGE_SIZE = 100;
+const TOKEN_PAGE_SIZE_MAX = 1000;
+const CARD_MIN_WIDTH = 250;
+const CARD_MAX_WIDTH = 300;
+const CARD_GAP = 16;
+const CARD_ROW_HEIGHT = 300;
+// Rows rendered above and below the visible ones, so scrolling does not show gaps.
+const OVERSCAN_ROWS = 2;
+
+let dateFormatter = null;
+const formattedDates = new Map();
+
+// Token dates repeat across refreshes, format each one once.
+function formatDate(value) {
+  let formatted = formattedDates.get(value);
+  if (formatted === undefined) {
+    if (!dateFormatter) {
+      dateFormatter = new Intl.DateTimeFormat(navigator.language || navigator.languages[0], {
+        year: 'numeric',
+        month: 'numeric',
+        day: 'numeric',
+        hour: 'numeric',
+        minute: '2-digit',
+      });
+    }
+    formatted = dateFormatter.format(new Date(value));
+    formattedDates.set(value, formatted);
+  }
+  return formatted;
+}
+
 class GuestModePanel extends LitElement {
   static get properties() {
     return {
@@ -46,6 +79,11 @@ class GuestModePanel extends LitElement {
       panel: { type: Object },
       users: { type: Array },
       tokens: { type: Array },
+      tokensLoaded: { type: Boolean },
+      visibleColumns: { type: Number },
+      visibleFirstRow: { type: Number },
+      visibleLastRow: { type: Number },
+      cardRowHeight: { type: Number },
       alert: { type: String },
       enableStartDate: { type: Boolean },
       isNeverExpire: { type: Boolean },
@@ -74,6 +112,16 @@ class GuestModePanel extends LitElement {
     super();
     this.users = [];
     this.tokens = [];
+    this.tokensLoaded = false;
+    this.nextTokensCursor = null;
+    this.tokensLoading = false;
+    this.tokensRequest = 0;
+    // Token id -> { source, view }, so an unchanged token keeps its view object.
+    this.tokenViews = new Map();
+    this.visibleColumns = 1;
+    this.visibleFirstRow = 0;
+    this.visibleLastRow = Math.ceil(window.innerHeight / (CARD_ROW_HEIGHT + CARD_GAP)) + OVERSCAN_ROWS;
+    this.cardRowHeight = CARD_ROW_HEIGHT;
     this.alert = '';
     this.alertType = '';
     this.loginPath = '';
@@ -107,19 +155,50 @@ class GuestModePanel extends LitElement {
     this.duration = 1;
 
     this._boundHandleGlobalKeydown = this.handleGlobalKeydown.bind(this);
+    this._boundScheduleVisibleRange = this.scheduleVisibleRange.bind(this);
+    this._scrollParents = [];
   }
 
   connectedCallback() {
     super.connectedCallback();
     window.addEventListener('keydown', this._boundHandleGlobalKeydown);
+    window.addEventListener('resize', this._boundScheduleVisibleRange);
+    this._scrollParents = this.findScrollParents();
+    this._scrollParents.forEach(parent => parent.addEventListener('scroll', this._boundScheduleVisibleRange, { passive: true }));
   }
 
   disconnectedCallback() {
     clearTimeout(this._modalAlertTimeout);
     window.removeEventListener('keydown', this._boundHandleGlobalKeydown);
+    window.removeEventListener('resize', this._boundScheduleVisibleRange);
+    this._scrollParents.forEach(parent => parent.removeEventListener('scroll', this._boundScheduleVisibleRange));
+    this._scrollParents = [];
+    cancelAnimationFrame(this._visibleRangeFrame);
+    this._visibleRangeFrame = null;
+    if (this._resizeObserver) {
+      this._resizeObserver.disconnect();
+      this._resizeObserver = null;
+      this._observedContainer = null;
+    }
     super.disconnectedCallback();
   }
 
+  // The panel does not scroll itself, Home Assistant's layout around it does.
+  findScrollParents() {
+    const parents = [window];
+    let node = this;
+    while (node) {
+      node = node.parentNode || node.host;
+      if (node instanceof Element) {
+        const overflowY = getComputedStyle(node).overflowY;
+        if (overflowY === 'auto' || overflowY === 'scroll' || overflowY === 'overlay') {
+          parents.push(node);
+        }
+      }
+    }
+    return parents;
+  }
+
   async getCopyLinkMode() {
     try {
       const copyLinkMode = await this.hass.callWS({ type: 'ha_guest_mode/get_copy_link_mode' });
@@ -262,35 +341,14 @@ class GuestModePanel extends LitElement {
   }
 
   fetchUsers() {
-    const userLocale = navigator.language || navigator.languages[0];
-    this.hass.callWS({ type: 'ha_guest_mode/list_users' }).then(users => {
+    this.hass.callWS({ type: 'ha_guest_mode/list_users', include_tokens: false }).then(users => {
       const previousUser = this.user;
       this.users = [];
-      this.tokens = [];
       users.filter(user => !user.system_generated && user.is_active).forEach(user => {
         this.users.push({
           id: user.id,
           name: user.name,
         });
-        user.tokens.filter(token => token.type === 'long_lived_access_token' && token.expiration !== 315360000)
-          .forEach(token => {
-            this.tokens.push({
-              id: token.id,
-              name: token.name,
-              user: user.name,
-              endDate: token.isNeverExpire ? this.translate("never") : new Date(token.end_date).toLocaleString(userLocale).replace(/:\d{2}$/, ""),
-              remaining: token.remaining,
-              isUsed: token.isUsed,
-              startDate: token.isNeverExpire ? 'N/A' : new Date(token.start_date).toLocaleString(userLocale).replace(/:\d{2}$/, ""),
-              uid: token.uid,
-              isNeverExpire: token.isNeverExpire,
-              dashboard: token.dashboard || 'lovelace',
-              first_used: token.first_used ? new Date(token.first_used).toLocaleString(userLocale).replace(/:\d{2}$/, "") : this.translate("never"),
-              last_used: token.last_used ? new Date(token.last_used).toLocaleString(userLocale).replace(/:\d{2}$/, "") : this.translate("never"),
-              times_used: token.times_used || 0,
-              usage_limit: token.usage_limit,
-            });
-          });
       });
 
       if (previousUser) {
@@ -303,9 +361,146 @@ class GuestModePanel extends LitElement {
     });
   }
 
+  tokenView(token) {
+    // remaining follows the clock, it would make every token look changed.
+    const { remaining, ...stable } = token;
+    const source = JSON.stringify(stable);
+    const cached = this.tokenViews.get(token.id);
+    if (cached && cached.source === source) {
+      return cached.view;
+    }
+    const view = {
+      id: token.id,
+      name: token.name,
+      user: token.user_name,
+      endDate: token.isNeverExpire ? this.translate("never") : formatDate(token.end_date),
+      isUsed: token.isUsed,
+      startDate: token.isNeverExpire ? 'N/A' : formatDate(token.start_date),
+      uid: token.uid,
+      linkToken: token.link_token || token.uid,
+      isNeverExpire: token.isNeverExpire,
+      dashboard: token.dashboard || 'lovelace',
+      first_used: token.first_used ? formatDate(token.first_used) : this.translate("never"),
+      last_used: token.last_used ? formatDate(token.last_used) : this.translate("never"),
+      times_used: token.times_used || 0,
+      usage_limit: token.usage_limit,
+    };
+    this.tokenViews.set(token.id, { source, view });
+    return view;
+  }
+
+  // Loads the next page, or with reset reloads the pages loaded so far.
+  async fetchTokens({ reset = false } = {}) {
+    if (!reset && (this.tokensLoading || this.nextTokensCursor === null)) {
+      return;
+    }
+    const request = ++this.tokensRequest;
+    const payload = { type: 'ha_guest_mode/list_tokens' };
+    if (reset) {
+      payload.limit = Math.min(Math.max(this.tokens.length, TOKEN_PAGE_SIZE), TOKEN_PAGE_SIZE_MAX);
+    } else {
+      payload.limit = TOKEN_PAGE_SIZE;
+      payload.cursor = this.nextTokensCursor;
+    }
+
+    this.tokensLoading = true;
+    try {
+      const page = await this.hass.callWS(payload);
+      if (request !== this.tokensRequest) {
+        return;
+      }
+      const views = page.tokens.map(token => this.tokenView(token));
+      this.tokens = reset ? views : this.tokens.concat(views);
+      this.nextTokensCursor = page.next_cursor;
+      if (reset) {
+        const ids = new Set(this.tokens.map(token => token.id));
+        this.tokenViews.forEach((_entry, id) => {
+          if (!ids.has(id)) {
+            this.tokenViews.delete(id);
+          }
+        });
+      }
+    } catch (err) {
+      console.error('Error fetching tokens:', err);
+    } finally {
+      if (request === this.tokensRequest) {
+        this.tokensLoading = false;
+        this.tokensLoaded = true;
+        this.scheduleVisibleRange();
+      }
+    }
+  }
+
+  scheduleVisibleRange() {
+    if (this._visibleRangeFrame) {
+      return;
+    }
+    this._visibleRangeFrame = requestAnimationFrame(() => {
+      this._visibleRangeFrame = null;
+      this.updateVisibleRange();
+    });
+  }
+
+  // Only the card rows in view (plus OVERSCAN_ROWS) are rendered, the
+  // container keeps the height of all loaded rows.
+  updateVisibleRange() {
+    const container = this.shadowRoot && this.shadowRoot.querySelector('.cards-container');
+    if (!container) {
+      return;
+    }
+    const columns = Math.max(1, Math.floor((container.clientWidth + CARD_GAP) / (CARD_MIN_WIDTH + CARD_GAP)));
+    const rowPitch = this.cardRowHeight + CARD_GAP;
+    const rowCount = Math.ceil(this.tokens.length / columns);
+    const rect = container.getBoundingClientRect();
+    const top = Math.max(0, -rect.top);
+    const bottom = Math.max(top, window.innerHeight - rect.top);
+
+    this.visibleColumns = columns;
+    this.visibleFirstRow = Math.max(0, Math.floor(top / rowPitch) - OVERSCAN_ROWS);
+    this.visibleLastRow = Math.min(rowCount, Math.ceil(bottom / rowPitch) + OVERSCAN_ROWS);
+
+    if (this.visibleLastRow >= rowCount - OVERSCAN_ROWS) {
+      this.fetchTokens();
+    }
+  }
+
+  updated(changedProperties) {
+    super.updated(changedProperties);
+    const container = this.shadowRoot.querySelector('.cards-container');
+    if (container !== this._observedContainer) {
+      if (this._resizeObserver) {
+        this._resizeObserver.disconnect();
+      }
+      this._observedContainer = container;
+      if (container) {
+        this._resizeObserver = this._resizeObserver || new ResizeObserver(this._boundScheduleVisibleRange);
+        this._resizeObserver.observe(container);
+      }
+    }
+    if (!container) {
+      return;
+    }
+
+    // Rows share one height, grown to the tallest card rendered so far.
+    let tallest = 0;
+    container.querySelectorAll('.token-card').forEach(card => {
+      const content = card.querySelector('.card-content-list');
+      tallest = Math.max(tallest, content ? content.offsetHeight : 0);
+    });
+    if (tallest > this.cardRowHeight) {
+      this.cardRowHeight = Math.ceil(tallest);
+    }
+    if (changedProperties.has('tokens') || changedProperties.has('cardRowHeight')) {
+      this.scheduleVisibleRange();
+    }
+  }
+
   update(changedProperties) {
     if (changedProperties.has('hass') && this.hass && !this.users.length) {
       this.fetchUsers();
+      if (!this.tokensLoaded && !this.tokensLoading) {
+        this.fetchTokens({ reset: true });
+      }
       this.getUrls();
       this.getDashboards();
       this.getCopyLinkMode();
@@ -467,6 +662,7 @@ class GuestModePanel extends LitElement {
 
     this.hass.callWS(payload).then(() => {
       this.fetchUsers();
+      this.fetchTokens({ reset: true });
       this.isCreateDialogOpen = false;
       this.modalAlert = '';
     }).catch(err => {
@@ -518,6 +714,9 @@ class GuestModePanel extends LitElement {
       type: 'ha_guest_mode/delete_token',
       token_id: token.id,
     }).then(() => {
+      this.tokens = this.tokens.filter(entry => entry.id !== token.id);
+      this.tokenViews.delete(token.id);
+      // Deleting a token can remove its managed user.
       this.fetchUsers();
     }).catch(err => {
       this.alertType="warning";
@@ -538,7 +737,7 @@ class GuestModePanel extends LitElement {
     const base = (baseUrl || '').replace(/\/$/, '');
     const path = this.loginPath.replace(/^\//, '');
     const loginUrl = `${base}/${path}`;
-    return `${loginUrl}?token=${token.uid}`;
+    return `${loginUrl}?token=${token.linkToken || token.uid}`;
   }
 
   async listItemClick(e, token) {
@@ -957,6 +1156,67 @@ class GuestModePanel extends LitElement {
     `;
   }
 
+  renderTokenCards() {
+    const columns = this.visibleColumns;
+    const rowPitch = this.cardRowHeight + CARD_GAP;
+    const rowCount = Math.ceil(this.tokens.length / columns);
+    const firstRow = Math.min(this.visibleFirstRow, rowCount);
+    const lastRow = Math.min(Math.max(this.visibleLastRow, firstRow), rowCount);
+    const dashboardTitles = new Map(this.dashboards.map(dashboard => [dashboard.url_path, dashboard.title]));
+    // Keyed by token id, so scrolling moves the existing cards instead of re-rendering every one of them.
+    const visibleTokens = this.tokens.slice(firstRow * columns, lastRow * columns);
+    return html`
+      <div
+        class="cards-container"
+        style="height: ${Math.max(0, rowCount * rowPitch - CARD_GAP)}px; padding-top: ${firstRow * rowPitch}px; grid-template-columns: repeat(${columns}, minmax(0, ${CARD_MAX_WIDTH}px)); grid-auto-rows: ${this.cardRowHeight}px;"
+      >
+        ${repeat(visibleTokens, token => token.id, token => this.renderTokenCard(token, dashboardTitles))}
+      </div>
+    `;
+  }
+
+  renderTokenCard(token, dashboardTitles) {
+    const dashboardTitle = dashboardTitles.get(token.dashboard) || token.dashboard;
+    return html`
+      <ha-card class="token-card">
+        <div class="card-content-list">
+          <h3>${token.name} ${this.translate("for").toLowerCase()} ${token.user}</h3>
+          <p>
+            ${token.isNeverExpire ? html`
+              ${this.translate("expiration_date")}: ${this.translate("never")} <br>
+            ` : html`
+              ${this.translate("start_date")}: ${token.startDate} <br>
+              ${this.translate("expiration_date")}: ${token.endDate} <br>
+            `}
+            ${this.translate("used")}: ${token.isUsed ? this.translate("yes").toLowerCase() : this.translate("no").toLowerCase() } <br>
+            ${this.translate("dashboard")}: ${dashboardTitle} <br>
+            ${this.translate("first_used")}: ${token.first_used} <br>
+            ${this.translate("last_used")}: ${token.last_used} <br>
+            ${this.translate("times_used")}: ${token.times_used}${token.usage_limit ? ` / ${token.usage_limit}` : ''} <br>
+          </p>
+          <div class="actions">
+            <ha-button appearance="plain" @click=${e => this.listItemClick(e, token)}>
+              <ha-icon icon="mdi:share-variant"></ha-icon>
+            </ha-button>
+              <ha-button appearance="plain" @click=${e => this.qrButtonClick(e, token)} title="QR Code">
+                <ha-icon icon="mdi:qrcode"></ha-icon>
+              </ha-button>
+            <ha-button appearance="plain" disabled>
+              ${token.isUsed ? html`
+                  <ha-icon icon="mdi:lock-open-variant-outline" style="color: var(--success-color);"></ha-icon>
+                ` : html`
+                  <ha-icon icon="mdi:lock" style="color: var(--secondary-text-color);"></ha-icon>
+                `}
+            </ha-button>
+            <ha-button appearance="plain" @click=${e => this.deleteClick(e, token)}>
+              <ha-icon icon="mdi:delete" style="color: var(--error-color);"></ha-icon>
+            </ha-button>
+          </div>
+        </div>
+      </ha-card>
+    `;
+  }
+
   render() {
     this.getLoginPath();
     const availableGroups = Array.isArray(this.groups) ? this.groups : [];
@@ -1074,51 +1334,8 @@ class GuestModePanel extends LitElement {
           }
 
           ${this.tokens.length ?
-            html`
-            <div class="cards-container">
-              ${this.tokens.map(token => {
-                const dashboard = this.dashboards.find(d => d.url_path === token.dashboard);
-                const dashboardTitle = dashboard ? dashboard.title : token.dashboard;
-                return html`
-                <ha-card class="token-card">
-                  <div class="card-content-list">
-                    <h3>${token.name} ${this.translate("for").toLowerCase()} ${token.user}</h3>
-                    <p>
-                      ${token.isNeverExpire ? html`
-                        ${this.translate("expiration_date")}: ${this.translate("never")} <br>
-                      ` : html`
-                        ${this.translate("start_date")}: ${token.startDate} <br>
-                        ${this.translate("expiration_date")}: ${token.endDate} <br>
-                      `}
-                      ${this.translate("used")}: ${token.isUsed ? this.translate("yes").toLowerCase() : this.translate("no").toLowerCase() } <br>
-                      ${this.translate("dashboard")}: ${dashboardTitle} <br>
-                      ${this.translate("first_used")}: ${token.first_used} <br>
-                      ${this.translate("last_used")}: ${token.last_used} <br>
-                      ${this.translate("times_used")}: ${token.times_used}${token.usage_limit ? ` / ${token.usage_limit}` : ''} <br>
-                    </p>
-                    <div class="actions">
-                      <ha-button appearance="plain" @click=${e => this.listItemClick(e, token)}>
-                        <ha-icon icon="mdi:share-variant"></ha-icon>
-                      </ha-button>
-                        <ha-button appearance="plain" @click=${e => this.qrButtonClick(e, token)} title="QR Code">
-                          <ha-icon icon="mdi:qrcode"></ha-icon>
-                        </ha-button>
-                      <ha-button appearance="plain" disabled>
-                        ${token.isUsed ? html`
-                            <ha-icon icon="mdi:lock-open-variant-outline" style="color: var(--success-color);"></ha-icon>
-                          ` : html`
-                            <ha-icon icon="mdi:lock" style="color: var(--secondary-text-color);"></ha-icon>
-                          `}
-                      </ha-button>
-                      <ha-button appearance="plain" @click=${e => this.deleteClick(e, token)}>
-                        <ha-icon icon="mdi:delete" style="color: var(--error-color);"></ha-icon>
-                      </ha-button>
-                    </div>
-                  </div>
-                </ha-card>
-              `})}
-            </div>`
-            : html`
+            this.renderTokenCards()
+            : this.tokensLoaded ? html`
               <ha-card class="empty-state-card">
                 <div class="empty-state-content">
                   <h3>${this.translate("no_tokens_title") || "No active tokens"}</h3>
@@ -1129,6 +1346,7 @@ class GuestModePanel extends LitElement {
                 </div>
               </ha-card>
             `
+            : ''
           }
         </div>
 
@@ -1363,10 +1581,11 @@ class GuestModePanel extends LitElement {
 
       .cards-container {
         margin-top: 16px;
-        display: flex;
-        flex-wrap: wrap;
+        display: grid;
         gap: 16px;
         justify-content: center;
+        align-content: start;
+        box-sizing: border-box;
       }
       .empty-state-card {
         margin: 24px auto 0;
@@ -1389,8 +1608,7 @@ class GuestModePanel extends LitElement {
       }
 
       .token-card {
-        flex: 1 1 250px;
-        max-width: 300px;
+        overflow: hidden;
       }
 
       .card-content-list {
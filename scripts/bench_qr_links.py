@@ -0,0 +1,62 @@
+"""Compare QR codes of full uid links and compact short-code links.
+
+    pip install qrcode Pillow
+    python scripts/bench_qr_links.py --base-url https://ha.example.com --runs 200
+
+For each error correction level, prints the QR version, the module count per
+side and the mean time to build and encode the PNG, the way the Guest QR Code
+image entity does it.
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import io
+import os
+import secrets
+import sys
+import time
+import uuid
+
+# qr_sheet has no Home Assistant imports, load it without the integration package.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "custom_components", "ha_guest_mode"))
+
+from qr_sheet import make_qr  # noqa: E402
+
+
+def short_code() -> str:
+    """Same alphabet and length as links.new_short_code, without importing Home Assistant."""
+    return base64.b32encode(secrets.token_bytes(8)).decode()[:12]
+
+
+def measure(url_factory, error_correction: str, runs: int) -> tuple[int, int, float]:
+    start = time.perf_counter()
+    for _ in range(runs):
+        qr = make_qr(url_factory(), error_correction)
+        buffer = io.BytesIO()
+        qr.make_image().save(buffer, "PNG")
+    elapsed = (time.perf_counter() - start) / runs
+    return qr.version, qr.modules_count, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="https://ha.example.com")
+    parser.add_argument("--login-path", default="/guest-mode/login")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    prefix = f"{args.base_url}{args.login_path}?token="
+    variants = {
+        "uid": lambda: prefix + str(uuid.uuid4()),
+        "short": lambda: prefix + short_code(),
+    }
+    print(f"{'level':<6}{'link':<7}{'version':>8}{'modules':>9}{'ms':>9}")
+    for level in ("L", "M", "Q", "H"):
+        for name, factory in variants.items():
+            version, modules, elapsed = measure(factory, level, args.runs)
+            print(f"{level:<6}{name:<7}{version:>8}{modules:>9}{elapsed * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
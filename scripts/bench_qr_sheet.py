@@ -0,0 +1,78 @@
+"""Benchmark QR sheet rendering against the number of worker processes.
+
+    pip install qrcode Pillow
+    python scripts/bench_qr_sheet.py --tokens 240 --workers 1 2 4 8 --sheets 3
+
+Renders sheets through the same qr_sheet module and QrRenderPool the endpoint
+uses, so the workers are spawned and import the renderer exactly as they do
+under Home Assistant. Per worker count it prints the first sheet (which starts
+the pool) and the mean of the following ones (which reuse it), with the
+speed-up of the latter over one worker.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+# qr_sheet has no Home Assistant imports, load it without the integration package.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "custom_components", "ha_guest_mode"))
+
+from qr_sheet import Card, QrRenderPool, paginate  # noqa: E402
+
+
+def build_cards(count: int) -> list[Card]:
+    return [
+        Card(
+            f"https://ha.example.com/guest-mode/login?token={uuid.uuid4()}",
+            f"Guest {index}",
+            ("/lovelace-guest", "2026-07-01 15:00 - 2026-07-05 11:00"),
+        )
+        for index in range(count)
+    ]
+
+
+async def render_sheet(pool: QrRenderPool, pages: list[list[Card]]) -> int:
+    size = 0
+    async for chunk in pool.async_render(pages, "M"):
+        size += len(chunk)
+    return size
+
+
+async def measure(pages: list[list[Card]], workers: int, sheets: int) -> tuple[float, float, int]:
+    """Time of the first sheet, mean time of the next ones and the PDF size."""
+    pool = QrRenderPool(workers)
+    try:
+        start = time.perf_counter()
+        size = await render_sheet(pool, pages)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(sheets - 1):
+            await render_sheet(pool, pages)
+        warm = (time.perf_counter() - start) / max(sheets - 1, 1)
+    finally:
+        pool.shutdown()
+    return cold, warm, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=240)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--sheets", type=int, default=3, help="sheets per worker count, the first one starts the pool")
+    args = parser.parse_args()
+
+    pages = paginate(build_cards(args.tokens))
+    print(f"{args.tokens} tokens, {len(pages)} pages, {os.cpu_count()} cores")
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        cold, warm, size = asyncio.run(measure(pages, workers, max(args.sheets, 2)))
+        baseline = baseline or warm
+        print(f"{workers:>3} worker(s): first {cold:6.2f}s  next {warm:6.2f}s  x{baseline / warm:4.2f}  {size / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Compare tokens rows held as dicts with TokenRecord, the way the panel lists them.
+
+    python scripts/bench_token_records.py --tokens 100000 --runs 3
+
+Fills a temporary tokens table, then for both representations prints the time
+to fetch every row, the memory the fetched rows hold and the time to
+serialize them for the panel (the serialize_token shape, dumped to JSON).
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+# token_record and timestamps have no Home Assistant imports, load them without the integration package.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "custom_components", "ha_guest_mode"))
+
+from timestamps import ts_to_iso  # noqa: E402
+from token_record import TOKEN_COLUMNS, token_record_factory  # noqa: E402
+
+
+def fill(path: str, count: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(f"CREATE TABLE tokens ({', '.join(TOKEN_COLUMNS)})")
+    now = int(time.time())
+    rows = []
+    for token_id in range(1, count + 1):
+        never = random.random() < 0.2
+        start_ts = None if never else now - random.randint(0, 30 * 86400)
+        end_ts = None if never else start_ts + random.randint(3600, 60 * 86400)
+        used_ts = now - random.randint(0, 86400) if random.random() < 0.5 else None
+        values = dict.fromkeys(TOKEN_COLUMNS)
+        values.update(
+            id=token_id,
+            userId=uuid.uuid4().hex,
+            token_name=f"Guest {token_id}",
+            start_date=ts_to_iso(start_ts),
+            end_date=ts_to_iso(end_ts),
+            uid=str(uuid.uuid4()),
+            is_never_expire=int(never),
+            dashboard="lovelace",
+            first_used=ts_to_iso(used_ts),
+            last_used=ts_to_iso(used_ts),
+            times_used=1 if used_ts else None,
+            managed_user=0,
+            short_code=uuid.uuid4().hex[:12].upper(),
+            start_ts=start_ts,
+            end_ts=end_ts,
+            first_used_ts=used_ts,
+            last_used_ts=used_ts,
+        )
+        rows.append(tuple(values.values()))
+    with conn:
+        conn.executemany(f"INSERT INTO tokens VALUES ({', '.join('?' * len(TOKEN_COLUMNS))})", rows)
+    conn.close()
+
+
+def fetch_dicts(path: str) -> list:
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in conn.execute("SELECT * FROM tokens ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def fetch_records(path: str) -> list:
+    conn = sqlite3.connect(path)
+    conn.row_factory = token_record_factory
+    try:
+        return conn.execute("SELECT * FROM tokens ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def serialize_dict(token: dict, now: int) -> dict:
+    """serialize_token before TokenRecord, every field derived again from the columns."""
+    is_never_expire = bool(token["is_never_expire"])
+    remaining_seconds = None
+    if not is_never_expire and token["end_ts"] is not None:
+        remaining_seconds = token["end_ts"] - now
+    return {
+        "id": token["id"],
+        "name": token["token_name"],
+        "user_id": token["userId"],
+        "end_date": ts_to_iso(token["end_ts"]) or token["end_date"],
+        "end_ts": token["end_ts"],
+        "remaining": remaining_seconds,
+        "start_date": ts_to_iso(token["start_ts"]) or token["start_date"],
+        "start_ts": token["start_ts"],
+        "isUsed": bool(token["token_ha"]),
+        "uid": token["uid"],
+        "short_code": token["short_code"],
+        "isNeverExpire": is_never_expire,
+        "dashboard": token["dashboard"],
+        "first_used": ts_to_iso(token["first_used_ts"]) or token["first_used"],
+        "last_used": ts_to_iso(token["last_used_ts"]) or token["last_used"],
+        "times_used": token["times_used"] or 0,
+        "usage_limit": token["usage_limit"],
+    }
+
+
+def serialize_record(token, now: int) -> dict:
+    """serialize_token as it is now, without the Home Assistant constant."""
+    return {
+        "id": token["id"],
+        "name": token["token_name"],
+        "user_id": token["userId"],
+        "end_date": token.end_iso,
+        "end_ts": token["end_ts"],
+        "remaining": token.remaining(now),
+        "start_date": token.start_iso,
+        "start_ts": token["start_ts"],
+        "isUsed": bool(token["token_ha"]),
+        "uid": token["uid"],
+        "short_code": token["short_code"],
+        "isNeverExpire": token.never_expires,
+        "dashboard": token["dashboard"],
+        "first_used": token.first_used_iso,
+        "last_used": token.last_used_iso,
+        "times_used": token["times_used"] or 0,
+        "usage_limit": token["usage_limit"],
+    }
+
+
+def measure(path: str, fetch, serialize, runs: int) -> tuple[float, float, float]:
+    """Best fetch time, memory held by the rows and best serialize time."""
+    fetch_s = serialize_s = float("inf")
+    for _ in range(runs):
+        gc.collect()
+        start = time.perf_counter()
+        rows = fetch(path)
+        fetch_s = min(fetch_s, time.perf_counter() - start)
+        now = int(time.time())
+        start = time.perf_counter()
+        json.dumps([serialize(row, now) for row in rows])
+        serialize_s = min(serialize_s, time.perf_counter() - start)
+        del rows
+
+    gc.collect()
+    tracemalloc.start()
+    rows = fetch(path)
+    held, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return fetch_s, held / 2**20, serialize_s
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tokens.db")
+        fill(path, args.tokens)
+        print(f"{args.tokens} tokens")
+        print(f"{'rows':<8}{'fetch ms':>10}{'held MiB':>10}{'serialize ms':>14}")
+        for name, fetch, serialize in (
+            ("dict", fetch_dicts, serialize_dict),
+            ("record", fetch_records, serialize_record),
+        ):
+            fetch_s, held, serialize_s = measure(path, fetch, serialize, args.runs)
+            print(f"{name:<8}{fetch_s * 1000:>10.1f}{held:>10.1f}{serialize_s * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()